@@ -1 +1,42 @@
+import os
 
+import numpy as np
+
+from lazy_imports import lazy_import
+
+torch = lazy_import("torch")
+transformers = lazy_import("transformers")
+
+# ============================
+# CLIP（画像・テキストの埋め込み）
+# ============================
+# 重い（数秒＋重みのメモリ）ので Streamlit からは直接読み込まない。
+# model_server.py --model clip の中で1回だけ作って使い回す。
+CLIP_MODEL = os.environ.get("SENTEI_CLIP_MODEL", "openai/clip-vit-base-patch32")
+
+
+class ClipModel:
+
+    def __init__(self, model_name=CLIP_MODEL, device=None):
+        self.name = model_name
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.model = transformers.CLIPModel.from_pretrained(model_name).to(self.device).eval()
+        self.processor = transformers.CLIPProcessor.from_pretrained(model_name)
+        self.dim = self.model.config.projection_dim
+
+    def _normalize(self, features):
+        features = features / features.norm(dim=-1, keepdim=True)
+        return features.cpu().numpy().astype(np.float32)
+
+    def embed_images(self, images):
+        # images: PIL 画像のリスト → (枚数, dim) の L2 正規化済みベクトル
+        inputs = self.processor(images=[img.convert("RGB") for img in images], return_tensors="pt")
+        with torch.no_grad():
+            features = self.model.get_image_features(**inputs.to(self.device))
+        return self._normalize(features)
+
+    def embed_texts(self, texts):
+        inputs = self.processor(text=list(texts), padding=True, truncation=True, return_tensors="pt")
+        with torch.no_grad():
+            features = self.model.get_text_features(**inputs.to(self.device))
+        return self._normalize(features)
@@ -0,0 +1,397 @@
+import os
+import json
+import asyncio
+import argparse
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+from catalog import ATTRIBUTE_COLUMNS, FEATURE_COLUMNS, catalog_version, load_catalog_frame, filter_catalog, make_ratio_df
+from association import DEFAULT_PARAMS, analysis_cache, analysis_key, cached_association
+from prompt import NEGATIVE_PROMPT, build_prompt, build_payload
+
+# ============================
+# ヘッドレス HTTP API（asyncio ＋ 標準ライブラリのみ）
+# ============================
+# Streamlit を通さずに検索・割合・連関分析・プロンプト生成を呼べるようにする。
+#
+#   python api_server.py --port 8600
+#
+#   GET  /health
+#   POST /catalog/filter   {"filters": {"hair_color_main": "blue"}, "offset": 0, "limit": 100}
+#   GET  /stats/ratios?column=hair_length&work=Summer%20Pockets
+#   POST /analysis         {"selected": ["001.png", ...], "min_support": 0.25, "metric": "lift", "min_threshold": 1.1}
+#   POST /prompt           {"top_features": [...]} または {"selected": [...]}
+#
+# ・apriori など CPU を使う処理はプロセスプールで実行する
+# ・同時に処理するリクエスト数と CPU ジョブ数に上限を設け、待ちきれなければ 503
+# ・応答は chunked で順に送る（検索結果は件数が多くても少しずつ流れる）
+
+HOST = os.environ.get("SENTEI_API_HOST", "127.0.0.1")
+PORT = int(os.environ.get("SENTEI_API_PORT", "8600"))
+
+MAX_CONCURRENT_REQUESTS = 64
+MAX_CPU_JOBS = os.cpu_count() or 2
+QUEUE_TIMEOUT = 5.0
+MAX_BODY_BYTES = 1 << 20
+STREAM_CHUNK = 500
+
+VALID_METRICS = {"support", "confidence", "lift", "leverage", "conviction"}
+
+STATUS_TEXT = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# ============================
+# カタログ（バージョンが変わった時だけ読み直す）
+# ============================
+# イベントループを止めないようスレッドで呼ぶので、読み直しはロックで1回に
+_catalog = {"version": None, "df": None}
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    version = catalog_version()
+    with _catalog_lock:
+        if _catalog["version"] != version:
+            _catalog["df"] = load_catalog_frame(columns=FEATURE_COLUMNS)
+            _catalog["version"] = version
+        return _catalog["df"], version
+
+
+def _filter_job(filters):
+    df, _ = get_catalog()
+    return df, filter_catalog(df, filters)
+
+
+def _ratio_job(column, work):
+    df, _ = get_catalog()
+    if work:
+        df = df[df["work"] == work]
+    return make_ratio_df(column, df)
+
+
+# ============================
+# プロセスプール側で動く処理
+# ============================
+def _rules_to_json(rules, limit=50):
+    rows = []
+    for _, row in rules.head(limit).iterrows():
+        rows.append({
+            "antecedents": sorted(row["antecedents"]),
+            "consequents": sorted(row["consequents"]),
+            "support": float(row["support"]),
+            "confidence": float(row["confidence"]),
+            "lift": float(row["lift"]),
+        })
+    return rows
+
+
+def _analysis_job(selected, version, params):
+    df = load_catalog_frame(columns=ATTRIBUTE_COLUMNS)
+    rules, top_features = cached_association(selected, df, version, **params)
+    return {"rules": _rules_to_json(rules), "n_rules": len(rules), "top_features": top_features}
+
+
+# ============================
+# 入力チェック
+# ============================
+def _analysis_params(body):
+    selected = body.get("selected")
+    if not isinstance(selected, list) or not all(isinstance(s, str) for s in selected) or not selected:
+        raise HTTPError(400, "selected must be a non-empty list of image names")
+
+    params = dict(DEFAULT_PARAMS)
+    for key in ("min_support", "min_threshold"):
+        if key in body:
+            try:
+                params[key] = float(body[key])
+            except (TypeError, ValueError):
+                raise HTTPError(400, f"{key} must be a number")
+    if "metric" in body:
+        if body["metric"] not in VALID_METRICS:
+            raise HTTPError(400, f"metric must be one of {sorted(VALID_METRICS)}")
+        params["metric"] = body["metric"]
+    return selected, params
+
+
+def _page_params(body):
+    # offset / limit は 0 以上の整数（limit は省略可）
+    values = {}
+    for key, default in (("offset", 0), ("limit", None)):
+        value = body.get(key, default)
+        if value is None:
+            values[key] = None
+            continue
+        if isinstance(value, bool):
+            raise HTTPError(400, f"{key} must be a non-negative integer")
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise HTTPError(400, f"{key} must be a non-negative integer")
+        if value < 0:
+            raise HTTPError(400, f"{key} must be a non-negative integer")
+        values[key] = value
+    return values["offset"], values["limit"]
+
+
+class Server:
+
+    def __init__(self, max_workers=MAX_CPU_JOBS):
+        self.pool = ProcessPoolExecutor(max_workers=max_workers)
+        self.request_slots = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        self.cpu_slots = asyncio.Semaphore(max_workers)
+        self.in_flight = 0
+        self.served = 0
+
+    # ----------------------------
+    # CPU ジョブ
+    # ----------------------------
+    async def run_cpu(self, fn, *args):
+        try:
+            await asyncio.wait_for(self.cpu_slots.acquire(), QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPError(503, "analysis workers are busy")
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.pool, fn, *args)
+        finally:
+            self.cpu_slots.release()
+
+    async def run_io(self, fn, *args):
+        # カタログの読み込み・絞り込みはスレッドで（イベントループで回すと全接続が止まる）
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def analysis(self, body):
+        selected, params = _analysis_params(body)
+        df, version = await self.run_io(get_catalog)
+
+        unknown = [img for img in selected if img not in df.index]
+        if unknown:
+            raise HTTPError(400, f"unknown images: {unknown[:10]}")
+
+        # 同じ条件の結果がこのプロセスのキャッシュにあればプールに投げない
+        key = analysis_key(selected, version, **params)
+        found, cached = analysis_cache.get(key)
+        if found:
+            rules, top_features = cached
+            return {"rules": _rules_to_json(rules), "n_rules": len(rules), "top_features": top_features}
+
+        return await self.run_cpu(_analysis_job, selected, version, params)
+
+    # ----------------------------
+    # エンドポイント
+    # ----------------------------
+    async def dispatch(self, method, path, query, body):
+        if path == "/health":
+            return self.json_body({
+                "status": "ok",
+                "in_flight": self.in_flight,
+                "served": self.served,
+                "analysis_cache": analysis_cache.stats(),
+            })
+
+        if path == "/catalog/filter":
+            self.require(method, "POST")
+            return await self.filter_stream(body)
+
+        if path == "/stats/ratios":
+            self.require(method, "GET")
+            column = query.get("column", [None])[0]
+            if column not in ATTRIBUTE_COLUMNS:
+                raise HTTPError(400, f"column must be one of {ATTRIBUTE_COLUMNS}")
+            work = query.get("work", [""])[0]
+            ratio = await self.run_io(_ratio_job, column, work)
+            return self.json_body({
+                "column": column,
+                "work": work,
+                "rows": [
+                    {"value": v, "count": int(c), "ratio": float(r)}
+                    for v, c, r in zip(ratio[column], ratio["count"], ratio["ratio (%)"])
+                ],
+            })
+
+        if path == "/analysis":
+            self.require(method, "POST")
+            return self.json_body(await self.analysis(body))
+
+        if path == "/prompt":
+            self.require(method, "POST")
+            top_features = body.get("top_features")
+            if top_features is None:
+                top_features = (await self.analysis(body))["top_features"]
+            if not isinstance(top_features, list):
+                raise HTTPError(400, "top_features must be a list")
+            prompt = build_prompt(top_features)
+            return self.json_body({
+                "prompt": prompt,
+                "negative_prompt": NEGATIVE_PROMPT,
+                "payload": build_payload(prompt),
+            })
+
+        raise HTTPError(404, f"no route for {path}")
+
+    @staticmethod
+    def require(method, expected):
+        if method != expected:
+            raise HTTPError(405, f"use {expected}")
+
+    @staticmethod
+    def json_body(data):
+        yield json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+    async def filter_stream(self, body):
+        filters = body.get("filters") or {}
+        if not isinstance(filters, dict) or any(k not in FEATURE_COLUMNS for k in filters):
+            raise HTTPError(400, f"filters keys must be in {FEATURE_COLUMNS}")
+        if any(not isinstance(v, str) for v in filters.values()):
+            raise HTTPError(400, "filters values must be strings")
+        offset, limit = _page_params(body)
+
+        df, results = await self.run_io(_filter_job, filters)
+        page = results[offset:offset + limit] if limit is not None else results[offset:]
+
+        def generate():
+            yield json.dumps({"total": len(results), "offset": offset})[:-1].encode() + b', "results": ['
+            for start in range(0, len(page), STREAM_CHUNK):
+                chunk = [
+                    {"image": img, "name": df.at[img, "name"], "work": df.at[img, "work"]}
+                    for img in page[start:start + STREAM_CHUNK]
+                ]
+                text = json.dumps(chunk, ensure_ascii=False)[1:-1]
+                yield ((", " if start else "") + text).encode("utf-8")
+            yield b"]}"
+
+        return generate()
+
+    # ----------------------------
+    # HTTP/1.1（keep-alive・chunked）
+    # ----------------------------
+    async def read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "request body too large")
+        raw = await reader.readexactly(length) if length else b""
+
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError:
+            raise HTTPError(400, "body must be JSON")
+        if not isinstance(body, dict):
+            raise HTTPError(400, "body must be a JSON object")
+
+        url = urlsplit(target)
+        keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+        return method, url.path, parse_qs(url.query), body, keep_alive
+
+    @staticmethod
+    async def write_response(writer, status, chunks, keep_alive):
+        head = (
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            "Transfer-Encoding: chunked\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1"))
+        try:
+            for chunk in chunks:
+                if chunk:
+                    writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                    await writer.drain()
+        except ConnectionError:
+            raise
+        except Exception as e:
+            # ヘッダを送った後なので2つ目の応答は書けない。終端を送らずに接続を閉じる
+            raise ConnectionAbortedError(f"response aborted: {e!r}") from e
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await self.read_request(reader)
+                    if request is None:
+                        break
+                    method, path, query, body, keep_alive = request
+
+                    try:
+                        await asyncio.wait_for(self.request_slots.acquire(), QUEUE_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        raise HTTPError(503, "too many concurrent requests")
+
+                    self.in_flight += 1
+                    try:
+                        chunks = await self.dispatch(method, path, query, body)
+                        await self.write_response(writer, 200, chunks, keep_alive)
+                    finally:
+                        self.in_flight -= 1
+                        self.served += 1
+                        self.request_slots.release()
+
+                except HTTPError as e:
+                    await self.write_response(writer, e.status, self.json_body({"error": e.message}), keep_alive)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception:
+                    # 中身はサーバーのログにだけ出し、クライアントには返さない
+                    traceback.print_exc()
+                    await self.write_response(writer, 500, self.json_body({"error": "internal server error"}), False)
+                    break
+
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+async def serve(host=HOST, port=PORT, max_workers=MAX_CPU_JOBS):
+    app = Server(max_workers)
+    server = await asyncio.start_server(app.handle_connection, host, port)
+    print(f"sentei API listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        app.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=MAX_CPU_JOBS)
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.host, args.port, args.workers))
@@ -1,7 +1,11 @@
 import streamlit as st
 import os
 import json
-from PIL import Image
+
+from catalog import apply_feature_edits
+from taxonomy import HAIRSTYLE_MAP, HAIR_COLOR_MAP, ATTRIBUTE_OPTIONS
+from name_index import NameIndex
+from image_store import list_images, open_image
 
 st.set_page_config(layout="wide")
 
@@ -13,73 +17,201 @@ IMAGE_DIR = os.path.join(BASE_DIR, "characters")
 FEATURE_FILE = os.path.join(BASE_DIR, "character_features.json")
 
 # ============================
-# 髪型分類体系（大分類→中分類→細分類）
+# JSON保存
 # ============================
-HAIRSTYLE_MAP = {
-    "straight": {
-        "type": ["long straight", "medium straight", "short straight", "pigtails", "one-length"],
-        "detail": ["center parted", "side parted", "see-through bangs", "straight bangs", "himecut"]
-    },
-    "wavy": {
-        "type": ["loose wave", "medium wave", "strong wave"],
-        "detail": ["fluffy wave", "beach wave"]
-    },
-    "curly": {
-        "type": ["loose curls", "tight curls", "perm curls"],
-        "detail": ["ringlet curls", "afro curls"]
-    },
-    "ponytail": {
-        "type": ["high ponytail", "low ponytail", "side ponytail"],
-        "detail": ["straight ponytail","messy ponytail", "ribbon ponytail"]
-    },
-    "twintail": {
-        "type": ["high twintails", "low twintails", "side twintails", "half-up twintails"],
-        "detail": ["straight twintail","drill twintails", "curly twintails"]
-    },
-    "bob": {
-        "type": ["short bob", "medium bob", "layered bob", "inner curl bob"],
-        "detail": ["straight bob", "wavy bob"]
-    },
-    "braid": {
-        "type": ["single braid", "double braids", "side braid", "half braid", "french braid"],
-        "detail": ["braided ponytail", "braided bun"]
-    },
-    "bun": {
-        "type": ["single bun", "twin buns"],
-        "detail": ["messy bun", "braided bun"]
-    }
-}
+def save_json(selected, changes):
+    # 最新のファイルに、このキャラの変わった項目だけを当てて書く
+    # （一括編集など他のセッションが同じキャラの別の項目を保存していても消さない）
+    # 読み取り専用ページ用の列指向スナップショットも更新される
+    apply_feature_edits({selected: changes}, FEATURE_FILE)
 
 # ============================
-# 髪色分類体系（大分類→中分類）
+# 名前・作品名の検索インデックス
 # ============================
-HAIR_COLOR_MAP = {
-    "black": ["jet black", "soft black"],
-    "brown": ["dark brown", "light brown", "chestnut"],
-    "blonde": ["golden blonde", "ash blonde", "platinum blonde"],
-    "blue": ["dark blue", "light blue", "sky blue"],
-    "red": ["dark red", "light red"],
-    "pink": ["vivid pink", "pastel pink"],
-    "green": ["dark green", "mint green"],
-    "purple": ["dark purple", "lavender"],
-    "white": ["pure white", "off white"],
-    "silver": ["silver", "metallic silver"]
-}
+@st.cache_resource
+def build_name_index(signature, _features):
+    # signature（画像・名前・作品名の組）が変わった時だけ作り直す
+    return NameIndex(_features)
 
 # ============================
-# JSON保存
+# 特徴編集フォーム（フラグメント）
 # ============================
-def save_json():
-    with open(FEATURE_FILE, "w", encoding="utf-8") as f:
-        json.dump(features, f, ensure_ascii=False, indent=4)
-
-def save_if_changed(key, new_value):
-    if key not in st.session_state:
-        st.session_state[key] = new_value
-        return
-    if st.session_state[key] != new_value:
-        st.session_state[key] = new_value
-        save_json()
+# 項目を1つ変えても、このフォームだけを再実行する（画像一覧の radio や
+# プレビュー画像の読み込みはやり直さない）。保存は値が変わった時だけ。
+# 名前・作品名が変わった時は一覧の表示名と検索インデックスも変わるので全体を再実行する。
+@st.fragment
+def edit_form(selected):
+    st.header("特徴データ（編集可能）")
+
+    data = features.get(selected, {
+        "name": "",
+        "work": "",
+        "hair_length": "",
+        "hair_color_main": "",
+        "hair_color_sub": "",
+        "hairstyle_main": "",
+        "hairstyle_type": "",
+        "hairstyle_detail": "",
+        "eye_color": "",
+        "eye_shape": "",
+        "expression": "",
+        "vibe": "",
+        "other": ""
+    })
+
+    # 名前
+    char_name = st.text_input("名前", data["name"], key=f"widget_name_{selected}")
+
+    # 作品名
+    work = st.text_input("作品名", data.get("work", ""), key=f"widget_work_{selected}")
+
+    # 髪色（大分類）
+    hair_color_main_options = [""] + list(HAIR_COLOR_MAP.keys())
+    current_color_main = data.get("hair_color_main", "")
+    hair_color_main = st.selectbox(
+        "髪色（大分類）",
+        hair_color_main_options,
+        index=hair_color_main_options.index(current_color_main) if current_color_main in hair_color_main_options else 0,
+        key=f"widget_hair_color_main_{selected}"
+    )
+
+    # 髪色（中分類）
+    sub_options = [""] if hair_color_main == "" else [""] + HAIR_COLOR_MAP[hair_color_main]
+    current_color_sub = data.get("hair_color_sub", "")
+    hair_color_sub = st.selectbox(
+        "髪色（中分類）",
+        sub_options,
+        index=sub_options.index(current_color_sub) if current_color_sub in sub_options else 0,
+        key=f"widget_hair_color_sub_{selected}"
+    )
+
+    # 髪の長さ
+    hair_length_options = [""] + ATTRIBUTE_OPTIONS["hair_length"]
+    hair_length = st.selectbox(
+        "髪の長さ",
+        hair_length_options,
+        index=hair_length_options.index(data["hair_length"]) if data["hair_length"] in hair_length_options else 0,
+        key=f"widget_hair_length_{selected}"
+    )
+
+    # 髪型（大分類）
+    hairstyle_main_options = [""] + list(HAIRSTYLE_MAP.keys())
+    current_main = data.get("hairstyle_main", "")
+    hairstyle_main = st.selectbox(
+        "髪型（大分類）",
+        hairstyle_main_options,
+        index=hairstyle_main_options.index(current_main) if current_main in hairstyle_main_options else 0,
+        key=f"widget_hairstyle_main_{selected}"
+    )
+
+    # 髪型（中分類）
+    type_options = [""] if hairstyle_main == "" else [""] + HAIRSTYLE_MAP[hairstyle_main]["type"]
+    current_type = data.get("hairstyle_type", "")
+    hairstyle_type = st.selectbox(
+        "髪型（中分類）",
+        type_options,
+        index=type_options.index(current_type) if current_type in type_options else 0,
+        key=f"widget_hairstyle_type_{selected}"
+    )
+
+    # 髪型（細分類）
+    detail_options = [""] if hairstyle_main == "" else [""] + HAIRSTYLE_MAP[hairstyle_main]["detail"]
+    current_detail = data.get("hairstyle_detail", "")
+    hairstyle_detail = st.selectbox(
+        "髪型（細分類）",
+        detail_options,
+        index=detail_options.index(current_detail) if current_detail in detail_options else 0,
+        key=f"widget_hairstyle_detail_{selected}"
+    )
+
+    # 目の色
+    eye_color_options = [""] + ATTRIBUTE_OPTIONS["eye_color"]
+    eye_color = st.selectbox(
+        "目の色",
+        eye_color_options,
+        index=eye_color_options.index(data["eye_color"]) if data["eye_color"] in eye_color_options else 0,
+        key=f"widget_eye_color_{selected}"
+    )
+
+    # 目の形
+    eye_shape_options = [""] + ATTRIBUTE_OPTIONS["eye_shape"]
+    eye_shape = st.selectbox(
+        "目の形",
+        eye_shape_options,
+        index=eye_shape_options.index(data["eye_shape"]) if data["eye_shape"] in eye_shape_options else 0,
+        key=f"widget_eye_shape_{selected}"
+    )
+
+    # 表情
+    expression_options = [""] + ATTRIBUTE_OPTIONS["expression"]
+    expression = st.selectbox(
+        "表情",
+        expression_options,
+        index=expression_options.index(data["expression"]) if data["expression"] in expression_options else 0,
+        key=f"widget_expression_{selected}"
+    )
+
+    # 雰囲気
+    vibe_options = [""] + ATTRIBUTE_OPTIONS["vibe"]
+    vibe = st.selectbox(
+        "雰囲気",
+        vibe_options,
+        index=vibe_options.index(data["vibe"]) if data["vibe"] in vibe_options else 0,
+        key=f"widget_vibe_{selected}"
+    )
+
+    # その他
+    other = st.text_input("その他", data["other"], key=f"widget_other_{selected}")
+
+    # ============================
+    # JSON保存
+    # ============================
+    record = {
+        "name": char_name,
+        "work": work,
+
+        # 髪色（大分類＋中分類）
+        "hair_color_main": hair_color_main,
+        "hair_color_sub": hair_color_sub,
+
+        # 髪の長さ
+        "hair_length": hair_length,
+
+        # 髪型（大分類・中分類・細分類）
+        "hairstyle_main": hairstyle_main,
+        "hairstyle_type": hairstyle_type,
+        "hairstyle_detail": hairstyle_detail,
+
+        # 目
+        "eye_color": eye_color,
+        "eye_shape": eye_shape,
+
+        # 表情・雰囲気
+        "expression": expression,
+        "vibe": vibe,
+
+        # その他
+        "other": other
+    }
+
+    # フォームを開いた時の値から変わった項目だけを保存する（新しいキャラは全項目）
+    # ファイルを読み直した値とは比べない：他のセッションが別の項目を保存した後も、
+    # ウィジェットには開いた時の値が残っているので、それで上書きしてしまう
+    saved = features.get(selected)
+    base = st.session_state.setdefault(f"form_base_{selected}", dict(data))
+    if saved is None:
+        changes = record
+    else:
+        changes = {k: v for k, v in record.items() if v != base.get(k, "")}
+
+    if changes:
+        renamed = any(changes.get(k, "") != base.get(k, "") for k in ("name", "work"))
+        base.update(changes)
+        features[selected] = {**(saved or {}), **changes}
+        save_json(selected, changes)
+        st.success("保存しました！")
+        if renamed:
+            st.rerun()
 
 # ============================
 # JSON読み込み
@@ -98,9 +230,8 @@ else:
 # ============================
 st.title("キャラ管理アプリ（編集＋保存）")
 
-files = os.listdir(IMAGE_DIR)
-image_files = [f for f in files if f.lower().endswith((".png", ".jpg", ".jpeg"))]
-image_files.sort()
+# フォルダとパックファイルの両方から（パックだけの環境でも一覧できる）
+image_files = list_images()
 
 col1, col2 = st.columns([1, 3])
 
@@ -116,21 +247,37 @@ with col1:
     if "selected_image" not in st.session_state:
         st.session_state["selected_image"] = image_files[0]
 
-    all_names = []
-    name_to_img = {}
+    # 検索ページのコンタクトシートから ?char=xxx.png で開かれた場合
+    if st.query_params.get("char") in image_files:
+        st.session_state["selected_image"] = st.query_params["char"]
+        del st.query_params["char"]
 
-    for img in image_files:
-        data = features.get(img, {})
-        name = data.get("name", "")
-        if name:
-            all_names.append(name)
-            name_to_img[name] = img
+    signature = tuple(
+        (img, data.get("name", ""), data.get("work", ""))
+        for img, data in features.items()
+    )
+    name_index = build_name_index(signature, features)
+
+    # ひらがな・カタカナ・全角半角・ローマ字の違いを吸収して検索
+    search_query = st.text_input("名前・作品名で検索（ひらがな／カタカナ／ローマ字）")
 
-    search_name = st.selectbox("名前で検索", [""] + all_names)
+    if search_query:
+        image_set = set(image_files)
+        hits = [img for img, _ in name_index.search(search_query, limit=50) if img in image_set]
 
-    # 検索されたら選択中キャラを書き換え（rerunしない）
-    if search_name:
-        st.session_state["selected_image"] = name_to_img[search_name]
+        if hits:
+            search_pick = st.selectbox(
+                f"検索結果（{len(hits)}件）",
+                [""] + hits,
+                format_func=lambda img: "" if img == "" else
+                    f"{features[img].get('name', '')}（{features[img].get('work', '')}）_{img}"
+            )
+
+            # 検索されたら選択中キャラを書き換え（rerunしない）
+            if search_pick:
+                st.session_state["selected_image"] = search_pick
+        else:
+            st.caption("該当するキャラがいません")
 
     # ============================
     # 画像一覧（radio）
@@ -175,7 +322,7 @@ with col2:
             st.header("画像プレビュー")
             st.markdown("<div style='margin-top:200px;'></div>", unsafe_allow_html=True)
             img_path = os.path.join(IMAGE_DIR, selected)
-            img = Image.open(img_path)
+            img = open_image(img_path)
             st.image(img, width=1500)
 
             # ============================
@@ -200,174 +347,4 @@ with col2:
         # 右：特徴編集フォーム
         # ----------------------------
         with col_form:
-            st.header("特徴データ（編集可能）")
-
-            data = features.get(selected, {
-                "name": "",
-                "work": "",
-                "hair_length": "",
-                "hair_color_main": "",
-                "hair_color_sub": "",
-                "hairstyle_main": "",
-                "hairstyle_type": "",
-                "hairstyle_detail": "",
-                "eye_color": "",
-                "eye_shape": "",
-                "expression": "",
-                "vibe": "",
-                "other": ""
-            })
-
-            # 名前
-            char_name = st.text_input("名前", data["name"], key=f"widget_name_{selected}")
-            save_if_changed(f"data_name_{selected}", char_name)
-
-            # 作品名
-            work = st.text_input("作品名", data.get("work", ""), key=f"widget_work_{selected}")
-            save_if_changed(f"data_work_{selected}", work)
-
-            # 髪色（大分類）
-            hair_color_main_options = [""] + list(HAIR_COLOR_MAP.keys())
-            current_color_main = data.get("hair_color_main", "")
-            hair_color_main = st.selectbox(
-                "髪色（大分類）",
-                hair_color_main_options,
-                index=hair_color_main_options.index(current_color_main) if current_color_main in hair_color_main_options else 0,
-                key=f"widget_hair_color_main_{selected}"
-            )
-            save_if_changed(f"data_hair_color_main_{selected}", hair_color_main)
-
-            # 髪色（中分類）
-            sub_options = [""] if hair_color_main == "" else [""] + HAIR_COLOR_MAP[hair_color_main]
-            current_color_sub = data.get("hair_color_sub", "")
-            hair_color_sub = st.selectbox(
-                "髪色（中分類）",
-                sub_options,
-                index=sub_options.index(current_color_sub) if current_color_sub in sub_options else 0,
-                key=f"widget_hair_color_sub_{selected}"
-            )
-            save_if_changed(f"data_hair_color_sub_{selected}", hair_color_sub)
-
-            # 髪の長さ
-            hair_length_options = ["", "short hair", "medium hair", "long hair"]
-            hair_length = st.selectbox(
-                "髪の長さ",
-                hair_length_options,
-                index=hair_length_options.index(data["hair_length"]) if data["hair_length"] in hair_length_options else 0,
-                key=f"widget_hair_length_{selected}"
-            )
-            save_if_changed(f"data_hair_length_{selected}", hair_length)
-
-            # 髪型（大分類）
-            hairstyle_main_options = [""] + list(HAIRSTYLE_MAP.keys())
-            current_main = data.get("hairstyle_main", "")
-            hairstyle_main = st.selectbox(
-                "髪型（大分類）",
-                hairstyle_main_options,
-                index=hairstyle_main_options.index(current_main) if current_main in hairstyle_main_options else 0,
-                key=f"widget_hairstyle_main_{selected}"
-            )
-            save_if_changed(f"data_hairstyle_main_{selected}", hairstyle_main)
-
-            # 髪型（中分類）
-            type_options = [""] if hairstyle_main == "" else [""] + HAIRSTYLE_MAP[hairstyle_main]["type"]
-            current_type = data.get("hairstyle_type", "")
-            hairstyle_type = st.selectbox(
-                "髪型（中分類）",
-                type_options,
-                index=type_options.index(current_type) if current_type in type_options else 0,
-                key=f"widget_hairstyle_type_{selected}"
-            )
-            save_if_changed(f"data_hairstyle_type_{selected}", hairstyle_type)
-
-            # 髪型（細分類）
-            detail_options = [""] if hairstyle_main == "" else [""] + HAIRSTYLE_MAP[hairstyle_main]["detail"]
-            current_detail = data.get("hairstyle_detail", "")
-            hairstyle_detail = st.selectbox(
-                "髪型（細分類）",
-                detail_options,
-                index=detail_options.index(current_detail) if current_detail in detail_options else 0,
-                key=f"widget_hairstyle_detail_{selected}"
-            )
-            save_if_changed(f"data_hairstyle_detail_{selected}", hairstyle_detail)
-
-            # 目の色
-            eye_color_options = [
-                "", "black eyes", "brown eyes", "blue eyes", "green eyes",
-                "red eyes", "yellow eyes", "purple eyes", "pink eyes", "grey eyes"
-            ]
-            eye_color = st.selectbox(
-                "目の色",
-                eye_color_options,
-                index=eye_color_options.index(data["eye_color"]) if data["eye_color"] in eye_color_options else 0,
-                key=f"widget_eye_color_{selected}"
-            )
-            save_if_changed(f"data_eye_color_{selected}", eye_color)
-
-            # 目の形
-            eye_shape_options = ["", "big eyes", "sharp eyes", "round eyes", "narrow eyes", "droopy eyes"]
-            eye_shape = st.selectbox(
-                "目の形",
-                eye_shape_options,
-                index=eye_shape_options.index(data["eye_shape"]) if data["eye_shape"] in eye_shape_options else 0,
-                key=f"widget_eye_shape_{selected}"
-            )
-            save_if_changed(f"data_eye_shape_{selected}", eye_shape)
-
-            # 表情
-            expression_options = ["", "smiling", "serious expression", "angry", "shy", "sad", "surprised"]
-            expression = st.selectbox(
-                "表情",
-                expression_options,
-                index=expression_options.index(data["expression"]) if data["expression"] in expression_options else 0,
-                key=f"widget_expression_{selected}"
-            )
-            save_if_changed(f"data_expression_{selected}", expression)
-
-            # 雰囲気
-            vibe_options = ["", "cute girl", "cool girl", "elegant girl", "energetic girl", "mysterious girl"]
-            vibe = st.selectbox(
-                "雰囲気",
-                vibe_options,
-                index=vibe_options.index(data["vibe"]) if data["vibe"] in vibe_options else 0,
-                key=f"widget_vibe_{selected}"
-            )
-            save_if_changed(f"data_vibe_{selected}", vibe)
-
-            # その他
-            other = st.text_input("その他", data["other"], key=f"widget_other_{selected}")
-            save_if_changed(f"data_other_{selected}", other)
-
-            # ============================
-            # JSON保存
-            # ============================
-            features[selected] = {
-                "name": st.session_state.get(f"data_name_{selected}", ""),
-                "work": st.session_state.get(f"data_work_{selected}", ""),
-
-                # 髪色（大分類＋中分類）
-                "hair_color_main": st.session_state.get(f"data_hair_color_main_{selected}", ""),
-                "hair_color_sub": st.session_state.get(f"data_hair_color_sub_{selected}", ""),
-
-                # 髪の長さ
-                "hair_length": st.session_state.get(f"data_hair_length_{selected}", ""),
-
-                # 髪型（大分類・中分類・細分類）
-                "hairstyle_main": st.session_state.get(f"data_hairstyle_main_{selected}", ""),
-                "hairstyle_type": st.session_state.get(f"data_hairstyle_type_{selected}", ""),
-                "hairstyle_detail": st.session_state.get(f"data_hairstyle_detail_{selected}", ""),
-
-                # 目
-                "eye_color": st.session_state.get(f"data_eye_color_{selected}", ""),
-                "eye_shape": st.session_state.get(f"data_eye_shape_{selected}", ""),
-
-                # 表情・雰囲気
-                "expression": st.session_state.get(f"data_expression_{selected}", ""),
-                "vibe": st.session_state.get(f"data_vibe_{selected}", ""),
-
-                # その他
-                "other": st.session_state.get(f"data_other_{selected}", "")
-            }
-
-            save_json()
-            st.success("保存しました！")
+            edit_form(selected)
@@ -0,0 +1,305 @@
+import os
+import itertools
+
+import numpy as np
+
+from lazy_imports import lazy_import
+from catalog import BASE_DIR, ATTRIBUTE_COLUMNS
+from result_cache import ResultCache, canonical_key
+from taxonomy import COLUMN_LEVELS, PARENT_COLUMNS, parents, split_feature
+
+pd = lazy_import("pandas")
+
+# ============================
+# 連関分析（アソシエーション分析）
+# ============================
+
+# 重み付け（専用最適化）。上から順に列名に含まれるかを調べる
+FEATURE_WEIGHTS = [
+    # 髪型（最重要）
+    ("hairstyle_detail", 3.0),
+    ("hairstyle_type", 2.5),
+    ("hairstyle_main", 2.0),
+
+    # 髪の長さ
+    ("hair_length", 2.0),
+
+    # 髪色（大分類・中分類）
+    ("hair_color_main", 1.8),
+    ("hair_color_sub", 1.5),
+
+    # 目の色・形（中間）
+    ("eye_color", 1.0),
+    ("eye_shape", 0.8),
+
+    # 表情・雰囲気（弱め）
+    ("expression", 0.5),
+    ("vibe", 0.5),
+]
+
+DEFAULT_PARAMS = {
+    "min_support": 0.25,
+    "metric": "lift",
+    "min_threshold": 1.1,
+}
+
+# 階層ごとの最小支持度（min_support に掛ける）。細かい分類ほど出現が少ないので下げる
+LEVEL_SUPPORT = {0: 1.0, 1: 0.9, 2: 0.8}
+
+# 選択が少ない時でも、1回しか出てこない組み合わせは頻出とみなさない
+# （1行ぶんの特徴の全ての部分集合が頻出になり、ルール数が爆発する）
+# 連関分析ページの結果も変わる：選んだキャラのうち1人にしか無い組み合わせのルールは出なくなる。
+# 以前と同じ数え方にしたい時は min_count=1 を渡す
+MIN_COUNT = 2
+
+RULE_COLUMNS = [
+    "antecedents", "consequents", "antecedent support", "consequent support",
+    "support", "confidence", "lift", "leverage", "conviction",
+]
+
+
+def one_hot(df):
+    # One-hot 化して name_〇〇, other_〇〇, work_〇〇 を完全に除去
+    df_hot = pd.get_dummies(df)
+    return df_hot[[c for c in df_hot.columns
+                   if not c.startswith("name_")
+                   and not c.startswith("other_")
+                   and not c.startswith("work_")]]
+
+
+def apply_weights(df_hot, weights=FEATURE_WEIGHTS):
+    # 列ごとの倍率を先に決めてから1回で掛ける
+    scale = np.ones(df_hot.shape[1])
+    for j, col in enumerate(df_hot.columns):
+        for key, weight in weights:
+            if key in col:
+                scale[j] = weight
+                break
+    df_hot = df_hot.astype(float) * scale
+
+    # 正規化（重みの暴れを抑える）
+    return df_hot / df_hot.max()
+
+
+def mine_rules(df, min_support=0.25, metric="lift", min_threshold=1.1, weights=FEATURE_WEIGHTS):
+    return mine_rules_from_hot(one_hot(df), min_support, metric, min_threshold, weights)
+
+
+def mine_rules_from_hot(df_hot, min_support=0.25, metric="lift", min_threshold=1.1, weights=FEATURE_WEIGHTS,
+                        level_support=LEVEL_SUPPORT, min_count=MIN_COUNT):
+    # One-hot 済みの表から（パラメータ探索ではワーカー間で共有した行列を渡す）
+    # 重みは列ごとに最大値で割り戻されるので、出現の有無（0 / 1）として数える
+    df_hot = apply_weights(df_hot, weights)
+    columns = list(df_hot.columns)
+    X = df_hot.to_numpy() > 0
+
+    supports, item_min = mine_itemsets(X, columns, min_support, level_support, min_count)
+    rules = generate_rules(supports, item_min, columns, metric, min_threshold)
+    rules = prune_redundant(rules, columns, metric)
+    return rules.sort_values(metric, ascending=False)
+
+
+# ============================
+# 分類体系つきの多段階マイニング
+# ============================
+# 髪色・髪型は大分類と中分類・細分類が別の列にあるので、
+# そのままの apriori では「ponytail → high ponytail」のような分類体系から自明なルールに
+# 候補の大半を使ってしまう。
+# ・祖先と子孫の特徴は同じ候補に入れない（候補生成の時点で落とす）
+# ・最小支持度は階層ごとに変える（候補の閾値 = 含まれる特徴の閾値の最小、MSapriori）
+# ・より一般的なルール（前件が少ない・特徴を親に置き換えた）が指標で負けない特化ルールは捨てる
+def item_parents(columns, attributes=ATTRIBUTE_COLUMNS):
+    # One-hot の列番号 → 親の特徴の列番号の集合
+    index = {feature: i for i, feature in enumerate(columns)}
+    result = {}
+    for i, feature in enumerate(columns):
+        item = split_feature(feature, attributes)
+        if item is None:
+            continue
+        col, value = item
+        parent_features = [f"{PARENT_COLUMNS.get(col)}_{p}" for p in parents(col, value)]
+        found = {index[f] for f in parent_features if f in index}
+        if found:
+            result[i] = found
+    return result
+
+
+def item_levels(columns, attributes=ATTRIBUTE_COLUMNS):
+    levels = []
+    for feature in columns:
+        item = split_feature(feature, attributes)
+        levels.append(COLUMN_LEVELS.get(item[0], 0) if item is not None else 0)
+    return levels
+
+
+def related_pairs(columns):
+    # 祖先・子孫の組（親の親まで辿る）
+    parent_map = item_parents(columns)
+    pairs = set()
+    for child in parent_map:
+        stack = list(parent_map[child])
+        while stack:
+            ancestor = stack.pop()
+            if (child, ancestor) not in pairs:
+                pairs.add((child, ancestor))
+                pairs.add((ancestor, child))
+                stack.extend(parent_map.get(ancestor, ()))
+    return pairs
+
+
+def mine_itemsets(X, columns, min_support, level_support=LEVEL_SUPPORT, min_count=MIN_COUNT):
+    # 戻り値: ({列番号のタプル: 支持度}, 特徴ごとの最小支持度)
+    # 候補は全特徴の閾値の最小で数える（下方閉包を保つので部分集合の支持度は必ず残る）
+    n_rows = len(X)
+    if n_rows == 0:
+        return {}, np.zeros(len(columns))
+
+    item_min = np.array([min_support * level_support.get(level, 1.0) for level in item_levels(columns)])
+    floor = item_min.min() if len(item_min) else min_support
+    related = related_pairs(columns)
+
+    # 行の集合は Python の整数のビット列で持ち、AND と bit_count で数える
+    bits = [int.from_bytes(np.packbits(X[:, i], bitorder="little").tobytes(), "little")
+            for i in range(X.shape[1])]
+    min_count = max(floor * n_rows, min_count) - 1e-9
+
+    supports = {}
+    level = {}
+    for i, b in enumerate(bits):
+        count = b.bit_count()
+        if count >= min_count:
+            level[(i,)] = b
+            supports[(i,)] = count / n_rows
+
+    while level:
+        # 同じ接頭辞の候補どうしをつなぐ（末尾の2つが祖先・子孫なら作らない）
+        by_prefix = {}
+        for itemset in sorted(level):
+            by_prefix.setdefault(itemset[:-1], []).append(itemset)
+
+        next_level = {}
+        for group in by_prefix.values():
+            for a in range(len(group)):
+                for b in range(a + 1, len(group)):
+                    last_a, last_b = group[a][-1], group[b][-1]
+                    if (last_a, last_b) in related:
+                        continue
+                    candidate = group[a] + (last_b,)
+                    # 全ての部分集合が頻出でなければ数えない
+                    if any(candidate[:k] + candidate[k + 1:] not in level for k in range(len(candidate) - 2)):
+                        continue
+                    b_rows = level[group[a]] & bits[last_b]
+                    count = b_rows.bit_count()
+                    if count >= min_count:
+                        next_level[candidate] = b_rows
+                        supports[candidate] = count / n_rows
+        level = next_level
+
+    return supports, item_min
+
+
+def generate_rules(supports, item_min, columns, metric="lift", min_threshold=1.1):
+    rows = []
+    for itemset, support in supports.items():
+        # 報告する頻出集合は、含まれる特徴の閾値の最小を満たすもの
+        if len(itemset) < 2 or support < item_min[list(itemset)].min() - 1e-9:
+            continue
+        for r in range(1, len(itemset)):
+            for antecedent in itertools.combinations(itemset, r):
+                consequent = tuple(i for i in itemset if i not in antecedent)
+                s_a, s_c = supports[antecedent], supports[consequent]
+                confidence = support / s_a
+                values = {
+                    "support": support,
+                    "confidence": confidence,
+                    "lift": confidence / s_c,
+                    "leverage": support - s_a * s_c,
+                    "conviction": (1 - s_c) / (1 - confidence) if confidence < 1 else np.inf,
+                }
+                # 閾値に届かないルールは列名の集合を作る前に捨てる
+                if values[metric] < min_threshold:
+                    continue
+                rows.append((
+                    frozenset(columns[i] for i in antecedent),
+                    frozenset(columns[i] for i in consequent),
+                    s_a, s_c, *values.values(),
+                ))
+
+    return pd.DataFrame(rows, columns=RULE_COLUMNS)
+
+
+def prune_redundant(rules, columns, metric="lift"):
+    # 前件を1つ減らした・特徴を親に置き換えたルールが同じ結論で指標が同じ以上なら冗長
+    if len(rules) == 0:
+        return rules
+
+    parent_names = {
+        columns[child]: [columns[p] for p in ps] for child, ps in item_parents(columns).items()
+    }
+    values = rules[metric].to_numpy()
+    score = {(a, c): v for a, c, v in zip(rules["antecedents"], rules["consequents"], values)}
+
+    def generalizations(antecedent, consequent):
+        if len(antecedent) > 1:
+            for item in antecedent:
+                yield antecedent - {item}, consequent
+        for item in antecedent:
+            for parent in parent_names.get(item, ()):
+                yield (antecedent - {item}) | {parent}, consequent
+        for item in consequent:
+            for parent in parent_names.get(item, ()):
+                yield antecedent, (consequent - {item}) | {parent}
+
+    keep = [
+        not any(score.get(general, -np.inf) >= value - 1e-9 for general in generalizations(a, c))
+        for a, c, value in zip(rules["antecedents"], rules["consequents"], values)
+    ]
+    return rules[keep].reset_index(drop=True)
+
+
+def extract_top_features(rules):
+    top_features = set()
+    for _, row in rules.iterrows():
+        top_features |= row["antecedents"]
+        top_features |= row["consequents"]
+    return list(top_features)
+
+
+# ============================
+# 結果キャッシュ（全セッション共有）
+# ============================
+# キー = (選択画像の多重集合, カタログのバージョン, 重み表, パラメータ, 階層ごとの支持度, 最小出現回数,
+#        アルゴリズムの版)
+# mine_rules の数え方・枝刈りを変えたら ALGORITHM_VERSION を上げる（ディスク上の古い結果を使わなくなる）
+ALGORITHM_VERSION = 1
+
+ANALYSIS_CACHE_DIR = os.path.join(BASE_DIR, ".cache", "association")
+
+analysis_cache = ResultCache(maxsize=256, disk_dir=ANALYSIS_CACHE_DIR)
+
+
+def analysis_key(selected, catalog_version, weights=FEATURE_WEIGHTS, **params):
+    params = {**DEFAULT_PARAMS, **params}
+    return canonical_key(
+        "association",
+        sorted(selected),
+        catalog_version,
+        [list(w) for w in weights],
+        params,
+        sorted(LEVEL_SUPPORT.items()),
+        MIN_COUNT,
+        ALGORITHM_VERSION,
+    )
+
+
+def cached_association(selected, catalog_df, catalog_version, weights=FEATURE_WEIGHTS, **params):
+    # 戻り値: (rules, top_features)
+    params = {**DEFAULT_PARAMS, **params}
+    key = analysis_key(selected, catalog_version, weights, **params)
+
+    def compute():
+        df = catalog_df.loc[selected].reset_index(drop=True)
+        rules = mine_rules(df, weights=weights, **params)
+        return rules, extract_top_features(rules)
+
+    return analysis_cache.get_or_compute(key, compute)
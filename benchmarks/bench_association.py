@@ -0,0 +1,104 @@
+import os
+import sys
+import time
+import random
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mlxtend.frequent_patterns import apriori, association_rules
+
+from catalog import ATTRIBUTE_COLUMNS, load_catalog_frame
+from association import one_hot, mine_itemsets, generate_rules, prune_redundant, related_pairs, LEVEL_SUPPORT
+from api_server import VALID_METRICS
+
+# ============================
+# 連関分析：apriori（mlxtend）と分類体系つきの多段階マイニング
+# ============================
+# 実カタログから好みに偏った選択を N_PICKS 回作り、min_support ごとに
+# 頻出集合の数・ルール数・所要時間を比べる。
+N_PICKS = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+SUPPORTS = [0.1, 0.15, 0.2, 0.25]
+METRIC, MIN_THRESHOLD = "lift", 1.1
+REPEAT = 5
+
+# 指標ごとの閾値（mlxtend との一致確認用）
+PARITY_THRESHOLDS = {"support": 0.15, "confidence": 0.5, "lift": 1.1, "leverage": 0.01, "conviction": 1.1}
+
+catalog_df = load_catalog_frame(columns=ATTRIBUTE_COLUMNS)
+
+# 長い髪・ツインテール寄りの好み（当てはまるキャラほど選ばれやすい）
+rng = random.Random(0)
+weights = [
+    1 + 3 * (row.hair_length == "long hair") + 4 * (row.hairstyle_main == "twintail")
+    for row in catalog_df.itertuples()
+]
+selected = rng.choices(list(catalog_df.index), weights=weights, k=N_PICKS)
+
+df_hot = one_hot(catalog_df.loc[selected].reset_index(drop=True))
+columns = list(df_hot.columns)
+X = df_hot.to_numpy(dtype=bool)
+
+
+def best_time(fn):
+    times = []
+    for _ in range(REPEAT):
+        t = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t)
+    return result, min(times) * 1000
+
+
+def run_flat(min_support):
+    frequent = apriori(df_hot.astype(bool), min_support=min_support, use_colnames=True)
+    if len(frequent) == 0:
+        return 0, 0
+    return len(frequent), len(association_rules(frequent, metric=METRIC, min_threshold=MIN_THRESHOLD))
+
+
+def run_multilevel(min_support, level_support):
+    supports, item_min = mine_itemsets(X, columns, min_support, level_support)
+    rules = generate_rules(supports, item_min, columns, METRIC, MIN_THRESHOLD)
+    return len(supports), len(rules), len(prune_redundant(rules, columns, METRIC))
+
+
+def check_parity(min_support=0.1):
+    # 階層ごとの支持度を外せば、祖先・子孫の組を含まないルールは mlxtend と同じになるはず
+    related = {(columns[a], columns[b]) for a, b in related_pairs(columns)}
+    frequent = apriori(df_hot.astype(bool), min_support=min_support, use_colnames=True)
+    supports, item_min = mine_itemsets(X, columns, min_support, {}, min_count=1)
+    for metric in sorted(VALID_METRICS):
+        threshold = PARITY_THRESHOLDS[metric]
+        expected = association_rules(frequent, metric=metric, min_threshold=threshold)
+        expected = expected[[
+            not any((a, b) in related for a in items for b in items)
+            for items in (a | c for a, c in zip(expected["antecedents"], expected["consequents"]))
+        ]]
+        actual = generate_rules(supports, item_min, columns, metric, threshold)
+
+        def by_rule(rules):
+            return {(a, c): row for a, c, row in zip(
+                rules["antecedents"], rules["consequents"],
+                rules[["support", "confidence", "lift", "leverage", "conviction"]].to_numpy())}
+
+        want, got = by_rule(expected), by_rule(actual)
+        assert want.keys() == got.keys(), f"{metric}: {len(want)} rules in mlxtend, {len(got)} here"
+        for rule, row in want.items():
+            assert np.allclose(row, got[rule], equal_nan=True), f"{metric}: {rule} {row} != {got[rule]}"
+        print(f"parity {metric:>10} >= {threshold:<5}: {len(got)} rules match mlxtend")
+
+
+check_parity()
+print()
+print(f"{N_PICKS} picks, {len(columns)} one-hot columns, level support {LEVEL_SUPPORT}")
+print(f"{'support':>8} | {'apriori':^24} | {'taxonomy (flat)':^31} | {'taxonomy (levels)':^31}")
+print(f"{'':>8} | {'sets':>5} {'rules':>6} {'ms':>9} | {'sets':>5} {'rules':>6} {'pruned':>6} {'ms':>9}"
+      f" | {'sets':>5} {'rules':>6} {'pruned':>6} {'ms':>9}")
+for min_support in SUPPORTS:
+    (n_sets, n_rules), t_flat = best_time(lambda: run_flat(min_support))
+    (f_sets, f_rules, f_pruned), t_tax = best_time(lambda: run_multilevel(min_support, {}))
+    (l_sets, l_rules, l_pruned), t_lvl = best_time(lambda: run_multilevel(min_support, LEVEL_SUPPORT))
+    print(f"{min_support:>8} | {n_sets:>5} {n_rules:>6} {t_flat:>9.1f} | "
+          f"{f_sets:>5} {f_rules:>6} {f_pruned:>6} {t_tax:>9.1f} | "
+          f"{l_sets:>5} {l_rules:>6} {l_pruned:>6} {t_lvl:>9.1f}")
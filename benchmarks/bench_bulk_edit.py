@@ -0,0 +1,62 @@
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import FEATURE_FILE, load_features, publish_snapshot, save_features, apply_feature_edits
+from taxonomy import ATTRIBUTE_OPTIONS
+
+# ============================
+# 注釈の保存：1キャラずつ保存 vs 一括編集の1回の書き込み
+# ============================
+# N_RECORDS 件の合成カタログで N_EDITS キャラの「雰囲気」を書き換える。
+# 以前はキャラごとに JSON 全体とスナップショットを書き直していた。
+N_RECORDS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+N_EDITS = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+
+
+def make_catalog(n):
+    base = list(load_features(FEATURE_FILE).values())
+    rng = random.Random(0)
+    catalog = {}
+    for i in range(n):
+        data = dict(rng.choice(base))
+        data["name"] = f"{data.get('name', '')}_{i}"
+        catalog[f"{i:07d}.png"] = data
+    return catalog
+
+
+rng = random.Random(1)
+features = make_catalog(N_RECORDS)
+edits = {
+    img: {"vibe": rng.choice(ATTRIBUTE_OPTIONS["vibe"])}
+    for img in rng.sample(sorted(features), N_EDITS)
+}
+
+with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, "character_features.json")
+    save_features(features, path)
+
+    # 以前の方式（1キャラごとに丸ごと書き直し）
+    t = time.perf_counter()
+    for img, changes in edits.items():
+        features[img].update(changes)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(features, f, ensure_ascii=False, indent=4)
+        publish_snapshot(features, path)
+    t_each = time.perf_counter() - t
+
+    # 一括編集（差分をまとめて1回）
+    save_features(make_catalog(N_RECORDS), path)
+    t = time.perf_counter()
+    saved = apply_feature_edits(edits, path)
+    t_batch = time.perf_counter() - t
+    assert all(saved[img]["vibe"] == changes["vibe"] for img, changes in edits.items())
+
+print(f"{N_RECORDS} records, {N_EDITS} edited")
+print(f"save per character : {N_EDITS} writes  {t_each:8.2f} s  ({t_each / N_EDITS * 1000:.1f} ms each)")
+print(f"batched commit     : 1 write    {t_batch:8.2f} s  x{t_each / t_batch:.0f}")
@@ -0,0 +1,65 @@
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import FEATURE_FILE, load_features, publish_snapshot, load_snapshot
+
+# ============================
+# JSON 読み込み vs 列指向スナップショット（mmap）
+# ============================
+# 実データの値を使って N 件の合成カタログを作り、読み込み時間を比べる
+N_RECORDS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+REPEAT = 5
+PAGE_COLUMNS = ["work", "hair_length", "hair_color_main", "hairstyle_main", "eye_color"]
+
+
+def make_catalog(n):
+    base = list(load_features(FEATURE_FILE).values())
+    rng = random.Random(0)
+    catalog = {}
+    for i in range(n):
+        data = dict(rng.choice(base))
+        data["name"] = f"{data.get('name', '')}_{i}"
+        catalog[f"{i:07d}.png"] = data
+    return catalog
+
+
+def best_of(fn):
+    times = []
+    for _ in range(REPEAT):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return min(times)
+
+
+def load_json_path(path):
+    with open(path, "r", encoding="utf-8") as f:
+        features = json.load(f)
+    return pd.DataFrame.from_dict(features, orient="index").fillna("")
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, "character_features.json")
+    features = make_catalog(N_RECORDS)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(features, f, ensure_ascii=False, indent=4)
+    publish_snapshot(features, path)
+
+    t_json = best_of(lambda: load_json_path(path))
+    t_all = best_of(lambda: load_snapshot(None, path))
+    t_cols = best_of(lambda: load_snapshot(PAGE_COLUMNS, path))
+    t_cat = best_of(lambda: load_snapshot(PAGE_COLUMNS, path, categorical=True))
+
+print(f"records: {N_RECORDS}")
+print(f"json.load + DataFrame          : {t_json * 1000:8.1f} ms")
+print(f"snapshot (all columns)         : {t_all * 1000:8.1f} ms  x{t_json / t_all:.1f}")
+print(f"snapshot (page columns)        : {t_cols * 1000:8.1f} ms  x{t_json / t_cols:.1f}")
+print(f"snapshot (page cols, category) : {t_cat * 1000:8.1f} ms  x{t_json / t_cat:.1f}")
@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from catalog import ATTRIBUTE_COLUMNS
+from clustering import CatalogClusters
+
+# ============================
+# ミニバッチ k-means：100万件の学習・割り当てと追加分の増分更新
+# ============================
+N_ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+N_NEW = 10_000
+
+
+def check_edits():
+    # 注釈を入れた行は入れた特徴のクラスタへ移り、消した行は件数から外れる
+    groups = {"a": "long hair", "b": "short hair", "c": "medium hair"}
+    rows = {f"{g}{i}.png": {"hair_length": v, "eye_color": f"{g} eyes"} for g, v in groups.items() for i in range(50)}
+    rows["blank.png"] = {"hair_length": "", "eye_color": ""}
+    small = pd.DataFrame.from_dict(rows, orient="index").reindex(columns=ATTRIBUTE_COLUMNS, fill_value="")
+
+    clusters = CatalogClusters(path=None, n_clusters=4)
+    clusters.rebuild(small, embeddings=None)
+    assert clusters.label_of("blank.png") != clusters.label_of("b0.png")
+
+    edited = small.copy()
+    edited.loc["blank.png", ["hair_length", "eye_color"]] = ["short hair", "b eyes"]
+    edited = edited.drop(index=["a0.png", "a1.png"])
+    changed = clusters.update(edited, embeddings=None)
+
+    assert changed == 3, changed   # 1 行の変更 + 2 行の削除
+    assert clusters.label_of("blank.png") == clusters.label_of("b0.png")
+    assert clusters.label_of("a0.png") is None
+    assert clusters.sizes().sum() == len(edited)
+    assert clusters.update(edited, embeddings=None) == 0
+    print("edit check: edited row moved to its new cluster, removed rows dropped")
+
+
+check_edits()
+
+rng = np.random.default_rng(0)
+df = pd.DataFrame(
+    {
+        col: pd.Categorical.from_codes(
+            rng.integers(0, 10, N_ROWS), categories=[f"{col}_{k}" for k in range(10)]
+        )
+        for col in ATTRIBUTE_COLUMNS
+    },
+    index=pd.Index([f"{i:07d}.png" for i in range(N_ROWS)]),
+)
+base = df.iloc[:N_ROWS - N_NEW]
+
+clusters = CatalogClusters(path=None, n_clusters=12)
+
+tracemalloc.start()
+t = time.perf_counter()
+clusters.rebuild(base, epochs=1)
+t_rebuild = time.perf_counter() - t
+_, peak_rebuild = tracemalloc.get_traced_memory()
+
+tracemalloc.reset_peak()
+t = time.perf_counter()
+added = clusters.update(df)
+t_update = time.perf_counter() - t
+_, peak_update = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+
+one_hot_bytes = N_ROWS * len(clusters.encoder.items) * 4
+print(f"rows: {N_ROWS}  features: {len(clusters.encoder.items)}  clusters: {clusters.n_clusters}")
+print(f"rebuild (1 epoch + assign): {t_rebuild:.2f} s  peak alloc: {peak_rebuild / 1e6:.0f} MB "
+      f"(full one-hot would be {one_hot_bytes / 1e6:.0f} MB)")
+print(f"update (+{added} new): {t_update:.2f} s  peak alloc: {peak_update / 1e6:.0f} MB")
+print(f"sizes: {clusters.sizes().tolist()}")
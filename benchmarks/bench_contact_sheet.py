@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from catalog import IMAGE_DIR, load_features
+from contact_sheet import TARGET_HEIGHT, CANVAS_SIZE, contact_sheet_html
+
+# ============================
+# 検索結果60件の描画：st.image ×60 vs コンタクトシート1枚
+# ============================
+N_RESULTS = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+REPEAT = 5
+
+
+def render_individual(paths):
+    # 旧実装：1件ずつ開いて貼り付け、st.image と同様に PNG へエンコード
+    messages = []
+    for path in paths:
+        img = Image.open(path).convert("RGB")
+        w, h = img.size
+        new_w = int(w * (TARGET_HEIGHT / h))
+        img = img.resize((new_w, TARGET_HEIGHT))
+        canvas = Image.new("RGB", (CANVAS_SIZE, CANVAS_SIZE), (255, 255, 255))
+        canvas.paste(img, ((CANVAS_SIZE - new_w) // 2, (CANVAS_SIZE - TARGET_HEIGHT) // 2))
+        buffer = BytesIO()
+        canvas.save(buffer, format="PNG")
+        messages.append(buffer.getvalue())
+    return messages
+
+
+def render_sheet(items):
+    return [contact_sheet_html(items, columns=6)]
+
+
+def best_of(fn):
+    times = []
+    for _ in range(REPEAT):
+        t = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t)
+    return min(times), result
+
+
+features = load_features()
+images = sorted(features)
+paths = [os.path.join(IMAGE_DIR, images[i % len(images)]) for i in range(N_RESULTS)]
+items = [(os.path.basename(p), p, features[os.path.basename(p)].get("name", "")) for p in paths]
+
+t_old, old_messages = best_of(lambda: render_individual(paths))
+
+t = time.perf_counter()
+render_sheet(items)
+t_cold = time.perf_counter() - t
+t_new, new_messages = best_of(lambda: render_sheet(items))
+
+print(f"results: {N_RESULTS}")
+print(f"st.image per result   : {t_old * 1000:8.1f} ms  messages={len(old_messages)}  bytes={sum(map(len, old_messages))}")
+print(f"contact sheet (cold)  : {t_cold * 1000:8.1f} ms")
+print(f"contact sheet (cached): {t_new * 1000:8.1f} ms  messages={len(new_messages)}  bytes={sum(map(len, new_messages))}")
+print(f"speedup (cached)      : x{t_old / t_new:.1f}")
@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from catalog import ATTRIBUTE_COLUMNS, encode_codes, facet_counts, filter_catalog
+
+# ============================
+# 検索サイドバーのファセット件数：10万件
+# ============================
+N_ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+COLUMNS = ["name", "work"] + ATTRIBUTE_COLUMNS
+
+rng = random.Random(0)
+VALUES = {col: [f"{col}_{k}" for k in range(12)] for col in ATTRIBUTE_COLUMNS}
+VALUES["work"] = [f"work_{k}" for k in range(300)]
+
+df = pd.DataFrame(
+    {
+        "name": [f"name_{i}" for i in range(N_ROWS)],
+        **{col: [rng.choice(VALUES[col]) for _ in range(N_ROWS)] for col in VALUES},
+    },
+    index=[f"{i:07d}.png" for i in range(N_ROWS)],
+)[COLUMNS]
+
+t = time.perf_counter()
+codes, values, lookup = encode_codes(df, COLUMNS)
+t_encode = time.perf_counter() - t
+
+# 条件の数を変えて計測
+cases = [{}, {"hair_length": "hair_length_0"},
+         {"hair_length": "hair_length_0", "eye_color": "eye_color_3", "work": "work_7"}]
+
+for filters in cases:
+    selected = [filters.get(col, "") for col in COLUMNS]
+    latencies = []
+    for _ in range(10):
+        t = time.perf_counter()
+        matched, facets = facet_counts(codes, lookup, selected)
+        latencies.append(time.perf_counter() - t)
+
+    # 検算：結果件数と、1列だけ外した時の件数
+    assert int(matched.sum()) == len(filter_catalog(df, filters))
+    for col in filters:
+        other = {k: v for k, v in filters.items() if k != col}
+        expected = df.loc[filter_catalog(df, other), col].value_counts()
+        j = COLUMNS.index(col)
+        assert all(facets[j][lookup[j][v]] == n for v, n in expected.items())
+
+    latencies.sort()
+    print(f"filters: {len(filters)}  results: {int(matched.sum())}  "
+          f"p50: {latencies[5] * 1000:.1f} ms  max: {latencies[-1] * 1000:.1f} ms")
+
+print(f"rows: {N_ROWS}  encode (once per catalog version): {t_encode * 1000:.0f} ms")
@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+import atexit
+import shutil
+import tempfile
+import functools
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import prepare_workdir
+
+# ============================
+# フラグメントだけの再実行とページ全体の再実行の比較
+# ============================
+# 同じ操作を「ページ全体の再実行」（フラグメント化する前と同じ）と
+# 「そのフラグメントだけの再実行」（ブラウザでクリックした時の動き）で時間を測る。
+#   pick   … キャラ選択ページで候補をクリック
+#   edit   … 特徴編集フォームの選択肢を変更（保存を含む）
+#   paging … 検索結果のページ送り
+# AppTest は常に全体を再実行するので、フラグメントの再実行は
+# 再実行要求にフラグメント ID を付けて再現する。
+N_STEPS = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+
+workdir = tempfile.mkdtemp(prefix="sentei-fragments-")
+atexit.register(shutil.rmtree, workdir, ignore_errors=True)
+prepare_workdir(workdir)
+os.chdir(workdir)
+sys.path.insert(0, workdir)
+
+from streamlit.testing.v1 import AppTest
+import streamlit.testing.v1.local_script_runner as local_script_runner
+from streamlit.runtime.scriptrunner import RerunData
+
+
+def timed_run(at, fragment):
+    if fragment:
+        fragment_ids = list(at._fragment_storage._fragments)
+        local_script_runner.RerunData = functools.partial(
+            RerunData, fragment_id_queue=fragment_ids, is_fragment_scoped_rerun=True
+        )
+    try:
+        t = time.perf_counter()
+        at.run()
+        return time.perf_counter() - t
+    finally:
+        local_script_runner.RerunData = RerunData
+
+
+def open_page(page):
+    at = AppTest.from_file(os.path.abspath("app.py"), default_timeout=120)
+    if page != "app.py":
+        at.switch_page(page)
+    return at.run()
+
+
+def bench_pick(fragment):
+    at = open_page("pages/3キャラ選択.py")
+    [b for b in at.button if b.label == "スタート"][0].click()
+    at.run()
+    timings = []
+    for _ in range(min(N_STEPS, 9)):
+        pick = [b for b in at.button if (b.key or "").startswith("pick_")][0]
+        pick.click()
+        timings.append(timed_run(at, fragment))
+    return timings
+
+
+def bench_edit(fragment):
+    at = open_page("app.py")
+    selected = at.session_state["selected_image"]
+    timings = []
+    for k in range(N_STEPS):
+        at.selectbox(key=f"widget_vibe_{selected}").set_value(["cute girl", "cool girl"][k % 2])
+        timings.append(timed_run(at, fragment))
+    return timings
+
+
+def bench_paging(fragment):
+    at = open_page("pages/1キャラ検索.py")
+    if not at.number_input:
+        return []
+    page_input = at.number_input[0]
+    timings = []
+    for k in range(N_STEPS):
+        page_input.set_value(2 if k % 2 == 0 else 1)
+        timings.append(timed_run(at, fragment))
+    return timings
+
+
+# 初回の import・キャッシュ作成を計測に含めない
+for bench in (bench_pick, bench_edit, bench_paging):
+    bench(False)
+
+print(f"{'action':<8} {'whole page ms':>14} {'fragment ms':>12} {'speedup':>8}")
+for name, bench in [("pick", bench_pick), ("edit", bench_edit), ("paging", bench_paging)]:
+    full = bench(False)
+    partial = bench(True)
+    if not full:
+        print(f"{name:<8} (skipped: one page of results)")
+        continue
+    full_ms, partial_ms = np.median(full) * 1000, np.median(partial) * 1000
+    print(f"{name:<8} {full_ms:>14.1f} {partial_ms:>12.1f} {full_ms / partial_ms:>7.1f}x")
@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import IMAGE_DIR
+from image_store import ImageStore, build_pack
+
+# ============================
+# 画像の読み込み：フォルダ（1枚ずつ open）とパック（mmap）の比較
+# ============================
+# ランダムな順に N 回、原画の読み込みとサムネイルのデコードを行う。
+N_READS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+with tempfile.TemporaryDirectory() as tmp:
+    pack_path = os.path.join(tmp, "characters.pack")
+
+    t = time.perf_counter()
+    n_images = build_pack(IMAGE_DIR, pack_path)
+    t_build = time.perf_counter() - t
+
+    directory = ImageStore(IMAGE_DIR, os.path.join(tmp, "missing.pack"))
+    packed = ImageStore(IMAGE_DIR, pack_path)
+
+    names = directory.names()
+    rng = random.Random(0)
+    order = [rng.choice(names) for _ in range(N_READS)]
+
+    def run(store, thumbnail):
+        t = time.perf_counter()
+        for name in order:
+            if thumbnail:
+                store.open_thumbnail(name).load()
+            else:
+                store.read_bytes(name)
+        return (time.perf_counter() - t) / N_READS * 1000
+
+    # 両方とも同じバイト列を返すこと
+    assert all(bytes(packed.read_bytes(n)) == directory.read_bytes(n) for n in names)
+
+    print(f"images: {n_images}  pack: {os.path.getsize(pack_path) / 1e6:.1f} MB  build: {t_build:.1f} s")
+    print(f"raw bytes  folder: {run(directory, False):.3f} ms/image   pack: {run(packed, False):.3f} ms/image")
+    print(f"thumbnail  folder: {run(directory, True):.2f} ms/image   pack: {run(packed, True):.2f} ms/image")
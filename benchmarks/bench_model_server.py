@@ -0,0 +1,93 @@
+import os
+import sys
+import time
+import tempfile
+import subprocess
+import threading
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from image_store import list_images
+from model_server import ModelClient, ModelUnavailable, HAS_UNIX_SOCKET, TCP_ADDRESS
+
+# ============================
+# 推論サーバー：まとめて処理する／しないの比較
+# ============================
+# 乱数モデル（1バッチごとに STEP_TIME 秒かかる設定）のサーバーを起動し、
+# N_CLIENTS 本のスレッドから同時に埋め込みを要求する。
+N_CLIENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+N_REQUESTS = 20   # 1スレッドあたり
+STEP_TIME = 0.02
+
+
+def start_server(socket_path, window):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(BASE_DIR, "model_server.py"), "serve", "--model", "random",
+         "--socket", socket_path, "--window", str(window), "--step-time", str(STEP_TIME)],
+        cwd=BASE_DIR, stdout=subprocess.DEVNULL,
+    )
+    client = ModelClient(socket_path)
+    for _ in range(100):
+        client._down_until = 0.0
+        if client.is_available():
+            return proc
+        time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("model server did not start")
+
+
+def run(socket_path, names, texts):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(k):
+        client = ModelClient(socket_path)
+        for j in range(N_REQUESTS):
+            t = time.perf_counter()
+            if (k + j) % 2:
+                client.embed_texts([texts[(k + j) % len(texts)]])
+            else:
+                client.embed_images([names[(k * N_REQUESTS + j) % len(names)]])
+            with lock:
+                latencies.append(time.perf_counter() - t)
+
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(N_CLIENTS)]
+    t = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - t, np.array(latencies) * 1000
+
+
+names = list_images()
+texts = [f"character {i} with long hair" for i in range(50)]
+
+with tempfile.TemporaryDirectory() as tmp:
+    socket_path = os.path.join(tmp, "model.sock") if HAS_UNIX_SOCKET else TCP_ADDRESS
+    print(f"{N_CLIENTS} clients x {N_REQUESTS} requests, {STEP_TIME * 1000:.0f} ms per model call\n")
+
+    for label, window in [("no batching", 0.0), ("batching 10ms", 0.01)]:
+        proc = start_server(socket_path, window)
+        try:
+            elapsed, ms = run(socket_path, names, texts)
+            stats = ModelClient(socket_path).health()
+        finally:
+            proc.terminate()
+            proc.wait()
+        print(f"{label:14s}: {len(ms) / elapsed:7.1f} req/s  mean batch {stats['mean_batch_size']:5.2f}  "
+              f"p50 {np.percentile(ms, 50):6.1f} ms  p95 {np.percentile(ms, 95):6.1f} ms  "
+              f"p99 {np.percentile(ms, 99):6.1f} ms")
+
+    # サーバーが落ちている時：最初の1回は接続失敗、その後は接続を試さずにすぐ失敗する
+    client = ModelClient(socket_path)
+    for attempt in ("first call", "second call"):
+        t = time.perf_counter()
+        try:
+            client.embed_texts(["x"])
+        except ModelUnavailable:
+            pass
+        print(f"server down, {attempt}: ModelUnavailable after {(time.perf_counter() - t) * 1000:.2f} ms")
@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from name_index import NameIndex
+
+# ============================
+# 名前検索（タイプアヘッド）の応答時間：10万件
+# ============================
+N_NAMES = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+KANA = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわん"
+KANJI = "鳴瀬空門蒼久島鷗野村美希白羽紬加藤山田佐藤鈴木高橋田中伊藤渡辺中村小林"
+WORKS = ["Summer Pockets", "CLANNAD", "Kanon", "AIR", "リトルバスターズ!", "Rewrite", "ハミダシクリエイティブ"]
+
+rng = random.Random(0)
+
+
+def random_name():
+    family = "".join(rng.choice(KANJI) for _ in range(2))
+    given = "".join(rng.choice(KANA) for _ in range(rng.randint(2, 4)))
+    if rng.random() < 0.3:
+        given = "".join(chr(ord(c) + 0x60) for c in given)  # カタカナ
+    return family + given
+
+
+features = {
+    f"{i:07d}.png": {"name": random_name(), "work": rng.choice(WORKS)}
+    for i in range(N_NAMES)
+}
+
+t = time.perf_counter()
+index = NameIndex(features)
+t_build = time.perf_counter() - t
+
+sample_names = [features[f"{rng.randrange(N_NAMES):07d}.png"]["name"] for _ in range(20)]
+queries = ["sh", "しろ", "シロハ", "kanon", "sumer pockets", "鳴瀬"]
+queries += [n[:3] for n in sample_names] + [n[2:] for n in sample_names]
+
+latencies = []
+for q in queries:
+    t = time.perf_counter()
+    index.search(q, limit=50)
+    latencies.append(time.perf_counter() - t)
+latencies.sort()
+
+print(f"names: {N_NAMES}  keys: {len(index)}  build: {t_build:.2f} s")
+print(f"query p50: {latencies[len(latencies) // 2] * 1000:.2f} ms")
+print(f"query p95: {latencies[int(len(latencies) * 0.95)] * 1000:.2f} ms")
+print(f"query max: {latencies[-1] * 1000:.2f} ms")
@@ -0,0 +1,78 @@
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from selection_log import SelectionLog, compact
+
+# ============================
+# 選択の保存：JSON の丸ごと書き直しとイベントログの追記
+# ============================
+# N_SESSIONS セッションが10回ずつ選ぶ（N_SESSIONS*10 クリック）。
+# 以前は再実行のたびに selected.json / comparisons.json を丸ごと書き直していた。
+N_SESSIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+ROUNDS = 10
+
+rng = random.Random(0)
+images = [f"{i:05d}.png" for i in range(5000)]
+
+with tempfile.TemporaryDirectory() as tmp:
+    # 以前の方式（1クリックで2ファイルを書き直し、同じファイルを全セッションが上書き）
+    selected_path = os.path.join(tmp, "selected.json")
+    comparison_path = os.path.join(tmp, "comparisons.json")
+    t = time.perf_counter()
+    for s in range(N_SESSIONS):
+        selected, comparisons = [], []
+        for r in range(ROUNDS):
+            shown = rng.sample(images, 4)
+            selected.append(shown[0])
+            comparisons.extend([shown[0], loser] for loser in shown[1:])
+            with open(selected_path, "w", encoding="utf-8") as f:
+                json.dump(selected, f, ensure_ascii=False, indent=4)
+            with open(comparison_path, "w", encoding="utf-8") as f:
+                json.dump(comparisons, f, ensure_ascii=False, indent=4)
+    t_rewrite = (time.perf_counter() - t) / (N_SESSIONS * ROUNDS) * 1e6
+
+    # イベントログ（追記＋まとめて fsync）
+    log_path = os.path.join(tmp, "selections.jsonl")
+    log = SelectionLog(log_path)
+    t = time.perf_counter()
+    for s in range(N_SESSIONS):
+        session = f"s{s:06d}"
+        log.start(session)
+        for r in range(ROUNDS):
+            shown = rng.sample(images, 4)
+            log.record(session, r + 1, shown, shown[0], rng.random() * 5)
+        if s % 10 == 0:
+            log.reset(session)  # 1割はやり直し
+    log.sync()
+    t_append = (time.perf_counter() - t) / (N_SESSIONS * ROUNDS) * 1e6
+
+    size = os.path.getsize(log_path)
+
+    # 読み込み：初回（全体）と、1クリック追記後の2回目（追記分だけ）
+    reader = SelectionLog(log_path)
+    t = time.perf_counter()
+    run = reader.session_run("s000001")
+    t_full = (time.perf_counter() - t) * 1000
+
+    log.record("s000001", ROUNDS + 1, images[:4], images[0], 1.0)
+    t = time.perf_counter()
+    run = reader.session_run("s000001")
+    t_incremental = (time.perf_counter() - t) * 1000
+    assert len(run["selected"]) == ROUNDS + 1
+
+    t = time.perf_counter()
+    before, after = compact(log_path)
+    t_compact = (time.perf_counter() - t) * 1000
+
+    print(f"{N_SESSIONS} sessions x {ROUNDS} picks")
+    print(f"per click   : rewrite JSON {t_rewrite:8.1f} us   append to log {t_append:8.1f} us")
+    print(f"log size    : {size / 1e6:.2f} MB ({before} events)")
+    print(f"read        : full {t_full:.1f} ms   after one append {t_incremental:.3f} ms")
+    print(f"compact     : {before} -> {after} events in {t_compact:.1f} ms "
+          f"({os.path.getsize(log_path) / 1e6:.2f} MB)")
@@ -0,0 +1,270 @@
+import os
+import sys
+import atexit
+import time
+import random
+import shutil
+import argparse
+import multiprocessing
+import tempfile
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+# ============================
+# 同時セッションの負荷試験（AppTest）
+# ============================
+# N 個のセッションがそれぞれ AppTest で決まった操作（シナリオ）を同時に繰り返し、
+# 1回の再実行にかかった時間の p50/p95/p99 と全体のスループットを出す。
+# 全セッションが同じファイル（選択ログ・ratings.json など）を読み書きするので、
+# ファイル I/O の取り合いや書きかけのファイルを読む競合も再現される。
+#
+#   pick     … キャラ選択ページでスタートして 10 回選ぶ
+#   edit     … 特徴編集（app.py）で項目を書き換えて次のキャラへ
+#   filter   … キャラ検索ページでファセットを順に絞り込んで戻す
+#   generate … AI画像生成ページで生成（SD は sd_stub.py のスタブ）
+#
+# 作業用にリポジトリを一時ディレクトリへ複製して実行する（選択ログ・レーティングなどは汚さない）。
+#
+#   python benchmarks/load_test.py --sessions 1 2 4 8
+#   python benchmarks/load_test.py --sessions 8 --scenarios pick filter --iterations 3
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ["pick", "edit", "filter", "generate"]
+COPY_FILES = ["character_features.json", "character_features.arrow"]
+LINK_FILES = ["characters", "characters.pack", "clusters.npz", "embeddings.npz"]
+
+N_PICKS = 10
+N_EDITS = 3
+N_FILTERS = 4
+SD_STEP_TIME = 0.01
+
+
+def prepare_workdir(workdir):
+    # .py とデータを複製、画像はシンボリックリンク
+    for name in os.listdir(ROOT):
+        if name.endswith(".py") or name in COPY_FILES:
+            shutil.copy2(os.path.join(ROOT, name), workdir)
+    shutil.copytree(os.path.join(ROOT, "pages"), os.path.join(workdir, "pages"),
+                    ignore=shutil.ignore_patterns("__pycache__"))
+    for name in LINK_FILES:
+        if os.path.exists(os.path.join(ROOT, name)):
+            os.symlink(os.path.join(ROOT, name), os.path.join(workdir, name))
+
+
+# ============================
+# シナリオ（1ステップ = 1回の再実行）
+# ============================
+class Session:
+
+    def __init__(self, page, timeout):
+        from streamlit.testing.v1 import AppTest
+        # 相対パスは呼び出し元のファイル基準になるので、作業ディレクトリ基準の絶対パスにする。
+        # 各ページは app.py から開く（st.switch_page で次のページへ移れるように）
+        self.at = AppTest.from_file(os.path.abspath("app.py"), default_timeout=timeout)
+        if page != "app.py":
+            self.at.switch_page(page)
+        self.timings = []
+        self.exceptions = 0
+
+    def step(self, action=None):
+        # action はウィジェット操作（at を書き換えて run 前の状態にする）
+        if action is not None:
+            action(self.at)
+        t = time.perf_counter()
+        self.at.run()
+        self.timings.append(time.perf_counter() - t)
+        self.exceptions += len(self.at.exception)
+
+
+def run_pick(session, rng):
+    session.step()
+    session.step(lambda at: at.button[0].click())  # スタート
+    for _ in range(N_PICKS):
+        picks = [b for b in session.at.button if (b.key or "").startswith("pick_")]
+        if not picks:
+            break
+        session.step(lambda at, b=rng.choice(picks): b.click())
+
+
+def run_edit(session, rng):
+    session.step()
+    for k in range(N_EDITS):
+        fields = [t for t in session.at.text_input if (t.key or "").startswith("widget_other_")]
+        if fields:
+            session.step(lambda at, f=fields[0]: f.input(f"load test {k} {rng.random():.4f}"))
+        nexts = [b for b in session.at.button if b.label == "次のキャラ ▶"]
+        if nexts:
+            session.step(lambda at, b=nexts[0]: b.click())
+
+
+def run_filter(session, rng):
+    session.step()
+    chosen = []
+    for _ in range(N_FILTERS):
+        boxes = [
+            s for s in session.at.selectbox
+            if (s.key or "").startswith("facet_") and not s.value and len(s.options) > 1
+            and s.key not in ("facet_name", "facet_work")
+        ]
+        if not boxes:
+            break
+        box = rng.choice(boxes)
+        # options はラベル（"値 (件数)"）なので値に戻す
+        value = rng.choice(box.options[1:]).rsplit(" (", 1)[0]
+        chosen.append(box.key)
+        session.step(lambda at, b=box, v=value: b.set_value(v))
+    for key in reversed(chosen):
+        boxes = [s for s in session.at.selectbox if s.key == key]
+        if boxes:
+            session.step(lambda at, b=boxes[0]: b.set_value(""))
+
+
+def run_generate(session, rng):
+    session.at.session_state["prompt"] = "masterpiece, 1girl, long hair, smiling"
+    session.step()
+    generate = [b for b in session.at.button if b.label == "画像生成する"]
+    if generate:
+        session.step(lambda at, b=generate[0]: b.click())
+
+
+SCENARIO_RUNNERS = {
+    "pick": ("pages/3キャラ選択.py", run_pick),
+    "edit": ("app.py", run_edit),
+    "filter": ("pages/1キャラ検索.py", run_filter),
+    "generate": ("pages/5AI画像生成.py", run_generate),
+}
+
+
+# ============================
+# 同時実行（1セッション = 1プロセス）
+# ============================
+# AppTest は実行のたびにプロセス全体で1つの Runtime を差し替えるので、
+# 同じプロセスの中で並行には動かせない。セッションごとにプロセスを分け、
+# ファイル・CPU の取り合いを実際に起こす。
+def _session_worker(k, scenarios, iterations, timeout, seed, barrier, queue):
+    rng = random.Random(seed + k)
+    results = defaultdict(list)
+    exceptions = defaultdict(int)
+    errors = []
+
+    # 計測前に各ページを1回実行して import とキャッシュを温める
+    for name in scenarios:
+        try:
+            Session(SCENARIO_RUNNERS[name][0], timeout).step()
+        except Exception:
+            pass
+    barrier.wait()
+
+    # 全シナリオを iterations 周（セッションごとに開始位置をずらす）
+    for it in range(iterations * len(scenarios)):
+        name = scenarios[(k + it) % len(scenarios)]
+        page, runner = SCENARIO_RUNNERS[name]
+        session = None
+        try:
+            session = Session(page, timeout)
+            runner(session, rng)
+        except Exception as e:
+            errors.append(f"{name}: {e!r}")
+        if session is not None:
+            results[name].extend(session.timings)
+            exceptions[name] += session.exceptions
+
+    queue.put((dict(results), dict(exceptions), errors))
+
+
+def run_load(n_sessions, scenarios, iterations, timeout, seed=0):
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(n_sessions + 1)
+    queue = ctx.Queue()
+    procs = [
+        ctx.Process(target=_session_worker, args=(k, scenarios, iterations, timeout, seed, barrier, queue))
+        for k in range(n_sessions)
+    ]
+    for proc in procs:
+        proc.start()
+
+    barrier.wait()
+    t = time.perf_counter()
+    outputs = [queue.get() for _ in procs]
+    elapsed = time.perf_counter() - t
+    for proc in procs:
+        proc.join()
+
+    results = defaultdict(list)
+    exceptions = defaultdict(int)
+    errors = []
+    for session_results, session_exceptions, session_errors in outputs:
+        for name, timings in session_results.items():
+            results[name].extend(timings)
+        for name, n in session_exceptions.items():
+            exceptions[name] += n
+        errors.extend(session_errors)
+    return elapsed, results, exceptions, errors
+
+
+def summarize(timings):
+    ms = np.array(timings) * 1000
+    if not len(ms):
+        return {"reruns": 0, "p50": np.nan, "p95": np.nan, "p99": np.nan}
+    return {
+        "reruns": len(ms),
+        "p50": np.percentile(ms, 50),
+        "p95": np.percentile(ms, 95),
+        "p99": np.percentile(ms, 99),
+    }
+
+
+def print_report(n_sessions, elapsed, results, exceptions, errors):
+    all_timings = [t for timings in results.values() for t in timings]
+    total = summarize(all_timings)
+    print(f"=== {n_sessions} sessions: {total['reruns']} reruns in {elapsed:.1f} s "
+          f"({total['reruns'] / elapsed:.1f} reruns/s)")
+    print(f"  {'scenario':<10} {'reruns':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'exc':>5}")
+    for name in sorted(results):
+        s = summarize(results[name])
+        print(f"  {name:<10} {s['reruns']:>7} {s['p50']:>9.1f} {s['p95']:>9.1f} {s['p99']:>9.1f} "
+              f"{exceptions[name]:>5}")
+    print(f"  {'all':<10} {total['reruns']:>7} {total['p50']:>9.1f} {total['p95']:>9.1f} {total['p99']:>9.1f}")
+    for error in errors[:5]:
+        print(f"  error: {error}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--scenarios", nargs="+", default=SCENARIOS, choices=SCENARIOS)
+    parser.add_argument("--iterations", type=int, default=2, help="1セッションで全シナリオを何周するか")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--sd-step-time", type=float, default=SD_STEP_TIME)
+    args = parser.parse_args()
+
+    # レーティングなどは終了時に保存するので、作業ディレクトリはその後で消す
+    # （atexit は登録の逆順に呼ばれる）
+    workdir = tempfile.mkdtemp(prefix="sentei-load-")
+    atexit.register(shutil.rmtree, workdir, ignore_errors=True)
+    prepare_workdir(workdir)
+    os.chdir(workdir)
+    sys.path.insert(0, workdir)
+
+    # SD はスタブ（空いているポートで起動）
+    import sd_stub
+    server = sd_stub.serve("127.0.0.1", 0, args.sd_step_time)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["SD_API_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+
+    # スナップショット作成などの初回処理を済ませておく
+    run_load(1, args.scenarios, 1, args.timeout)
+
+    try:
+        for n_sessions in args.sessions:
+            print_report(n_sessions, *run_load(n_sessions, args.scenarios, args.iterations, args.timeout))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import os
+import sys
+import glob
+import argparse
+import subprocess
+from collections import defaultdict
+
+# ============================
+# ページごとの起動時間プロファイラ
+# ============================
+# 各ページを新しいプロセスで AppTest により1回実行し（コールドスタート）、
+# -X importtime の出力をトップレベルのパッケージごとに集計する。
+#
+#   python benchmarks/startup_profile.py                 # 全ページの一覧
+#   python benchmarks/startup_profile.py --check         # 予算超過で終了コード 1
+#   python benchmarks/startup_profile.py app.py --top 20
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# コールドスタートの予算（秒）。ページ名で個別に上書きできる
+STARTUP_BUDGET = {
+    "default": 3.0,
+    "pages/1キャラ検索.py": 5.0,
+    "pages/4連関分析.py": 5.0,
+}
+
+PAGE_START_MARK = "__PAGE_START__"
+COLD_START_MARK = "__COLD_START__"
+
+RUNNER = f"""
+import sys, time
+from streamlit.testing.v1 import AppTest
+sys.stderr.write("{PAGE_START_MARK}\\n")
+sys.stderr.flush()
+t = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=120).run()
+print("{COLD_START_MARK}", time.perf_counter() - t, len(at.exception))
+"""
+
+
+def all_pages():
+    pages = ["app.py"] + sorted(glob.glob("pages/*.py", root_dir=ROOT))
+    return [p.replace(os.sep, "/") for p in pages]
+
+
+def profile_page(page):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", RUNNER, page],
+        cwd=ROOT, capture_output=True, text=True, encoding="utf-8"
+    )
+
+    cold_start = None
+    n_exceptions = 0
+    for line in proc.stdout.splitlines():
+        if line.startswith(COLD_START_MARK):
+            _, seconds, n_exceptions = line.split()
+            cold_start = float(seconds)
+            n_exceptions = int(n_exceptions)
+
+    if cold_start is None:
+        raise RuntimeError(f"{page} の実行に失敗しました:\n{proc.stderr[-2000:]}")
+
+    # ページ実行中に発生した import だけを集計（streamlit 本体は除く）
+    per_package = defaultdict(float)
+    started = False
+    for line in proc.stderr.splitlines():
+        if line.strip() == PAGE_START_MARK:
+            started = True
+            continue
+        if not started or not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        self_us = int(fields[0])
+        package = fields[2].strip().split(".")[0]
+        per_package[package] += self_us / 1e6
+
+    return {
+        "page": page,
+        "cold_start": cold_start,
+        "import_total": sum(per_package.values()),
+        "per_package": dict(sorted(per_package.items(), key=lambda kv: -kv[1])),
+        "exceptions": n_exceptions,
+    }
+
+
+def budget_for(page, override=None):
+    if override is not None:
+        return override
+    return STARTUP_BUDGET.get(page, STARTUP_BUDGET["default"])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pages", nargs="*")
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--budget", type=float, default=None)
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args()
+
+    over_budget = []
+    for page in args.pages or all_pages():
+        result = profile_page(page)
+        budget = budget_for(page, args.budget)
+
+        status = "OK" if result["cold_start"] <= budget else "OVER"
+        if status == "OVER":
+            over_budget.append(page)
+
+        print(f"=== {page}")
+        print(f"cold start : {result['cold_start']:.3f} s (budget {budget:.1f} s) {status}")
+        print(f"imports    : {result['import_total']:.3f} s")
+        if result["exceptions"]:
+            print(f"exceptions : {result['exceptions']}")
+        for package, seconds in list(result["per_package"].items())[:args.top]:
+            print(f"  {package:<24} {seconds * 1000:8.1f} ms")
+        print()
+
+    if args.check and over_budget:
+        print("予算超過: " + ", ".join(over_budget))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+import os
+import json
+import threading
+import numpy as np
+
+from lazy_imports import lazy_import, is_available
+from file_lock import file_lock
+
+pd = lazy_import("pandas")
+
+# pyarrow は任意（無ければ JSON から読む）
+if is_available("pyarrow"):
+    pa = lazy_import("pyarrow")
+    pa_ipc = lazy_import("pyarrow.ipc")
+else:
+    pa = None
+
+# ============================
+# 設定
+# ============================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_DIR = os.path.join(BASE_DIR, "characters")
+FEATURE_FILE = os.path.join(BASE_DIR, "character_features.json")
+
+# 特徴データの全列（name / work / other を含む）
+FEATURE_COLUMNS = [
+    "name",
+    "work",
+    "hair_color_main",
+    "hair_color_sub",
+    "hair_length",
+    "hairstyle_main",
+    "hairstyle_type",
+    "hairstyle_detail",
+    "eye_color",
+    "eye_shape",
+    "expression",
+    "vibe",
+    "other",
+]
+
+# 分析に使う属性（name / work / other は対象外）
+ATTRIBUTE_COLUMNS = [
+    "hair_length",
+    "hair_color_main",
+    "hair_color_sub",
+    "hairstyle_main",
+    "hairstyle_type",
+    "hairstyle_detail",
+    "eye_color",
+    "eye_shape",
+    "expression",
+    "vibe",
+]
+
+
+# ============================
+# JSON読み込み
+# ============================
+def load_features(path=FEATURE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ============================
+# JSON書き込み（編集ページ用）
+# ============================
+# 一時ファイルに書いてから置き換えるので、読み込み側が書きかけの JSON を読むことはない。
+# 差分の反映はロックの中で最新のファイルを読み直してから行う
+# （別のセッションが同時に保存しても、相手の変更を古い内容で上書きしない）。
+def _tmp_path(path):
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def save_features(features, feature_file=FEATURE_FILE):
+    tmp_path = _tmp_path(feature_file)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(features, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, feature_file)
+    # 読み取り専用ページ用の列指向スナップショットも更新
+    publish_snapshot(features, feature_file)
+
+
+def apply_feature_edits(edits, feature_file=FEATURE_FILE):
+    # edits: {画像: {列: 値}} → 何件あっても書き込みは1回。戻り値: 書き込んだ後の全データ
+    with file_lock(feature_file):
+        features = load_features(feature_file)
+        for img, changes in edits.items():
+            record = features.setdefault(img, {col: "" for col in FEATURE_COLUMNS})
+            record.update(changes)
+        save_features(features, feature_file)
+    return features
+
+
+# ============================
+# One-hot 化（NumPy）
+# ============================
+def encode_features(features, columns=ATTRIBUTE_COLUMNS):
+    # 戻り値:
+    #   images : 画像ファイル名のリスト（行の順番）
+    #   items  : (属性名, 値) のリスト（列の順番）
+    #   X      : shape = (画像数, 項目数) の 0/1 行列
+    images = list(features.keys())
+
+    items = []
+    for col in columns:
+        values = sorted({data.get(col, "") for data in features.values()} - {""})
+        items.extend((col, v) for v in values)
+
+    item_index = {item: j for j, item in enumerate(items)}
+
+    X = np.zeros((len(images), len(items)), dtype=np.float32)
+    for i, img in enumerate(images):
+        data = features[img]
+        for col in columns:
+            j = item_index.get((col, data.get(col, "")))
+            if j is not None:
+                X[i, j] = 1.0
+
+    return images, items, X
+
+
+# ============================
+# 列指向スナップショット（Arrow IPC）
+# ============================
+# character_features.json と同じ場所に .arrow を置く。
+# 文字列列は辞書エンコードし、読み込み側は mmap で必要な列だけ取り出す。
+def snapshot_path(feature_file=FEATURE_FILE):
+    return os.path.splitext(feature_file)[0] + ".arrow"
+
+
+def _source_stamp(feature_file):
+    st_ = os.stat(feature_file)
+    return f"{st_.st_mtime_ns}:{st_.st_size}"
+
+
+def _read_snapshot_metadata(path):
+    with pa.memory_map(path) as source:
+        metadata = pa_ipc.open_file(source).schema.metadata or {}
+    return {k.decode(): v.decode() for k, v in metadata.items()}
+
+
+def catalog_version(feature_file=FEATURE_FILE):
+    # キャッシュのキー用（JSON が書き換わるたびに変わる）
+    if not os.path.exists(feature_file):
+        return ""
+    return _source_stamp(feature_file)
+
+
+def snapshot_version(feature_file=FEATURE_FILE):
+    path = snapshot_path(feature_file)
+    if pa is None or not os.path.exists(path):
+        return 0
+    return int(_read_snapshot_metadata(path).get("version", 0))
+
+
+def publish_snapshot(features, feature_file=FEATURE_FILE):
+    # JSON を書いた直後に呼ぶ（スタンプに JSON の mtime を使う）
+    if pa is None:
+        return None
+
+    images = list(features.keys())
+    arrays = [pa.array(images, type=pa.string())]
+    names = ["image"]
+    for col in FEATURE_COLUMNS:
+        values = [features[img].get(col, "") or "" for img in images]
+        arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+        names.append(col)
+
+    version = snapshot_version(feature_file) + 1
+    metadata = {
+        "version": str(version),
+        "source": _source_stamp(feature_file) if os.path.exists(feature_file) else "",
+    }
+    table = pa.Table.from_arrays(arrays, names=names).replace_schema_metadata(metadata)
+
+    path = snapshot_path(feature_file)
+    tmp_path = _tmp_path(path)
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa_ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+    return version
+
+
+def snapshot_is_fresh(feature_file=FEATURE_FILE):
+    path = snapshot_path(feature_file)
+    if pa is None or not os.path.exists(path) or not os.path.exists(feature_file):
+        return False
+    return _read_snapshot_metadata(path).get("source") == _source_stamp(feature_file)
+
+
+def load_snapshot(columns=None, feature_file=FEATURE_FILE, categorical=False):
+    # mmap したファイルから必要な列だけを読む（コピーは to_pandas の時だけ）
+    with pa.memory_map(snapshot_path(feature_file)) as source:
+        table = pa_ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select(["image"] + list(columns))
+        df = table.to_pandas()
+
+    df = df.set_index("image")
+    df.index.name = None
+    if not categorical:
+        for col in df.columns:
+            df[col] = df[col].astype(object)
+    return df
+
+
+def _frame_from_json(features, columns):
+    df = pd.DataFrame.from_dict(features, orient="index")
+    df = df.reindex(columns=columns if columns is not None else FEATURE_COLUMNS)
+    return df.fillna("")
+
+
+# ============================
+# 読み取り専用ページ用の入口
+# ============================
+# スナップショットが新しければ mmap、古ければ JSON から作り直して公開する
+def load_catalog_frame(columns=None, feature_file=FEATURE_FILE, categorical=False):
+    if snapshot_is_fresh(feature_file):
+        return load_snapshot(columns, feature_file, categorical)
+
+    features = load_features(feature_file)
+    if pa is not None and features:
+        publish_snapshot(features, feature_file)
+        return load_snapshot(columns, feature_file, categorical)
+    return _frame_from_json(features, columns)
+
+
+# ============================
+# 絞り込み（検索ページ・API 共通）
+# ============================
+def filter_catalog(df, filters):
+    # filters: {列名: 値}（空文字の条件は無視）→ 一致した画像名のリスト
+    mask = np.ones(len(df), dtype=bool)
+    for column, value in filters.items():
+        if value:
+            mask &= (df[column] == value).to_numpy()
+    return list(df.index[mask])
+
+
+# ============================
+# ファセット件数（検索ページのサイドバー用）
+# ============================
+def encode_codes(df, columns):
+    # 列ごとに値を整数コード化
+    # 戻り値: (codes (行数, 列数) int32, [列ごとの値の配列], [列ごとの {値: コード}])
+    codes = np.empty((len(df), len(columns)), dtype=np.int32)
+    values = []
+    lookup = []
+    for j, col in enumerate(columns):
+        c, uniques = pd.factorize(df[col].fillna(""))
+        codes[:, j] = c
+        values.append(np.asarray(uniques, dtype=object))
+        lookup.append({v: k for k, v in enumerate(uniques)})
+    return codes, values, lookup
+
+
+def facet_counts(codes, lookup, selected):
+    # selected: 列ごとの選択値（"" は指定なし）
+    # 戻り値: (全条件に一致する行の bool 配列, [列ごとの件数配列（コード順）])
+    # 列 j の件数は「j 以外の条件はそのままで、j だけその値にした時」の結果数。
+    # 全列分を1回の bincount でまとめて数える。
+    sizes = [len(d) for d in lookup]
+    offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+
+    active = [j for j, value in enumerate(selected) if value]
+    sel = np.array([lookup[j].get(selected[j], -2) for j in active], dtype=np.int32)  # 無い値は -2
+
+    # 条件のある列だけ比べる
+    miss = codes[:, active] != sel
+    n_miss = miss.sum(axis=1)
+    matched = n_miss == 0
+
+    # 全条件に一致する行 → 全列で数える
+    flat = [(codes[matched] + offsets[:-1]).ravel()]
+    # 1つだけ外れた行 → 外れた列でだけ数える
+    near = np.flatnonzero(n_miss == 1)
+    if len(near) and active:
+        cols = np.asarray(active)[miss[near].argmax(axis=1)]
+        flat.append(codes[near, cols] + offsets[cols])
+
+    counts = np.bincount(np.concatenate(flat), minlength=offsets[-1])
+    return matched, [counts[offsets[j]:offsets[j + 1]] for j in range(len(lookup))]
+
+
+# ============================
+# 割合（割合ページ・API 共通）
+# ============================
+def make_ratio_df(column_name, target_df):
+    counts = target_df[column_name].value_counts()
+    if counts.sum() == 0:
+        return pd.DataFrame({column_name: [], "count": [], "ratio (%)": []})
+    ratio = (counts / counts.sum() * 100).round(1)
+    return pd.DataFrame({
+        column_name: counts.index,
+        "count": counts.values,
+        "ratio (%)": ratio.values
+    })
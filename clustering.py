@@ -0,0 +1,411 @@
+import os
+import json
+import time
+import random
+import argparse
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+from catalog import BASE_DIR, ATTRIBUTE_COLUMNS, load_catalog_frame, catalog_version, encode_codes
+
+# ============================
+# キャラのクラスタリング（ミニバッチ k-means）
+# ============================
+# ・入力は属性の One-hot（＋あれば画像の埋め込みベクトル）
+# ・BATCH_SIZE 行ずつ One-hot を作って重心を更新するので、100万件でもメモリは一定
+# ・キャラが増えた・注釈が変わった・消えた分だけ学習し直して clusters.npz に保存
+#   （行ごとに One-hot の次元番号を持ち、変わった行は古いベクトルの分を重心から引いてから入れ直す）
+# ・重心の各成分は「そのクラスタで各特徴を持つキャラの割合」になる（構成の表示に使う）
+#
+#   python clustering.py rebuild --k 12 --epochs 3   … 全件で作り直す
+#   python clustering.py info
+
+CLUSTER_FILE = os.path.join(BASE_DIR, "clusters.npz")
+EMBEDDING_FILE = os.path.join(BASE_DIR, "embeddings.npz")  # names / vectors（任意）
+
+N_CLUSTERS = 12
+BATCH_SIZE = 4096
+EMBEDDING_WEIGHT = 1.0
+
+
+# ============================
+# ミニバッチ k-means 本体
+# ============================
+class MiniBatchKMeans:
+
+    def __init__(self, n_clusters=N_CLUSTERS, seed=0):
+        self.n_clusters = n_clusters
+        self.rng = np.random.default_rng(seed)
+        self.centroids = None
+        self.counts = np.zeros(n_clusters, dtype=np.int64)
+
+    def _init_centroids(self, X):
+        # k-means++（最初のバッチから選ぶ）
+        k = self.n_clusters
+        centroids = np.empty((k, X.shape[1]), dtype=np.float32)
+        centroids[0] = X[self.rng.integers(len(X))]
+        dist = ((X - centroids[0]) ** 2).sum(axis=1)
+        for j in range(1, k):
+            total = dist.sum()
+            i = self.rng.choice(len(X), p=dist / total) if total > 0 else self.rng.integers(len(X))
+            centroids[j] = X[i]
+            dist = np.minimum(dist, ((X - centroids[j]) ** 2).sum(axis=1))
+        self.centroids = centroids
+
+    def grow(self, extra, at):
+        # 新しい特徴（列）が増えた時は at の位置に 0 の列を差し込む
+        if extra > 0:
+            self.centroids = np.insert(self.centroids, [at] * extra, 0.0, axis=1)
+
+    def predict(self, X):
+        # ||x - c||^2 = ||x||^2 - 2 x・c + ||c||^2（||x||^2 は argmin に関係ない）
+        scores = X @ self.centroids.T
+        scores *= -2.0
+        scores += (self.centroids ** 2).sum(axis=1)
+        return scores.argmin(axis=1).astype(np.int32)
+
+    def partial_fit(self, X):
+        if len(X) == 0:
+            return np.zeros(0, dtype=np.int32)
+        if self.centroids is None:
+            self._init_centroids(X)
+
+        labels = self.predict(X)
+
+        # クラスタごとの合計と件数（行列積でまとめて）
+        n = np.bincount(labels, minlength=self.n_clusters)
+        onehot = np.zeros((len(X), self.n_clusters), dtype=np.float32)
+        onehot[np.arange(len(X)), labels] = 1.0
+        sums = onehot.T @ X
+
+        # 学習率 1 / (これまでの件数) で重心を動かす（＝割り当てられた点の累積平均）
+        self.counts += n
+        hit = n > 0
+        self.centroids[hit] += (sums[hit] - n[hit, None] * self.centroids[hit]) / self.counts[hit, None]
+        return labels
+
+    def forget(self, X, labels):
+        # partial_fit の逆：labels のクラスタに入れた X の分を累積平均から取り除く
+        if len(X) == 0 or self.centroids is None:
+            return
+        n = np.bincount(labels, minlength=self.n_clusters)
+        onehot = np.zeros((len(X), self.n_clusters), dtype=np.float32)
+        onehot[np.arange(len(X)), labels] = 1.0
+        sums = onehot.T @ X
+
+        remaining = self.counts - n
+        hit = (n > 0) & (remaining > 0)
+        self.centroids[hit] = (
+            self.counts[hit, None] * self.centroids[hit] - sums[hit]
+        ) / remaining[hit, None]
+        self.counts = np.maximum(remaining, 0)
+
+
+# ============================
+# カタログ → 特徴ベクトル（バッチごと）
+# ============================
+class FeatureEncoder:
+
+    def __init__(self, items=None, embedding_dim=0):
+        self.items = [tuple(item) for item in (items or [])]
+        self.item_index = {item: j for j, item in enumerate(self.items)}
+        self.embedding_dim = embedding_dim
+
+    @property
+    def n_features(self):
+        return len(self.items) + self.embedding_dim
+
+    def prepare(self, df, columns=ATTRIBUTE_COLUMNS):
+        # 列ごとの「コード → 次元番号」表（初めて見る値は次元を追加）
+        codes, values, _ = encode_codes(df, columns)
+        code_dims = []
+        for j, col in enumerate(columns):
+            dims = np.full(len(values[j]), -1, dtype=np.int64)
+            for code, value in enumerate(values[j]):
+                if not value:
+                    continue
+                if (col, value) not in self.item_index:
+                    self.item_index[(col, value)] = len(self.items)
+                    self.items.append((col, value))
+                dims[code] = self.item_index[(col, value)]
+            code_dims.append(dims)
+        return codes, code_dims
+
+    @staticmethod
+    def row_items(codes, code_dims):
+        # 行ごと・列ごとの One-hot の次元番号（空欄は -1）。注釈が変わったかどうかもこれで比べる
+        if not code_dims:
+            return np.zeros((len(codes), 0), dtype=np.int32)
+        return np.stack([dims[codes[:, j]] for j, dims in enumerate(code_dims)], axis=1).astype(np.int32)
+
+    def encode(self, row_items, names=None, embeddings=None):
+        X = np.zeros((len(row_items), self.n_features), dtype=np.float32)
+        r = np.arange(len(row_items))
+        for j in range(row_items.shape[1]):
+            d = row_items[:, j]
+            ok = d >= 0
+            X[r[ok], d[ok]] = 1.0
+
+        if self.embedding_dim and embeddings is not None and names is not None:
+            index, vectors = embeddings
+            for i, name in enumerate(names):
+                k = index.get(name)
+                if k is not None:
+                    X[i, len(self.items):] = vectors[k]
+        return X
+
+
+def load_embeddings(path=EMBEDDING_FILE):
+    # 画像の埋め込み（AI 側で作ったもの）があれば L2 正規化して使う
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        names = [str(n) for n in data["names"]]
+        vectors = data["vectors"].astype(np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.maximum(norms, 1e-12) * EMBEDDING_WEIGHT
+    return {name: i for i, name in enumerate(names)}, vectors
+
+
+# ============================
+# 割り当ての保存・増分更新
+# ============================
+class CatalogClusters:
+
+    def __init__(self, path=CLUSTER_FILE, n_clusters=N_CLUSTERS, batch_size=BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.model = MiniBatchKMeans(n_clusters)
+        self.encoder = FeatureEncoder()
+        self.names = []
+        self.labels = np.zeros(0, dtype=np.int32)
+        self.row_items = None   # 行ごとの One-hot の次元番号（割り当てた時の注釈）
+        self._label_of = None
+        self._position = None
+        self._load()
+
+    @property
+    def n_clusters(self):
+        return self.model.n_clusters
+
+    def _prepare(self, df):
+        # 戻り値: df の行ごとの One-hot の次元番号（新しい値が出てきたら重心にも次元を足す）
+        codes, code_dims = self.encoder.prepare(df)
+        if self.model.centroids is not None:
+            # One-hot の次元は埋め込みの前にあるので、増えた分はその境目に入れる
+            n_old = self.model.centroids.shape[1] - self.encoder.embedding_dim
+            self.model.grow(len(self.encoder.items) - n_old, n_old)
+        return self.encoder.row_items(codes, code_dims)
+
+    def _batches(self, row_items, names, rows, embeddings):
+        for start in range(0, len(rows), self.batch_size):
+            batch_rows = rows[start:start + self.batch_size]
+            yield batch_rows, self.encoder.encode(row_items[batch_rows], names[batch_rows], embeddings)
+
+    def update(self, df, embeddings=None):
+        # 新しいキャラ・注釈が変わったキャラだけ学習して割り当て直し、消えたキャラは外す
+        # → 割り当て直した・外した件数
+        if embeddings is None:
+            embeddings = load_embeddings()
+        if self.model.centroids is None and embeddings is not None:
+            self.encoder.embedding_dim = embeddings[1].shape[1]
+
+        if self.row_items is None and self.names:
+            # 次元番号を保存していない古いファイル：変わった行が分からないので作り直す
+            self.rebuild(df, embeddings=embeddings)
+            return len(df)
+
+        items = self._prepare(df)
+        names = df.index.to_numpy(dtype=object)
+
+        if self._position is None:
+            self._position = {name: i for i, name in enumerate(self.names)}
+        old_index = np.fromiter((self._position.get(name, -1) for name in names), dtype=np.int64, count=len(names))
+        known = old_index >= 0
+        old_names = np.array(self.names, dtype=object)
+
+        changed = np.zeros(len(names), dtype=bool)
+        if len(self.names):
+            changed[known] = (self.row_items[old_index[known]] != items[known]).any(axis=1)
+        present = np.zeros(len(self.names), dtype=bool)
+        present[old_index[known]] = True
+        # 注釈が変わった行と消えた行は、古いベクトルの分を重心から引く
+        undo = np.concatenate([old_index[changed], np.flatnonzero(~present)])
+
+        n_removed = len(self.names) - int(known.sum())
+        fit_rows = np.flatnonzero(~known | changed)
+        if len(fit_rows) == 0 and n_removed == 0:
+            return 0
+
+        for batch_rows, X in self._batches(self.row_items, old_names, undo, embeddings):
+            self.model.forget(X, self.labels[batch_rows])
+
+        labels = np.zeros(len(names), dtype=np.int32)
+        labels[known] = self.labels[old_index[known]]
+        for batch_rows, X in self._batches(items, names, fit_rows, embeddings):
+            labels[batch_rows] = self.model.partial_fit(X)
+
+        self.names = names.tolist()
+        self.labels = labels
+        self.row_items = items
+        self._label_of = None
+        self._position = None
+        return len(fit_rows) + n_removed
+
+    def rebuild(self, df, n_clusters=None, epochs=3, seed=0, embeddings=None):
+        # 全件をシャッフルしながら epochs 周学習し、最後に全件を割り当て直す
+        if embeddings is None:
+            embeddings = load_embeddings()
+        self.model = MiniBatchKMeans(n_clusters or self.n_clusters, seed)
+        self.encoder = FeatureEncoder(embedding_dim=embeddings[1].shape[1] if embeddings else 0)
+
+        items = self._prepare(df)
+        names = df.index.to_numpy(dtype=object)
+        rng = np.random.default_rng(seed)
+        for _ in range(epochs):
+            for _, X in self._batches(items, names, rng.permutation(len(df)), embeddings):
+                self.model.partial_fit(X)
+
+        labels = np.empty(len(df), dtype=np.int32)
+        for batch_rows, X in self._batches(items, names, np.arange(len(df)), embeddings):
+            labels[batch_rows] = self.model.predict(X)
+
+        self.names = names.tolist()
+        self.labels = labels
+        self.row_items = items
+        self._label_of = None
+        self._position = None
+
+    # ----------------------------
+    # 参照
+    # ----------------------------
+    def label_of(self, name):
+        if self._label_of is None:
+            self._label_of = dict(zip(self.names, self.labels.tolist()))
+        return self._label_of.get(name)
+
+    def sizes(self):
+        return np.bincount(self.labels, minlength=self.n_clusters)
+
+    def composition(self, top_n=5, min_share=0.3):
+        # クラスタごと：件数と、メンバーの多くが持つ特徴（重心の値 = 割合）
+        if self.model.centroids is None:
+            return []
+        sizes = self.sizes()
+        n_items = len(self.encoder.items)
+        rows = []
+        for c in range(self.n_clusters):
+            shares = self.model.centroids[c, :n_items]
+            order = np.argsort(-shares)[:top_n]
+            rows.append({
+                "cluster": c,
+                "size": int(sizes[c]),
+                "features": [
+                    (self.encoder.items[j][0], self.encoder.items[j][1], float(shares[j]))
+                    for j in order if shares[j] >= min_share
+                ],
+            })
+        return rows
+
+    # ----------------------------
+    # 保存・読み込み
+    # ----------------------------
+    def save(self):
+        if self.path is None or self.model.centroids is None:
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp_path,
+            centroids=self.model.centroids,
+            counts=self.model.counts,
+            items=np.array(json.dumps(self.encoder.items, ensure_ascii=False)),
+            embedding_dim=np.array(self.encoder.embedding_dim),
+            names=np.array(self.names, dtype=str),
+            labels=self.labels,
+            row_items=self.row_items if self.row_items is not None else np.zeros((0, 0), dtype=np.int32),
+        )
+        os.replace(tmp_path, self.path)
+
+    def _load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return
+        with np.load(self.path, allow_pickle=False) as data:
+            self.model = MiniBatchKMeans(len(data["counts"]))
+            self.model.centroids = data["centroids"].copy()
+            self.model.counts = data["counts"].copy()
+            self.encoder = FeatureEncoder(json.loads(str(data["items"])), int(data["embedding_dim"]))
+            self.names = [str(n) for n in data["names"]]
+            self.labels = data["labels"].copy()
+            row_items = data["row_items"] if "row_items" in data.files else None
+            self.row_items = row_items.copy() if row_items is not None and len(row_items) == len(self.names) else None
+
+
+# ============================
+# 異なるクラスタから候補を選ぶ
+# ============================
+def sample_across_clusters(candidates, n, clusters, rng=random):
+    # 候補が残っているクラスタから n 個を選び、それぞれから1枚ずつ
+    # （クラスタが n 個に満たなければ残りは普通のランダム）
+    groups = defaultdict(list)
+    for img in candidates:
+        groups[clusters.label_of(img)].append(img)
+
+    chosen_groups = rng.sample(list(groups), min(n, len(groups)))
+    picked = [rng.choice(groups[g]) for g in chosen_groups]
+
+    if len(picked) < n:
+        rest = [img for img in candidates if img not in set(picked)]
+        picked += rng.sample(rest, n - len(picked))
+    rng.shuffle(picked)
+    return picked
+
+
+# ============================
+# プロセス内で1つだけ（カタログが変わったら増分更新）
+# ============================
+_clusters = None
+_clusters_version = None
+_clusters_lock = threading.Lock()
+
+
+def get_clusters():
+    global _clusters, _clusters_version
+    with _clusters_lock:
+        version = catalog_version()
+        if _clusters is None or _clusters_version != version:
+            if _clusters is None:
+                _clusters = CatalogClusters()
+            df = load_catalog_frame(columns=ATTRIBUTE_COLUMNS, categorical=True)
+            if _clusters.model.centroids is None:
+                _clusters.rebuild(df)
+                _clusters.save()
+            elif _clusters.update(df):
+                _clusters.save()
+            _clusters_version = version
+        return _clusters
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["rebuild", "update", "info"])
+    parser.add_argument("--k", type=int, default=N_CLUSTERS)
+    parser.add_argument("--epochs", type=int, default=3)
+    args = parser.parse_args()
+
+    clusters = CatalogClusters()
+    if args.command != "info":
+        df = load_catalog_frame(columns=ATTRIBUTE_COLUMNS, categorical=True)
+        t = time.perf_counter()
+        if args.command == "rebuild":
+            clusters.rebuild(df, args.k, epochs=args.epochs)
+            print(f"rebuilt {len(df)} characters into {args.k} clusters ({time.perf_counter() - t:.2f} s)")
+        else:
+            added = clusters.update(df)
+            print(f"reassigned {added} new, edited or removed characters ({time.perf_counter() - t:.2f} s)")
+        clusters.save()
+
+    for row in clusters.composition():
+        features = ", ".join(f"{value} {share:.0%}" for _, value, share in row["features"])
+        print(f"cluster {row['cluster']:>2}  {row['size']:>7}  {features}")
@@ -0,0 +1,125 @@
+import base64
+import html
+from io import BytesIO
+from functools import lru_cache
+
+import numpy as np
+
+from lazy_imports import lazy_import
+from image_store import open_thumbnail, image_stamp
+
+Image = lazy_import("PIL.Image")
+
+# ============================
+# コンタクトシート（検索結果を1枚の画像にまとめる）
+# ============================
+# 結果1件ごとに st.image を出す代わりに、
+#   1. サムネイル（正方形・白背景）を NumPy 配列でキャッシュ
+#   2. 配列のスライス代入でタイル状に並べて1枚の画像にする
+#   3. CSS スプライト＋リンクでクリック位置とキャラを対応付ける
+# とすることで、1ページ分の結果を1メッセージで送る。
+
+TARGET_HEIGHT = 200
+CANVAS_SIZE = 200
+THUMB_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=THUMB_CACHE_SIZE)
+def _thumbnail(path, stamp, target_height, canvas_size):
+    # パックがあれば縮小済みのサムネイルから作る
+    img = open_thumbnail(path).convert("RGB")
+
+    # 高さを揃えて比率維持でリサイズ
+    w, h = img.size
+    new_w = max(1, int(w * (target_height / h)))
+    arr = np.asarray(img.resize((new_w, target_height)))
+
+    # 正方形キャンバス（白背景）の中央に置く（はみ出す分は切り取る）
+    canvas = np.full((canvas_size, canvas_size, 3), 255, dtype=np.uint8)
+    x = (canvas_size - new_w) // 2
+    y = (canvas_size - target_height) // 2
+    src_x0, dst_x0 = max(0, -x), max(0, x)
+    src_y0, dst_y0 = max(0, -y), max(0, y)
+    width = min(new_w - src_x0, canvas_size - dst_x0)
+    height = min(target_height - src_y0, canvas_size - dst_y0)
+    canvas[dst_y0:dst_y0 + height, dst_x0:dst_x0 + width] = \
+        arr[src_y0:src_y0 + height, src_x0:src_x0 + width]
+
+    canvas.setflags(write=False)
+    return canvas
+
+
+def load_thumbnail(path, target_height=TARGET_HEIGHT, canvas_size=CANVAS_SIZE):
+    # 画像が更新されたらスタンプ（mtime）が変わるのでキャッシュも作り直される
+    return _thumbnail(path, image_stamp(path), target_height, canvas_size)
+
+
+def render_contact_sheet(paths, columns=3, tile=CANVAS_SIZE, gap=8):
+    # 戻り値: (シート画像の配列, 各タイルの (x, y) 左上座標)
+    rows = max(1, (len(paths) + columns - 1) // columns)
+    sheet_w = columns * tile + (columns - 1) * gap
+    sheet_h = rows * tile + (rows - 1) * gap
+    sheet = np.full((sheet_h, sheet_w, 3), 255, dtype=np.uint8)
+
+    positions = []
+    for i, path in enumerate(paths):
+        x = (i % columns) * (tile + gap)
+        y = (i // columns) * (tile + gap)
+        sheet[y:y + tile, x:x + tile] = load_thumbnail(path, tile, tile)
+        positions.append((x, y))
+
+    return sheet, positions
+
+
+def encode_sheet(sheet, fmt="JPEG", quality=90):
+    buffer = BytesIO()
+    Image.fromarray(sheet).save(buffer, format=fmt, quality=quality)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+# ============================
+# HTML（CSS スプライトのクリックマップ）
+# ============================
+def contact_sheet_html(items, columns=3, tile=CANVAS_SIZE, gap=8, link=lambda key: f"/?char={key}"):
+    # items: (キー, 画像パス, キャプション) のリスト
+    sheet, positions = render_contact_sheet([path for _, path, _ in items], columns, tile, gap)
+    sheet_base64 = encode_sheet(sheet)
+
+    tiles = []
+    for (key, _, caption), (x, y) in zip(items, positions):
+        caption = html.escape(caption)
+        tiles.append(
+            f'<a class="sheet-tile" href="{html.escape(link(key))}" target="_self" title="{caption}">'
+            f'<div class="sheet-img" style="background-position:-{x}px -{y}px;"></div>'
+            f'<div class="sheet-caption">{caption}</div>'
+            f'</a>'
+        )
+
+    return f"""
+        <style>
+        .sheet-grid {{
+            display: grid;
+            grid-template-columns: repeat({columns}, {tile}px);
+            gap: {gap}px;
+        }}
+        .sheet-tile {{
+            text-decoration: none;
+            color: inherit;
+        }}
+        .sheet-img {{
+            width: {tile}px;
+            height: {tile}px;
+            background-image: url("data:image/jpeg;base64,{sheet_base64}");
+            background-repeat: no-repeat;
+            border-radius: 6px;
+        }}
+        .sheet-caption {{
+            text-align: center;
+            font-size: 0.85em;
+        }}
+        </style>
+
+        <div class="sheet-grid">
+            {"".join(tiles)}
+        </div>
+    """
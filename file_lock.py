@@ -0,0 +1,51 @@
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+# ============================
+# プロセス間のファイルロック（POSIX / Windows 共通）
+# ============================
+# path + ".lock" を開いてロックする。POSIX は flock（共有／排他）、
+# Windows は msvcrt.locking で先頭1バイトを排他ロックする（共有ロックは無いので排他で代用）。
+#
+#   with file_lock(FEATURE_FILE):               … 排他
+#   with file_lock(LOG_FILE, shared=True):      … 共有（Windows では排他）
+
+RETRY_INTERVAL = 0.05
+
+
+def lock_path(path):
+    return path + ".lock"
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    fd = os.open(lock_path(path), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            # LK_LOCK は10秒で諦めるので、取れるまで LK_NBLCK を繰り返す
+            os.lseek(fd, 0, os.SEEK_SET)
+            while True:
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(RETRY_INTERVAL)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    finally:
+        os.close(fd)
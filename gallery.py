@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from io import BytesIO
+
+from lazy_imports import lazy_import
+from catalog import BASE_DIR
+
+Image = lazy_import("PIL.Image")
+PngImagePlugin = lazy_import("PIL.PngImagePlugin")
+
+# ============================
+# 生成画像の保存先（ギャラリー）
+# ============================
+# outputs/
+#   images/20261019-161500_ab12cd34.png   … PNG の tEXt に生成条件を埋め込む
+#   thumbs/20261019-161500_ab12cd34.jpg   … 一覧表示の時に初めて作る
+#   index.jsonl                           … 1画像1行。一覧・絞り込みはこれだけ読む
+OUTPUT_DIR = os.environ.get("SENTEI_OUTPUT_DIR", os.path.join(BASE_DIR, "outputs"))
+
+THUMB_SIZE = 256
+
+# PNG に書き込むキー（値は文字列、リストは JSON 文字列）
+PNG_TEXT_KEYS = ["prompt", "negative_prompt", "seed", "sampler", "steps", "model", "selection", "features"]
+
+_index_lock = threading.Lock()
+
+
+def _paths(output_dir):
+    return (
+        os.path.join(output_dir, "images"),
+        os.path.join(output_dir, "thumbs"),
+        os.path.join(output_dir, "index.jsonl"),
+    )
+
+
+def _text_value(value):
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return "" if value is None else str(value)
+
+
+# ============================
+# 保存
+# ============================
+def save_generated(image_bytes, metadata, output_dir=OUTPUT_DIR):
+    # metadata: prompt / negative_prompt / seed / sampler / steps / model / selection / features
+    image_dir, _, index_file = _paths(output_dir)
+    os.makedirs(image_dir, exist_ok=True)
+
+    created = time.time()
+    digest = hashlib.sha1(image_bytes).hexdigest()[:8]
+    image_id = time.strftime("%Y%m%d-%H%M%S", time.localtime(created)) + "_" + digest
+    filename = image_id + ".png"
+
+    img = Image.open(BytesIO(image_bytes))
+    info = PngImagePlugin.PngInfo()
+    for key in PNG_TEXT_KEYS:
+        if key in metadata:
+            info.add_itxt(key, _text_value(metadata[key]))
+
+    # A1111 / Forge 互換の "parameters" も入れておく
+    parameters = metadata.get("prompt", "")
+    if metadata.get("negative_prompt"):
+        parameters += "\nNegative prompt: " + metadata["negative_prompt"]
+    parameters += f"\nSteps: {metadata.get('steps', '')}, Sampler: {metadata.get('sampler', '')}, Seed: {metadata.get('seed', '')}"
+    info.add_itxt("parameters", parameters)
+
+    file_path = os.path.join(image_dir, filename)
+    img.save(file_path, format="PNG", pnginfo=info)
+
+    entry = {
+        "id": image_id,
+        "file": filename,
+        "created": created,
+        "width": img.width,
+        "height": img.height,
+        **{key: metadata.get(key) for key in PNG_TEXT_KEYS},
+    }
+    with _index_lock:
+        with open(index_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    return file_path
+
+
+def read_png_metadata(path):
+    # インデックスが壊れた時の再構築用（通常の一覧では使わない）
+    with Image.open(path) as img:
+        text = dict(img.text)
+    metadata = {}
+    for key in PNG_TEXT_KEYS:
+        if key not in text:
+            continue
+        value = text[key]
+        if key in ("selection", "features"):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        metadata[key] = value
+    return metadata
+
+
+def rebuild_index(output_dir=OUTPUT_DIR):
+    image_dir, _, index_file = _paths(output_dir)
+    entries = []
+    for filename in sorted(os.listdir(image_dir)) if os.path.exists(image_dir) else []:
+        if not filename.lower().endswith(".png"):
+            continue
+        path = os.path.join(image_dir, filename)
+        with Image.open(path) as img:
+            width, height = img.size
+        entries.append({
+            "id": os.path.splitext(filename)[0],
+            "file": filename,
+            "created": os.path.getmtime(path),
+            "width": width,
+            "height": height,
+            **read_png_metadata(path),
+        })
+
+    tmp_path = index_file + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, index_file)
+    return len(entries)
+
+
+# ============================
+# 一覧・絞り込み（index.jsonl だけを読む）
+# ============================
+def load_index(output_dir=OUTPUT_DIR):
+    _, _, index_file = _paths(output_dir)
+    if not os.path.exists(index_file):
+        return []
+    entries = []
+    with open(index_file, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entries.append(json.loads(line))
+    entries.sort(key=lambda e: e.get("created", 0), reverse=True)
+    return entries
+
+
+def index_version(output_dir=OUTPUT_DIR):
+    _, _, index_file = _paths(output_dir)
+    if not os.path.exists(index_file):
+        return ""
+    st_ = os.stat(index_file)
+    return f"{st_.st_mtime_ns}:{st_.st_size}"
+
+
+def all_features(entries):
+    return sorted({f for e in entries for f in (e.get("features") or [])})
+
+
+def filter_entries(entries, features=(), term=""):
+    term = term.strip().lower()
+    results = []
+    for e in entries:
+        if features and not set(features) <= set(e.get("features") or []):
+            continue
+        if term and term not in (e.get("prompt") or "").lower():
+            continue
+        results.append(e)
+    return results
+
+
+def image_path(entry, output_dir=OUTPUT_DIR):
+    image_dir, _, _ = _paths(output_dir)
+    return os.path.join(image_dir, entry["file"])
+
+
+def thumbnail_path(entry, output_dir=OUTPUT_DIR, size=THUMB_SIZE):
+    # 初めて表示する時にだけ元画像を開いてサムネイルを作る
+    _, thumb_dir, _ = _paths(output_dir)
+    path = os.path.join(thumb_dir, entry["id"] + ".jpg")
+    if not os.path.exists(path):
+        os.makedirs(thumb_dir, exist_ok=True)
+        with Image.open(image_path(entry, output_dir)) as img:
+            img = img.convert("RGB")
+            img.thumbnail((size, size))
+            img.save(path, format="JPEG", quality=85)
+    return path
@@ -0,0 +1,263 @@
+import os
+import sys
+import mmap
+import time
+import struct
+import argparse
+import threading
+from io import BytesIO
+
+import numpy as np
+
+from lazy_imports import lazy_import
+from catalog import BASE_DIR, IMAGE_DIR
+
+Image = lazy_import("PIL.Image")
+
+# ============================
+# 画像の読み込み口（フォルダ／パックファイル）
+# ============================
+# キャラ画像はすべてここを通して読む。
+#   characters.pack があれば mmap して、原画とサムネイルをスライスから直接デコードする
+#   （画像ごとの open / stat は発生しない）
+#   パックに無い画像・パックが無い場合は characters/ のファイルを読む
+#
+# パックファイルの中身:
+#   ヘッダ（24 バイト） | 原画・サムネイルのバイト列 | 索引（1画像 96 バイト固定、名前順）
+#
+#   python image_store.py build     … characters/ からパックを作る（画像を変えたら作り直す）
+#   python image_store.py info
+
+PACK_FILE = os.environ.get("SENTEI_IMAGE_PACK", os.path.join(BASE_DIR, "characters.pack"))
+
+MAGIC = b"SNTPACK1"
+PACK_VERSION = 1
+HEADER = struct.Struct("<8sIIQ")  # magic, version, 画像数, 索引の位置
+INDEX_DTYPE = np.dtype([
+    ("name", "S64"),
+    ("offset", "<u8"),
+    ("length", "<u4"),
+    ("thumb_offset", "<u8"),
+    ("thumb_length", "<u4"),
+    ("mtime_ns", "<i8"),
+])
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+THUMB_HEIGHT = 320      # 一覧・選択画面で使う大きさ（高さ揃え）
+THUMB_QUALITY = 90
+RELOAD_INTERVAL = 5.0   # パックが作り直されたかを見に行く間隔（秒）
+
+
+# ============================
+# 作成
+# ============================
+def _make_thumbnail(data):
+    img = Image.open(BytesIO(data)).convert("RGB")
+    w, h = img.size
+    if h > THUMB_HEIGHT:
+        img = img.resize((max(1, int(w * THUMB_HEIGHT / h)), THUMB_HEIGHT))
+    buffer = BytesIO()
+    img.save(buffer, format="JPEG", quality=THUMB_QUALITY)
+    return buffer.getvalue()
+
+
+def build_pack(image_dir=IMAGE_DIR, pack_path=PACK_FILE):
+    names = sorted(f for f in os.listdir(image_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+    index = np.zeros(len(names), dtype=INDEX_DTYPE)
+
+    tmp_path = pack_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        for i, name in enumerate(names):
+            encoded = name.encode("utf-8")
+            if len(encoded) > INDEX_DTYPE["name"].itemsize:
+                raise ValueError(f"ファイル名が長すぎます: {name}")
+
+            path = os.path.join(image_dir, name)
+            with open(path, "rb") as src:
+                data = src.read()
+            thumb = _make_thumbnail(data)
+
+            index[i]["name"] = encoded
+            index[i]["offset"] = f.tell()
+            index[i]["length"] = len(data)
+            f.write(data)
+            index[i]["thumb_offset"] = f.tell()
+            index[i]["thumb_length"] = len(thumb)
+            f.write(thumb)
+            index[i]["mtime_ns"] = os.stat(path).st_mtime_ns
+
+        index_offset = f.tell()
+        f.write(index.tobytes())
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, PACK_VERSION, len(names), index_offset))
+
+    os.replace(tmp_path, pack_path)
+    return len(names)
+
+
+# ============================
+# 読み込み（mmap）
+# ============================
+class PackReader:
+
+    def __init__(self, path):
+        self.path = path
+        self.stamp = os.stat(path).st_mtime_ns
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count, index_offset = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != PACK_VERSION:
+            raise ValueError(f"パックファイルの形式が違います: {path}")
+
+        # 索引も mmap のまま（名前順なので二分探索で引く）
+        self.index = np.frombuffer(self._mmap, dtype=INDEX_DTYPE, count=count, offset=index_offset)
+        self._names = self.index["name"]
+        self._view = memoryview(self._mmap)
+
+    def find(self, name):
+        key = name.encode("utf-8")
+        i = int(np.searchsorted(self._names, key))
+        if i < len(self._names) and self._names[i] == key:
+            return i
+        return None
+
+    def read(self, i, thumbnail=False):
+        record = self.index[i]
+        if thumbnail:
+            start, length = int(record["thumb_offset"]), int(record["thumb_length"])
+        else:
+            start, length = int(record["offset"]), int(record["length"])
+        return self._view[start:start + length]
+
+    def names(self):
+        return [name.decode("utf-8") for name in self._names]
+
+    def __len__(self):
+        return len(self.index)
+
+
+class ImageStore:
+
+    def __init__(self, image_dir=IMAGE_DIR, pack_path=PACK_FILE):
+        self.image_dir = os.path.abspath(image_dir)
+        self.pack_path = pack_path
+        self._lock = threading.Lock()
+        self._pack = None
+        self._checked = 0.0
+
+    def _current_pack(self):
+        # 数秒に1回だけパックの更新を確認する
+        now = time.monotonic()
+        if now - self._checked < RELOAD_INTERVAL:
+            return self._pack
+        with self._lock:
+            self._checked = now
+            try:
+                stamp = os.stat(self.pack_path).st_mtime_ns
+            except OSError:
+                self._pack = None
+                return None
+            if self._pack is None or self._pack.stamp != stamp:
+                self._pack = PackReader(self.pack_path)
+            return self._pack
+
+    def _locate(self, path):
+        # (パック, パック内の番号 or None, ファイルのパス)
+        if os.path.dirname(path) == "":
+            path = os.path.join(self.image_dir, path)
+        elif os.path.dirname(os.path.abspath(path)) != self.image_dir:
+            return None, None, path  # カタログ外の画像（生成画像など）
+
+        pack = self._current_pack()
+        if pack is None:
+            return None, None, path
+        return pack, pack.find(os.path.basename(path)), path
+
+    # ----------------------------
+    # 公開 API（path はファイル名でも characters/ 付きのパスでもよい）
+    # ----------------------------
+    def read_bytes(self, path, thumbnail=False):
+        pack, i, file_path = self._locate(path)
+        if i is not None:
+            return pack.read(i, thumbnail)
+        with open(file_path, "rb") as f:
+            return f.read()
+
+    def open(self, path):
+        return Image.open(BytesIO(self.read_bytes(path)))
+
+    def open_thumbnail(self, path):
+        # パックにあれば縮小済みの JPEG、無ければ原画
+        return Image.open(BytesIO(self.read_bytes(path, thumbnail=True)))
+
+    def stamp(self, path):
+        # キャッシュのキー用（画像が変わったら変わる値）
+        pack, i, file_path = self._locate(path)
+        if i is not None:
+            return int(pack.index[i]["mtime_ns"])
+        return os.stat(file_path).st_mtime_ns
+
+    def names(self):
+        names = set()
+        pack = self._current_pack()
+        if pack is not None:
+            names.update(pack.names())
+        if os.path.isdir(self.image_dir):
+            names.update(f for f in os.listdir(self.image_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+        return sorted(names)
+
+
+# ============================
+# プロセス内で1つだけ（全セッションで共有）
+# ============================
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ImageStore()
+        return _store
+
+
+def open_image(path):
+    return get_store().open(path)
+
+
+def open_thumbnail(path):
+    return get_store().open_thumbnail(path)
+
+
+def read_image_bytes(path):
+    return get_store().read_bytes(path)
+
+
+def image_stamp(path):
+    return get_store().stamp(path)
+
+
+def list_images():
+    return get_store().names()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--image-dir", default=IMAGE_DIR)
+    parser.add_argument("--pack", default=PACK_FILE)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        t = time.perf_counter()
+        n = build_pack(args.image_dir, args.pack)
+        print(f"{n} images -> {args.pack} ({os.path.getsize(args.pack) / 1e6:.1f} MB, "
+              f"{time.perf_counter() - t:.1f} s)")
+    else:
+        if not os.path.exists(args.pack):
+            sys.exit(f"{args.pack} がありません（python image_store.py build で作成）")
+        pack = PackReader(args.pack)
+        print(f"{args.pack}: {len(pack)} images, {os.path.getsize(args.pack) / 1e6:.1f} MB")
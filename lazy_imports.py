@@ -0,0 +1,57 @@
+import sys
+import types
+import importlib
+import importlib.util
+
+# ============================
+# 重いライブラリの遅延 import
+# ============================
+# pd = lazy_import("pandas") のように使う。
+# 最初に属性へアクセスした時点で本当に import される。
+# 途中で st.stop() するページでは import 自体が起きない。
+
+
+class LazyModule(types.ModuleType):
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_lazy_name"] = name
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            module = importlib.import_module(self.__dict__["_lazy_name"])
+            self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_lazy_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__dict__['_lazy_name']}' ({state})>"
+
+
+def lazy_import(name):
+    # 既に import 済みならそのまま返す
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
+
+
+def is_available(name):
+    # import せずにインストール済みかだけ調べる
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ModuleNotFoundError:
+        return False
+
+
+def is_loaded(module):
+    if isinstance(module, LazyModule):
+        return module.__dict__["_lazy_module"] is not None
+    return True
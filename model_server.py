@@ -0,0 +1,498 @@
+import os
+import sys
+import json
+import time
+import zlib
+import signal
+import socket
+import struct
+import asyncio
+import argparse
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from image_store import open_image, list_images
+
+# ============================
+# 推論サーバー（常駐プロセス・リクエストをまとめて処理）
+# ============================
+# torch / transformers のモデルを Streamlit の再実行ごとに読み込まないよう、
+# 別プロセスで1回だけ読み込み、Unix ソケットで埋め込み・スコアを返す。
+# Unix ソケットの無い環境（Windows）では 127.0.0.1 の TCP ポートで待ち受ける。
+# --socket には "host:port" を渡してもよい（その時は Unix 系でも TCP）
+# ・BATCH_WINDOW 秒の間に届いたリクエストを1バッチにまとめて推論する
+# ・health で件数・平均バッチサイズ・待ち行列・レイテンシ（p50/p95/p99）を返す
+# ・クライアントはサーバーが落ちていれば ModelUnavailable をすぐ返す（しばらく再接続しない）
+#
+#   python model_server.py serve --model clip      … AI_CLIP.py の CLIP
+#   python model_server.py serve --model random    … 動作確認用の小さな乱数モデル
+#   python model_server.py health
+#   python model_server.py export-embeddings       … 全キャラの埋め込みを embeddings.npz へ
+
+HAS_UNIX_SOCKET = hasattr(socket, "AF_UNIX")
+TCP_ADDRESS = "127.0.0.1:" + os.environ.get("SENTEI_MODEL_PORT", "8601")
+SOCKET_PATH = os.environ.get(
+    "SENTEI_MODEL_SOCKET",
+    os.path.join(tempfile.gettempdir(), "sentei-model.sock") if HAS_UNIX_SOCKET else TCP_ADDRESS,
+)
+
+BATCH_WINDOW = 0.01     # 最初のリクエストからこの秒数だけ後続を待つ
+MAX_BATCH = 32
+CONNECT_TIMEOUT = 0.5
+REQUEST_TIMEOUT = 30.0
+RETRY_AFTER = 5.0       # 接続できなかったら、この秒数は試さずに ModelUnavailable
+LATENCY_SAMPLES = 1000
+
+# フレーム: [ヘッダ長 u32][データ長 u32][ヘッダ JSON][データ（float32 の生バイト列）]
+FRAME = struct.Struct("<II")
+
+
+def _pack(header, payload=b""):
+    head = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    return FRAME.pack(len(head), len(payload)) + head + payload
+
+
+def _array_frame(array, **header):
+    array = np.ascontiguousarray(array, dtype=np.float32)
+    return _pack({"ok": True, "shape": list(array.shape), **header}, array.tobytes())
+
+
+def _tcp_address(address):
+    # "host:port" なら (host, port)、Unix ソケットのパスなら None
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and host and not any(c in host for c in "/\\"):
+        return host, int(port)
+    return None
+
+
+def _normalize(X):
+    return X / np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+
+
+# ============================
+# 動作確認用の小さな乱数モデル
+# ============================
+class RandomModel:
+    # 画像は 32x32 に縮小した画素、テキストは文字 3-gram のハッシュを
+    # 固定の乱数行列で射影するだけ（同じ入力には常に同じベクトル）。
+    # step_time で1バッチごとの固定コスト（GPU の呼び出しなど）を真似られる。
+
+    TEXT_BUCKETS = 4096
+
+    def __init__(self, dim=64, seed=0, step_time=0.0):
+        rng = np.random.default_rng(seed)
+        self.name = "random"
+        self.dim = dim
+        self.step_time = step_time
+        self.image_proj = rng.standard_normal((32 * 32 * 3, dim)).astype(np.float32)
+        self.text_proj = rng.standard_normal((self.TEXT_BUCKETS, dim)).astype(np.float32)
+
+    def embed_images(self, images):
+        time.sleep(self.step_time)
+        X = np.stack([
+            np.asarray(img.convert("RGB").resize((32, 32)), dtype=np.float32).ravel() / 255.0
+            for img in images
+        ])
+        return _normalize(X @ self.image_proj)
+
+    def embed_texts(self, texts):
+        time.sleep(self.step_time)
+        X = np.zeros((len(texts), self.TEXT_BUCKETS), dtype=np.float32)
+        for i, text in enumerate(texts):
+            padded = f"  {text.lower()} "
+            for k in range(len(padded) - 2):
+                X[i, zlib.crc32(padded[k:k + 3].encode("utf-8")) % self.TEXT_BUCKETS] += 1.0
+        return _normalize(X @ self.text_proj)
+
+
+def load_model(name, step_time=0.0):
+    if name == "random":
+        return RandomModel(step_time=step_time)
+    if name == "clip":
+        from AI_CLIP import ClipModel
+        return ClipModel()
+    raise ValueError(f"unknown model: {name}")
+
+
+# ============================
+# サーバー
+# ============================
+class ModelServer:
+
+    def __init__(self, model, batch_window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        self.model = model
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        # 推論は1本のスレッドで順に（その間もイベントループは次のバッチを集める）
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model")
+        self.queues = {}
+
+        self.started = time.time()
+        self.n_requests = 0
+        self.n_errors = 0
+        self.n_batches = 0
+        self.n_items = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    # ----------------------------
+    # 動的バッチ
+    # ----------------------------
+    def _prepare(self, kind, inputs):
+        # 1リクエストぶんの入力を開いて確かめる（ここで失敗したらそのリクエストだけ失敗にする）
+        if kind == "image":
+            images = []
+            for name in inputs:
+                img = open_image(name)
+                img.load()   # 壊れた画像もここで見つける
+                images.append(img)
+            return images
+        for text in inputs:
+            if not isinstance(text, str):
+                raise TypeError(f"text must be str, got {type(text).__name__}")
+        return list(inputs)
+
+    def _prepare_all(self, kind, batch_inputs):
+        # 戻り値: リクエストごとの (開いた入力, 例外) のリスト
+        results = []
+        for inputs in batch_inputs:
+            try:
+                results.append((self._prepare(kind, inputs), None))
+            except Exception as e:
+                results.append((None, e))
+        return results
+
+    def _run(self, kind, prepared):
+        if kind == "image":
+            return self.model.embed_images(prepared)
+        return self.model.embed_texts(prepared)
+
+    def _run_each(self, kind, prepared_list):
+        # まとめた推論が失敗した時：1リクエストずつやり直して、失敗したものだけ例外にする
+        results = []
+        for prepared in prepared_list:
+            try:
+                results.append((self._run(kind, prepared), None))
+            except Exception as e:
+                results.append((None, e))
+        return results
+
+    async def _batcher(self, kind):
+        loop = asyncio.get_running_loop()
+        queue = self.queues[kind]
+        while True:
+            items = [await queue.get()]
+            n = len(items[0][0])
+            deadline = loop.time() + self.batch_window
+            while n < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                items.append(item)
+                n += len(item[0])
+
+            try:
+                prepared = await loop.run_in_executor(
+                    self.executor, self._prepare_all, kind, [item_inputs for item_inputs, _ in items]
+                )
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            # 入力が開けなかったリクエストはここで失敗にし、残りだけをまとめる
+            valid = []
+            for (_, future), (inputs, error) in zip(items, prepared):
+                if error is not None:
+                    if not future.done():
+                        future.set_exception(error)
+                else:
+                    valid.append((inputs, future))
+            if not valid:
+                continue
+
+            batch = [x for inputs, _ in valid for x in inputs]
+            try:
+                vectors = await loop.run_in_executor(self.executor, self._run, kind, batch)
+            except Exception:
+                results = await loop.run_in_executor(
+                    self.executor, self._run_each, kind, [inputs for inputs, _ in valid]
+                )
+                self.n_batches += len(valid)
+                self.n_items += len(batch)
+                for (_, future), (result, error) in zip(valid, results):
+                    if future.done():
+                        continue
+                    if error is not None:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(result)
+                continue
+
+            self.n_batches += 1
+            self.n_items += len(batch)
+            start = 0
+            for inputs, future in valid:
+                if not future.done():
+                    future.set_result(vectors[start:start + len(inputs)])
+                start += len(inputs)
+
+    async def embed(self, kind, inputs):
+        if not inputs:
+            return np.zeros((0, self.model.dim), dtype=np.float32)
+        future = asyncio.get_running_loop().create_future()
+        await self.queues[kind].put((list(inputs), future))
+        return await future
+
+    # ----------------------------
+    # 状態
+    # ----------------------------
+    def stats(self):
+        latencies = sorted(self.latencies)
+
+        def pct(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2) if latencies else None
+
+        return {
+            "ok": True,
+            "model": self.model.name,
+            "dim": self.model.dim,
+            "pid": os.getpid(),
+            "uptime": round(time.time() - self.started, 1),
+            "requests": self.n_requests,
+            "errors": self.n_errors,
+            "batches": self.n_batches,
+            "mean_batch_size": round(self.n_items / self.n_batches, 2) if self.n_batches else 0.0,
+            "queued": {kind: q.qsize() for kind, q in self.queues.items()},
+            "latency_ms": {"p50": pct(0.50), "p95": pct(0.95), "p99": pct(0.99)},
+        }
+
+    # ----------------------------
+    # 接続ごとの処理
+    # ----------------------------
+    async def handle(self, header):
+        op = header.get("op")
+        if op == "health":
+            return _pack(self.stats())
+        if op == "embed_images":
+            return _array_frame(await self.embed("image", header["images"]))
+        if op == "embed_texts":
+            return _array_frame(await self.embed("text", header["texts"]))
+        if op == "score":
+            # 画像×テキストの cos 類似度
+            images, texts = await asyncio.gather(
+                self.embed("image", header["images"]), self.embed("text", header["texts"])
+            )
+            return _array_frame(images @ texts.T)
+        raise ValueError(f"unknown op: {op}")
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readexactly(FRAME.size)
+                except asyncio.IncompleteReadError:
+                    break
+                header_len, payload_len = FRAME.unpack(head)
+                header = json.loads(await reader.readexactly(header_len))
+                if payload_len:
+                    await reader.readexactly(payload_len)
+
+                t = time.perf_counter()
+                try:
+                    response = await self.handle(header)
+                except Exception as e:
+                    self.n_errors += 1
+                    response = _pack({"ok": False, "error": repr(e)})
+                if header.get("op") != "health":
+                    self.n_requests += 1
+                    self.latencies.append(time.perf_counter() - t)
+
+                writer.write(response)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path=SOCKET_PATH):
+        self.queues = {"image": asyncio.Queue(), "text": asyncio.Queue()}
+        batchers = [asyncio.create_task(self._batcher(kind)) for kind in self.queues]
+
+        tcp = _tcp_address(socket_path)
+        if tcp is not None:
+            server = await asyncio.start_server(self.handle_connection, *tcp)
+        else:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            server = await asyncio.start_unix_server(self.handle_connection, socket_path)
+        # SIGTERM でも後片付け（ソケットファイルの削除）をしてから終わる
+        # （Windows のイベントループはシグナルを扱えないので Ctrl+C だけ）
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except NotImplementedError:
+            pass
+        print(f"model server ({self.model.name}, dim={self.model.dim}) listening on {socket_path}", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in batchers:
+                task.cancel()
+            self.executor.shutdown(wait=False)
+            if tcp is None and os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+
+# ============================
+# クライアント（Streamlit 側・バッチ処理側から使う）
+# ============================
+class ModelUnavailable(Exception):
+    pass
+
+
+class ModelError(Exception):
+    pass
+
+
+def _recv_exactly(sock, n):
+    chunks = []
+    while n:
+        chunk = sock.recv(n)
+        if not chunk:
+            raise ConnectionError("model server closed the connection")
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b"".join(chunks)
+
+
+class ModelClient:
+
+    def __init__(self, socket_path=SOCKET_PATH, timeout=REQUEST_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._down_until = 0.0
+
+    def _connect(self):
+        tcp = _tcp_address(self.socket_path)
+        if tcp is not None:
+            return socket.create_connection(tcp, timeout=CONNECT_TIMEOUT)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _call(self, header):
+        if time.monotonic() < self._down_until:
+            raise ModelUnavailable("model server is down (retrying later)")
+        try:
+            with self._connect() as sock:
+                sock.settimeout(self.timeout)
+                sock.sendall(_pack(header))
+                header_len, payload_len = FRAME.unpack(_recv_exactly(sock, FRAME.size))
+                response = json.loads(_recv_exactly(sock, header_len))
+                payload = _recv_exactly(sock, payload_len) if payload_len else b""
+        except OSError as e:
+            # 落ちている・起動していない：しばらくは接続を試さずにすぐ返す
+            self._down_until = time.monotonic() + RETRY_AFTER
+            raise ModelUnavailable(str(e)) from e
+
+        self._down_until = 0.0
+        if not response.get("ok"):
+            raise ModelError(response.get("error", "unknown error"))
+        return response, payload
+
+    def _array(self, header):
+        response, payload = self._call(header)
+        return np.frombuffer(payload, dtype=np.float32).reshape(response["shape"])
+
+    def embed_images(self, images):
+        # images: キャラ画像のファイル名（またはパス）のリスト
+        return self._array({"op": "embed_images", "images": list(images)})
+
+    def embed_texts(self, texts):
+        return self._array({"op": "embed_texts", "texts": list(texts)})
+
+    def score(self, images, texts):
+        # 戻り値: (画像数, テキスト数) の類似度
+        return self._array({"op": "score", "images": list(images), "texts": list(texts)})
+
+    def health(self):
+        # サーバーが動いていなければ None（例外にしない）
+        try:
+            response, _ = self._call({"op": "health"})
+            return response
+        except (ModelUnavailable, ModelError):
+            return None
+
+    def is_available(self):
+        return self.health() is not None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ModelClient()
+        return _client
+
+
+def export_embeddings(path, client=None, batch_size=64):
+    # 全キャラ画像の埋め込みを clustering.py が読む形式（names / vectors）で保存
+    client = client or get_client()
+    names = list_images()
+    vectors = [client.embed_images(names[i:i + batch_size]) for i in range(0, len(names), batch_size)]
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, names=np.array(names, dtype=str), vectors=np.concatenate(vectors))
+    os.replace(tmp_path, path)
+    return len(names)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["serve", "health", "export-embeddings"])
+    parser.add_argument("--socket", default=SOCKET_PATH)
+    parser.add_argument("--model", default="clip", choices=["clip", "random"])
+    parser.add_argument("--window", type=float, default=BATCH_WINDOW)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--step-time", type=float, default=0.0, help="random モデルの1バッチの固定コスト（秒）")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = ModelServer(load_model(args.model, args.step_time), args.window, args.max_batch)
+        try:
+            asyncio.run(server.serve(args.socket))
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            pass
+
+    elif args.command == "health":
+        stats = ModelClient(args.socket).health()
+        if stats is None:
+            sys.exit(f"model server is not running ({args.socket})")
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+
+    else:
+        from clustering import EMBEDDING_FILE
+        out = args.out or EMBEDDING_FILE
+        try:
+            n = export_embeddings(out, ModelClient(args.socket))
+        except ModelUnavailable as e:
+            sys.exit(f"model server is not running ({e})")
+        print(f"{n} embeddings -> {out}")
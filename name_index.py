@@ -0,0 +1,238 @@
+import bisect
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+# ============================
+# キャラ名・作品名の検索インデックス
+# ============================
+# 正規化: NFKC → 小文字 → カタカナをひらがなに畳み込み → 空白・記号除去
+# ローマ字: かなを含むキーはローマ字表記でも登録（shiroha → しろは）
+# 検索: 完全一致 > 前方一致 > 部分一致 > あいまい一致（編集距離）の順に全件返す
+#   前方一致はソート済みキーの二分探索、部分一致とあいまい一致は
+#   バイグラムの転置リスト（postings）で候補を絞ってから確認する。
+
+GRAM = 2
+MAX_FUZZY_CANDIDATES = 200
+
+# ============================
+# かな → ローマ字（ヘボン式の簡易版）
+# ============================
+_KANA_ROMAJI = {
+    "あ": "a", "い": "i", "う": "u", "え": "e", "お": "o",
+    "か": "ka", "き": "ki", "く": "ku", "け": "ke", "こ": "ko",
+    "さ": "sa", "し": "shi", "す": "su", "せ": "se", "そ": "so",
+    "た": "ta", "ち": "chi", "つ": "tsu", "て": "te", "と": "to",
+    "な": "na", "に": "ni", "ぬ": "nu", "ね": "ne", "の": "no",
+    "は": "ha", "ひ": "hi", "ふ": "fu", "へ": "he", "ほ": "ho",
+    "ま": "ma", "み": "mi", "む": "mu", "め": "me", "も": "mo",
+    "や": "ya", "ゆ": "yu", "よ": "yo",
+    "ら": "ra", "り": "ri", "る": "ru", "れ": "re", "ろ": "ro",
+    "わ": "wa", "ゐ": "i", "ゑ": "e", "を": "o", "ん": "n",
+    "が": "ga", "ぎ": "gi", "ぐ": "gu", "げ": "ge", "ご": "go",
+    "ざ": "za", "じ": "ji", "ず": "zu", "ぜ": "ze", "ぞ": "zo",
+    "だ": "da", "ぢ": "ji", "づ": "zu", "で": "de", "ど": "do",
+    "ば": "ba", "び": "bi", "ぶ": "bu", "べ": "be", "ぼ": "bo",
+    "ぱ": "pa", "ぴ": "pi", "ぷ": "pu", "ぺ": "pe", "ぽ": "po",
+    "ゔ": "vu",
+    "ぁ": "a", "ぃ": "i", "ぅ": "u", "ぇ": "e", "ぉ": "o",
+    "ゃ": "ya", "ゅ": "yu", "ょ": "yo", "ゎ": "wa",
+}
+
+# きゃ・しゅ・ちょ など（子音＋小さいゃゅょ）
+_YOUON = {"ゃ": "a", "ゅ": "u", "ょ": "o"}
+_YOUON_HEAD = {"し": "sh", "ち": "ch", "じ": "j", "ぢ": "j"}
+
+
+def to_hiragana(text):
+    # カタカナ（ァ〜ヶ）をひらがなに
+    return "".join(
+        chr(ord(c) - 0x60) if "ァ" <= c <= "ヶ" else c
+        for c in text
+    )
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = to_hiragana(text)
+    return "".join(
+        c for c in text
+        if c == "ー" or unicodedata.category(c)[0] in ("L", "N")
+    )
+
+
+def to_romaji(text):
+    # normalize() 済みの文字列を想定（かな以外はそのまま残す）
+    out = []
+    i = 0
+    sokuon = False
+    while i < len(text):
+        c = text[i]
+        nxt = text[i + 1] if i + 1 < len(text) else ""
+
+        if c == "っ":
+            sokuon = True
+            i += 1
+            continue
+
+        if nxt in _YOUON and c in _KANA_ROMAJI and c not in _YOUON:
+            head = _YOUON_HEAD.get(c, _KANA_ROMAJI[c][:-1] + "y")
+            roma = head + _YOUON[nxt]
+            i += 2
+        elif c == "ー":
+            roma = out[-1][-1] if out and out[-1] else ""
+            i += 1
+        else:
+            roma = _KANA_ROMAJI.get(c, c)
+            i += 1
+
+        if sokuon and roma and roma[0].isalpha():
+            roma = roma[0] + roma
+        sokuon = False
+        out.append(roma)
+
+    return "".join(out)
+
+
+def _has_kana(text):
+    return any("ぁ" <= c <= "ゖ" for c in text)
+
+
+def _grams(text):
+    padded = "^" + text + "$"
+    return {padded[i:i + GRAM] for i in range(len(padded) - GRAM + 1)}
+
+
+def bounded_edit_distance(a, b, max_dist):
+    # max_dist を超えたら打ち切る Levenshtein 距離（超えたら max_dist + 1）
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        row_min = i
+        for j, cb in enumerate(b, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if cur[j] < row_min:
+                row_min = cur[j]
+        if row_min > max_dist:
+            return max_dist + 1
+        prev = cur
+    return prev[-1] if prev[-1] <= max_dist else max_dist + 1
+
+
+class NameIndex:
+
+    def __init__(self, features, fields=("name", "work"), romaji=True):
+        self.romaji = romaji
+
+        # 正規化キー → そのキーを持つ画像（重複名も全部保持する）
+        key_images = defaultdict(list)
+        for img, data in features.items():
+            for field in fields:
+                key = normalize(data.get(field, ""))
+                if not key:
+                    continue
+                key_images[key].append(img)
+                if romaji and _has_kana(key):
+                    key_images[to_romaji(key)].append(img)
+
+        self.keys = sorted(key_images)
+        self.key_images = [sorted(set(key_images[k])) for k in self.keys]
+
+        # バイグラム → キー番号の配列
+        postings = defaultdict(list)
+        for i, key in enumerate(self.keys):
+            for g in _grams(key):
+                postings[g].append(i)
+        self.postings = {g: np.array(ids, dtype=np.int32) for g, ids in postings.items()}
+
+    def __len__(self):
+        return len(self.keys)
+
+    # ----------------------------
+    # 前方一致（二分探索）
+    # ----------------------------
+    def _prefix_ids(self, q):
+        lo = bisect.bisect_left(self.keys, q)
+        hi = bisect.bisect_left(self.keys, q + "\U0010ffff")
+        return range(lo, hi)
+
+    # ----------------------------
+    # 共有バイグラム数（NumPy で一括集計）
+    # ----------------------------
+    def _gram_overlap(self, q):
+        lists = [self.postings[g] for g in _grams(q) if g in self.postings]
+        if not lists:
+            return np.zeros(len(self.keys), dtype=np.int32)
+        return np.bincount(np.concatenate(lists), minlength=len(self.keys))
+
+    def _images_for(self, key_ids):
+        return {img for i in key_ids for img in self.key_images[i]}
+
+    def search(self, query, max_dist=None, limit=None):
+        # 戻り値: [(画像, スコア), ...]  スコアが小さいほど上位
+        # 同じ段階（前方一致・部分一致）の中はキーの五十音／アルファベット順。
+        # limit があれば、上位の段階だけで埋まった時点で下位の段階は調べない。
+        q = normalize(query)
+        if not q:
+            return []
+        if max_dist is None:
+            max_dist = 0 if len(q) <= 2 else 1 if len(q) <= 5 else 2
+
+        # キー単位でスコアを付け、最後に画像へ展開する
+        scored = {}
+
+        def add(key_id, score):
+            if key_id not in scored or score < scored[key_id]:
+                scored[key_id] = score
+
+        def enough():
+            return limit and len(scored) >= limit and len(self._images_for(scored)) >= limit
+
+        # 完全一致 / 前方一致
+        for i in self._prefix_ids(q):
+            add(i, 0.0 if self.keys[i] == q else 1.0)
+            if enough():
+                break
+
+        # 部分一致：クエリ内側のバイグラムを全部含むキーだけ確認する
+        # （1文字のクエリは前方一致のみ）
+        if len(q) >= GRAM and not enough():
+            inner = {q[i:i + GRAM] for i in range(len(q) - GRAM + 1)}
+            lists = [self.postings.get(g) for g in inner]
+            if all(l is not None for l in lists):
+                counts = np.bincount(np.concatenate(lists), minlength=len(self.keys))
+                for i in np.flatnonzero(counts >= len(inner)):
+                    if i not in scored and q in self.keys[i]:
+                        add(i, 2.0)
+                        if enough():
+                            break
+
+        # あいまい一致：q-gram の下限で絞ってから編集距離を確認
+        if max_dist > 0 and not enough():
+            overlap = self._gram_overlap(q)
+            min_shared = len(q) + 1 - GRAM * max_dist
+            candidates = np.flatnonzero(overlap >= max(1, min_shared))
+            if len(candidates) > MAX_FUZZY_CANDIDATES:
+                top = np.argpartition(-overlap[candidates], MAX_FUZZY_CANDIDATES)[:MAX_FUZZY_CANDIDATES]
+                candidates = candidates[top]
+            for i in candidates:
+                if i in scored:
+                    continue
+                d = bounded_edit_distance(q, self.keys[i], max_dist)
+                if d <= max_dist:
+                    add(i, 3.0 + d)
+
+        ranked = []
+        seen = set()
+        for key_id, score in sorted(scored.items(), key=lambda kv: (kv[1], kv[0])):
+            for img in self.key_images[key_id]:
+                if img in seen:
+                    continue
+                seen.add(img)
+                ranked.append((img, score))
+                if limit and len(ranked) >= limit:
+                    return ranked
+        return ranked
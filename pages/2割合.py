@@ -1,26 +1,29 @@
 import streamlit as st
 import os
-import json
-import pandas as pd
-import altair as alt
+
+from lazy_imports import lazy_import
+from catalog import load_catalog_frame, make_ratio_df
+from popularity import WINDOW_LABELS, get_counters
+from clustering import get_clusters
+
+# 重いライブラリは実際に使うまで import しない
+pd = lazy_import("pandas")
+alt = lazy_import("altair")
 
 FEATURE_FILE = "character_features.json"
 
 st.title("特徴の割合を可視化")
 
-# JSON読み込み
-if os.path.exists(FEATURE_FILE):
-    with open(FEATURE_FILE, "r", encoding="utf-8") as f:
-        features = json.load(f)
-else:
+# 特徴データ読み込み（列指向スナップショットを mmap、name / other は不要）
+if not os.path.exists(FEATURE_FILE):
     st.write("特徴データがありません")
     st.stop()
 
-# DataFrame化
-df = pd.DataFrame.from_dict(features, orient="index")
-
-# 欠損値を空文字に統一
-df = df.fillna("")
+df = load_catalog_frame(columns=[
+    "work", "hair_length", "hair_color_main", "hair_color_sub",
+    "hairstyle_main", "hairstyle_type", "hairstyle_detail",
+    "eye_color", "eye_shape", "expression", "vibe"
+])
 
 # ============================
 # ★ 作品名フィルタ
@@ -40,20 +43,6 @@ if selected_work != "全作品":
 else:
     df_filtered = df
 
-# ============================
-# ★ 割合計算関数
-# ============================
-def make_ratio_df(column_name, target_df):
-    counts = target_df[column_name].value_counts()
-    if counts.sum() == 0:
-        return pd.DataFrame({column_name: [], "count": [], "ratio (%)": []})
-    ratio = (counts / counts.sum() * 100).round(1)
-    return pd.DataFrame({
-        column_name: counts.index,
-        "count": counts.values,
-        "ratio (%)": ratio.values
-    })
-
 # ============================
 # ★ グラフ生成関数
 # ============================
@@ -92,4 +81,100 @@ show_ratio_chart("髪型（細分類）", "hairstyle_detail")
 show_ratio_chart("目の色", "eye_color")
 show_ratio_chart("目の形", "eye_shape")
 show_ratio_chart("表情", "expression")
-show_ratio_chart("雰囲気", "vibe")
\ No newline at end of file
+show_ratio_chart("雰囲気", "vibe")
+
+# ============================
+# ★ クラスタ構成（似た特徴のキャラのまとまり）
+# ============================
+st.header("クラスタ構成")
+
+clusters = get_clusters()
+composition = clusters.composition()
+
+# 作品で絞り込んでいる時は、その作品のキャラがどのクラスタにいるかも並べる
+labels = [clusters.label_of(img) for img in df_filtered.index]
+work_sizes = pd.Series([l for l in labels if l is not None]).value_counts()
+
+cluster_df = pd.DataFrame({
+    "cluster": [row["cluster"] for row in composition],
+    "全体": [row["size"] for row in composition],
+    "絞り込み後": [int(work_sizes.get(row["cluster"], 0)) for row in composition],
+    "主な特徴": [
+        ", ".join(f"{value} {share:.0%}" for _, value, share in row["features"])
+        for row in composition
+    ],
+})
+
+size_chart = alt.Chart(
+    cluster_df.melt(id_vars="cluster", value_vars=["全体", "絞り込み後"], var_name="kind", value_name="count")
+).mark_bar().encode(
+    x=alt.X("cluster:N", title="クラスタ"),
+    xOffset="kind:N",
+    y=alt.Y("count:Q", title="キャラ数"),
+    color=alt.Color("kind:N", title=""),
+    tooltip=["cluster", "kind", "count"]
+)
+st.altair_chart(size_chart, use_container_width=True)
+st.dataframe(cluster_df, hide_index=True)
+
+# ============================
+# ★ 実際に選ばれた割合（選択率 vs カタログ内の割合）
+# ============================
+st.header("選ばれやすさ（選択率 vs カタログ内の割合）")
+
+ATTRIBUTE_TITLES = {
+    "hair_length": "髪の長さ",
+    "hair_color_main": "髪色（大分類）",
+    "hair_color_sub": "髪色（中分類）",
+    "hairstyle_main": "髪型（大分類）",
+    "hairstyle_type": "髪型（中分類）",
+    "hairstyle_detail": "髪型（細分類）",
+    "eye_color": "目の色",
+    "eye_shape": "目の形",
+    "expression": "表情",
+    "vibe": "雰囲気",
+}
+
+counters = get_counters()
+
+if counters.n_events == 0:
+    st.write("まだ選択データがありません")
+    st.stop()
+
+window = st.radio("期間", ["hour", "day", "all"], format_func=WINDOW_LABELS.get, index=2, horizontal=True)
+attribute = st.selectbox("特徴", list(ATTRIBUTE_TITLES), format_func=ATTRIBUTE_TITLES.get)
+
+pick_df = pd.DataFrame(counters.stats(window, attribute))
+
+if len(pick_df) == 0:
+    st.write("この期間の選択データがありません")
+    st.stop()
+
+# カタログ内の割合（作品フィルタに関係なく全体）と突き合わせる
+catalog_df = make_ratio_df(attribute, df)
+catalog_df = catalog_df[catalog_df[attribute] != ""].rename(columns={attribute: "value"})
+catalog_df["カタログ内の割合 (%)"] = (catalog_df["count"] / catalog_df["count"].sum() * 100).round(1)
+
+pick_df["選ばれた割合 (%)"] = (pick_df["picked"] / max(1, pick_df["picked"].sum()) * 100).round(1)
+pick_df["選択率 (%)"] = (pick_df["pick_rate"] * 100).round(1)
+
+merged = catalog_df[["value", "カタログ内の割合 (%)"]].merge(
+    pick_df[["value", "shown", "picked", "選ばれた割合 (%)", "選択率 (%)"]],
+    on="value", how="outer"
+).fillna(0)
+
+long_df = merged.melt(
+    id_vars="value",
+    value_vars=["カタログ内の割合 (%)", "選ばれた割合 (%)"],
+    var_name="kind", value_name="percent"
+)
+
+chart = alt.Chart(long_df).mark_bar().encode(
+    x=alt.X("value:N", title=ATTRIBUTE_TITLES[attribute]),
+    xOffset="kind:N",
+    y=alt.Y("percent:Q", title="割合 (%)"),
+    color=alt.Color("kind:N", title=""),
+    tooltip=["value", "kind", "percent"]
+)
+st.altair_chart(chart, use_container_width=True)
+st.dataframe(merged.sort_values("選択率 (%)", ascending=False), hide_index=True)
@@ -1,27 +1,59 @@
 import streamlit as st
 import os
 import json
+import time
+import uuid
 import random
-from PIL import Image
 from io import BytesIO
 import base64
 
+from lazy_imports import lazy_import
+from preference import PreferenceModel
+from rating import get_store
+from popularity import get_counters
+from image_store import open_thumbnail
+from clustering import get_clusters, sample_across_clusters
+from selection_log import get_log
+
+# スタート前は PIL を import しない
+Image = lazy_import("PIL.Image")
+
 IMAGE_DIR = "characters"
 FEATURE_FILE = "character_features.json"
-SELECTED_FILE = "selected.json"
 
-st.title("キャラ選択（ランダム2枚から選ぶ）")
+st.title("キャラ選択（ランダムな候補から選ぶ）")
 
 # ---------------------------------------------------
 # 初期化
 # ---------------------------------------------------
 
+# 選択はセッションごとにイベントログへ追記する（他のセッションと混ざらない）
+# ID は URL（?session=...）にも置き、ブラウザを再読み込みしても同じセッションに戻れるようにする
+if "session_id" not in st.session_state:
+    st.session_state["session_id"] = st.query_params.get("session") or uuid.uuid4().hex
+st.query_params["session"] = st.session_state["session_id"]
+
 if "started" not in st.session_state:
-    st.session_state["started"] = False
+    # 再読み込みで戻ってきた時、ログに途中までの選択があればその続きから
+    st.session_state["started"] = bool(get_log().session_run(st.session_state["session_id"])["selected"])
 
 if "finished" not in st.session_state:
     st.session_state["finished"] = False
 
+# 1回に表示する枚数（4枚から1枚選ぶと1クリックで3比較になる）
+N_WAY_OPTIONS = [2, 4]
+n_way = st.radio(
+    "候補の枚数",
+    N_WAY_OPTIONS,
+    format_func=lambda n: f"{n}枚から1枚",
+    horizontal=True,
+    key="n_way",
+    disabled=st.session_state["started"] and not st.session_state["finished"]
+)
+
+# 似たキャラばかり並ばないよう、候補は別々のクラスタから1枚ずつ選ぶ
+cross_cluster = st.checkbox("別々のクラスタから候補を選ぶ", value=True, key="cross_cluster")
+
 # ---------------------------------------------------
 # スタート / リセット
 # ---------------------------------------------------
@@ -29,10 +61,11 @@ if "finished" not in st.session_state:
 col_start, col_reset = st.columns(2)
 
 if col_start.button("スタート"):
-    if os.path.exists(SELECTED_FILE):
-        os.remove(SELECTED_FILE)
+    get_log().start(st.session_state["session_id"])
 
     st.session_state["selected"] = []
+    st.session_state["comparisons"] = []
+    st.session_state["pref_model"] = None
     st.session_state["count"] = 0
     st.session_state["pair"] = None
     st.session_state["started"] = True
@@ -42,8 +75,7 @@ if col_start.button("スタート"):
     st.rerun()
 
 if col_reset.button("リセット"):
-    if os.path.exists(SELECTED_FILE):
-        os.remove(SELECTED_FILE)
+    get_log().reset(st.session_state["session_id"])
 
     st.session_state.clear()
     st.session_state["started"] = False
@@ -68,57 +100,44 @@ with open(FEATURE_FILE, "r", encoding="utf-8") as f:
 
 images = list(features.keys())
 
-if "selected" not in st.session_state:
-    if os.path.exists(SELECTED_FILE):
-        with open(SELECTED_FILE, "r", encoding="utf-8") as f:
-            st.session_state["selected"] = json.load(f)
-    else:
-        st.session_state["selected"] = []
+# このセッションの途中経過はログから組み立て直す
+if "selected" not in st.session_state or "comparisons" not in st.session_state:
+    run = get_log().session_run(st.session_state["session_id"])
+    st.session_state["selected"] = run["selected"]
+    st.session_state["comparisons"] = run["comparisons"]
 
 if "count" not in st.session_state:
     st.session_state["count"] = len(st.session_state["selected"])
 
-st.write(f"現在の選択数：{st.session_state['count']} / 10")
-
-# ---------------------------------------------------
-# 10回で自動遷移
-# ---------------------------------------------------
-
-if st.session_state["count"] >= 10 and not st.session_state["finished"]:
-
-    with open(SELECTED_FILE, "w", encoding="utf-8") as f:
-        json.dump(st.session_state["selected"], f, ensure_ascii=False, indent=4)
-
-    st.session_state["finished"] = True
-    st.success("10回の選択が完了しました！次のページへ移動します。")
-    st.switch_page("pages/4連関分析.py")
-    st.stop()
-
-if st.session_state["finished"]:
-    st.info("選択は完了しています。リセットして再開できます。")
-    st.stop()
-
 # ---------------------------------------------------
-# ランダム2枚
+# 選好モデル（勝ち／負けの両方から学習）
 # ---------------------------------------------------
-if "used" not in st.session_state:
-    st.session_state["used"] = []
+if st.session_state.get("pref_model") is None:
+    st.session_state["pref_model"] = PreferenceModel(features).fit(st.session_state["comparisons"])
 
-if "pair" not in st.session_state or st.session_state["pair"] is None:
+def record_pick(winner, candidates):
+    losers = [img for img in candidates if img != winner]
 
-    used = st.session_state["used"]
+    # 表示した候補・選んだ画像・選ぶまでの時間を追記
+    get_log().record(
+        st.session_state["session_id"], st.session_state["count"] + 1, candidates, winner,
+        time.time() - st.session_state.get("shown_at", time.time())
+    )
 
-    remaining = [img for img in images if img not in used]
+    st.session_state["selected"].append(winner)
+    for loser in losers:
+        st.session_state["comparisons"].append([winner, loser])
+        st.session_state["pref_model"].update(winner, loser)
 
-    if len(remaining) < 2:
-        st.warning("選べる画像がもうありません")
-        st.stop()
+    # 全セッション共通のレーティングも更新
+    get_store().record(winner, losers)
 
-    st.session_state["pair"] = random.sample(remaining, 2)
+    # 特徴ごとの表示回数・選択回数（割合ページで使う）
+    get_counters().record(candidates, winner, features)
 
-img1, img2 = st.session_state["pair"]
-
-col1, col2 = st.columns(2)
+    st.session_state["used"].extend(candidates)
+    st.session_state["pair"] = None
+    st.session_state["count"] += 1
 
 # ---------------------------------------------------
 # 正方形サムネイル生成
@@ -128,7 +147,7 @@ TARGET_HEIGHT = 300
 CANVAS_SIZE = 320
 
 def make_square_thumbnail(path):
-    img = Image.open(path).convert("RGB")
+    img = open_thumbnail(path).convert("RGB")
     w, h = img.size
 
     new_w = int(w * (TARGET_HEIGHT / h))
@@ -167,33 +186,63 @@ def show_square_thumbnail(path):
     st.markdown(html, unsafe_allow_html=True)
 
 # ---------------------------------------------------
-# ボタン（キャラ名）＋ サムネイル
+# 候補の表示と選択（フラグメント）
 # ---------------------------------------------------
-with col1:
-    label1 = features[img1]["name"]
-    if st.button(label1, use_container_width=True):
-        st.session_state["selected"].append(img1)
-        st.session_state["used"].extend([img1, img2])
-        st.session_state["pair"] = None
-        st.session_state["count"] += 1
-        st.rerun()
-
-    show_square_thumbnail(os.path.join(IMAGE_DIR, img1))
-
-with col2:
-    label2 = features[img2]["name"]
-    if st.button(label2, use_container_width=True):
-        st.session_state["selected"].append(img2)
-        st.session_state["used"].extend([img1, img2])
-        st.session_state["pair"] = None
-        st.session_state["count"] += 1
-        st.rerun()
-
-    show_square_thumbnail(os.path.join(IMAGE_DIR, img2))
+# 候補をクリックしても、このフラグメント（選択数・候補・ボタン）だけを再実行する。
+# 特徴 JSON の読み込みや選好モデルの準備などページ全体はやり直さない。
+# 選択の記録はボタンのコールバックで行うので、1クリック = 1回の再実行で次の候補が出る。
+@st.fragment
+def comparison_pair():
+    st.write(f"現在の選択数：{st.session_state['count']} / 10")
+
+    # ---------------------------------------------------
+    # 10回で自動遷移（ページ移動はアプリ全体の再実行になる）
+    # ---------------------------------------------------
+    if st.session_state["count"] >= 10 and not st.session_state["finished"]:
+        st.session_state["finished"] = True
+        st.success("10回の選択が完了しました！次のページへ移動します。")
+        st.switch_page("pages/4連関分析.py")
+
+    if st.session_state["finished"]:
+        st.info("選択は完了しています。リセットして再開できます。")
+        return
+
+    # ---------------------------------------------------
+    # ランダムに n_way 枚
+    # ---------------------------------------------------
+    if "used" not in st.session_state:
+        st.session_state["used"] = []
+
+    if "pair" not in st.session_state or st.session_state["pair"] is None:
+
+        used = st.session_state["used"]
+
+        remaining = [img for img in images if img not in used]
+
+        if len(remaining) < n_way:
+            st.warning("選べる画像がもうありません")
+            return
+
+        if cross_cluster:
+            st.session_state["pair"] = sample_across_clusters(remaining, n_way, get_clusters())
+        else:
+            st.session_state["pair"] = random.sample(remaining, n_way)
+        st.session_state["shown_at"] = time.time()
+
+    candidates = st.session_state["pair"]
+
+    cols = st.columns(len(candidates))
+
+    # ---------------------------------------------------
+    # ボタン（キャラ名）＋ サムネイル
+    # ---------------------------------------------------
+    for col, img in zip(cols, candidates):
+        with col:
+            label = features[img]["name"]
+            st.button(label, key=f"pick_{img}", use_container_width=True,
+                      on_click=record_pick, args=(img, candidates))
+
+            show_square_thumbnail(os.path.join(IMAGE_DIR, img))
 
-# ---------------------------------------------------
-# 保存
-# ---------------------------------------------------
 
-with open(SELECTED_FILE, "w", encoding="utf-8") as f:
-    json.dump(st.session_state["selected"], f, ensure_ascii=False, indent=4)
\ No newline at end of file
+comparison_pair()
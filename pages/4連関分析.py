@@ -1,18 +1,24 @@
 import streamlit as st
 import os
-import json
-import pandas as pd
-from mlxtend.frequent_patterns import apriori, association_rules
-import base64
-import requests
-
-import altair as alt
-# Altair の巨大データ埋め込みを防ぐ
-alt.data_transformers.disable_max_rows()
-alt.data_transformers.enable('json')
-
-FEATURE_FILE = "character_features.json"
-SELECTED_FILE = "selected.json"
+import numpy as np
+
+from lazy_imports import lazy_import
+from catalog import ATTRIBUTE_COLUMNS, load_catalog_frame, catalog_version
+from preference import PreferenceModel
+from selection_log import get_log
+from association import DEFAULT_PARAMS, cached_association
+from sweep import DEFAULT_GRID, sweep, results_frame
+from recommend import get_index
+from contact_sheet import contact_sheet_html
+from sd_client import GenerationError, generate_with_progress, interrupt_button
+from gallery import save_generated
+from prompt import NEGATIVE_PROMPT, build_prompt, build_payload
+
+# 重いライブラリは実際に使うまで import しない
+pd = lazy_import("pandas")
+alt = lazy_import("altair")
+
+IMAGE_DIR = "characters"
 
 st.title("連関分析（好みの特徴を抽出）")
 
@@ -20,24 +26,30 @@ st.title("連関分析（好みの特徴を抽出）")
 # データ読み込み
 # ---------------------------------------------------
 
-with open(FEATURE_FILE, "r", encoding="utf-8") as f:
-    features = json.load(f)
+# 列指向スナップショットから分析に使う列だけ読む
+catalog_df = load_catalog_frame(columns=ATTRIBUTE_COLUMNS)
 
-if not os.path.exists(SELECTED_FILE):
+# このセッションの選択だけをイベントログから（他のセッションの選択は見せない）
+# 再読み込みで session_state が消えても、URL の ?session=... から同じセッションに戻る
+session_id = st.session_state.get("session_id") or st.query_params.get("session")
+if session_id:
+    st.session_state["session_id"] = session_id
+    st.query_params["session"] = session_id
+run = get_log().session_run(session_id) if session_id else {"selected": []}
+
+if not run["selected"]:
     st.write("まだ選択データがありません")
     st.stop()
 
-with open(SELECTED_FILE, "r", encoding="utf-8") as f:
-    selected = json.load(f)
-
-# 選択されたキャラの特徴をまとめる
-selected_features = [features[img] for img in selected]
+selected = run["selected"]
+comparisons = run["comparisons"]
 
-# DataFrame 化
-df = pd.DataFrame(selected_features)
+# Altair の巨大データ埋め込みを防ぐ
+alt.data_transformers.disable_max_rows()
+alt.data_transformers.enable('json')
 
-# name, work, other を元データから削除
-df = df.drop(columns=["name", "work", "other"], errors="ignore")
+# 選択されたキャラの特徴をまとめる（name, work, other は読み込んでいない）
+df = catalog_df.loc[selected].reset_index(drop=True)
 
 # ★ 行番号を 1 始まりにする
 df.index = df.index + 1
@@ -49,93 +61,143 @@ df.index.name = "No."
 
 st.subheader("選ばれた特徴一覧")
 st.dataframe(df)
+st.caption(f"選択 {len(selected)} 回・1回あたりの判断時間（中央値）{np.median(run['decision_times']):.1f} 秒")
 
 # ---------------------------------------------------
 # アソシエーション分析
 # ---------------------------------------------------
-# One-hot 化
-df_hot = pd.get_dummies(df)
-
-# name_〇〇, other_〇〇 を完全に除去
-df_hot = df_hot[[c for c in df_hot.columns
-                 if not c.startswith("name_")
-                 and not c.startswith("other_")
-                 and not c.startswith("work_")]]
-
-# 重み付け（専用最適化）
-for col in df_hot.columns:
-
-    # 髪型（最重要）
-    if "hairstyle_detail" in col:
-        df_hot[col] *= 3.0
-    elif "hairstyle_type" in col:
-        df_hot[col] *= 2.5
-    elif "hairstyle_main" in col:
-        df_hot[col] *= 2.0
-
-    # 髪の長さ
-    elif "hair_length" in col:
-        df_hot[col] *= 2.0
-
-    # 髪色（大分類・中分類）
-    elif "hair_color_main" in col:
-        df_hot[col] *= 1.8
-    elif "hair_color_sub" in col:
-        df_hot[col] *= 1.5
-
-    # 目の色・形（中間）
-    elif "eye_color" in col:
-        df_hot[col] *= 1.0
-    elif "eye_shape" in col:
-        df_hot[col] *= 0.8
-
-    # 表情・雰囲気（弱め）
-    elif "expression" in col:
-        df_hot[col] *= 0.5
-    elif "vibe" in col:
-        df_hot[col] *= 0.5
-
-# 正規化（重みの暴れを抑える）
-df_hot = df_hot / df_hot.max()
-
-# apriori（精度向上版）
-frequent = apriori(df_hot, min_support=0.25, use_colnames=True)
-rules = association_rules(frequent, metric="lift", min_threshold=1.1)
-rules = rules.sort_values("lift", ascending=False)
+# 同じ選択・同じパラメータの結果は全セッションで共有キャッシュから返す
+# （生成・保存ボタンでの再実行でも apriori はやり直さない）
+# パラメータ探索で採用した設定があればそれを使う
+analysis_params = st.session_state.get("analysis_params", DEFAULT_PARAMS)
+
+rules, top_features = cached_association(selected, catalog_df, catalog_version(), **analysis_params)
 
 st.subheader("連関分析結果")
+st.caption(
+    f"min_support={analysis_params['min_support']} / "
+    f"{analysis_params['metric']} >= {analysis_params['min_threshold']}"
+)
 st.dataframe(rules.head(50))
 
 # ---------------------------------------------------
-# 好みの特徴抽出
+# パラメータ探索（全組み合わせを並列に評価）
 # ---------------------------------------------------
 
-top_features = set()
-for _, row in rules.iterrows():
-    top_features |= row["antecedents"]
-    top_features |= row["consequents"]
+with st.expander("パラメータ探索"):
+    c1, c2 = st.columns(2)
+    with c1:
+        sweep_supports = st.multiselect(
+            "min_support", [0.1, 0.15, 0.2, 0.25, 0.3, 0.4], default=DEFAULT_GRID["supports"]
+        )
+        sweep_metrics = st.multiselect(
+            "metric", ["lift", "confidence", "leverage", "conviction"], default=DEFAULT_GRID["metrics"]
+        )
+    with c2:
+        sweep_thresholds = st.multiselect(
+            "min_threshold", [0.0, 0.5, 0.8, 1.0, 1.1, 1.2, 1.5, 2.0], default=DEFAULT_GRID["thresholds"]
+        )
+
+    n_settings = len(sweep_supports) * len(sweep_thresholds) * len(sweep_metrics)
+    if st.button(f"{n_settings} 通りを評価する", disabled=n_settings == 0):
+        sweep_bar = st.progress(0.0)
+
+        def on_result(result, done, total):
+            sweep_bar.progress(done / total, text=f"{done} / {total}")
+
+        results = sweep(
+            selected, catalog_df, catalog_version(),
+            sweep_supports, sweep_thresholds, sweep_metrics, on_result=on_result
+        )
+        sweep_bar.empty()
+        st.session_state["sweep_results"] = results
+
+    if st.session_state.get("sweep_results"):
+        results = st.session_state["sweep_results"]
+        st.dataframe(results_frame(results))
+
+        choice = st.selectbox(
+            "採用する設定", range(len(results)),
+            format_func=lambda i: (
+                f"support={results[i]['min_support']} / "
+                f"{results[i]['metric']} >= {results[i]['min_threshold']}（{results[i]['n_rules']} ルール）"
+            )
+        )
+        if st.button("この設定で分析する"):
+            # 探索の結果は共有キャッシュに入っているので再計算はしない
+            r = results[choice]
+            st.session_state["analysis_params"] = {
+                "min_support": r["min_support"], "metric": r["metric"], "min_threshold": r["min_threshold"]
+            }
+            st.rerun()
 
-top_features = list(top_features)
+# ---------------------------------------------------
+# 好みの特徴抽出
+# ---------------------------------------------------
 
 st.subheader("好みの特徴（抽出）")
 st.write(top_features)
 
+# ---------------------------------------------------
+# 選好モデル（勝ち／負けペアから学習）
+# ---------------------------------------------------
+
+if comparisons:
+    pref_model = PreferenceModel(catalog_df.to_dict(orient="index")).fit(comparisons)
+
+    st.subheader("選好モデル（特徴の重み）")
+    st.dataframe(pd.DataFrame(
+        pref_model.ranked_features(),
+        columns=["attribute", "value", "weight"]
+    ))
+
+    prompt_source = st.radio("プロンプトの元データ", ["連関分析", "選好モデル"], horizontal=True)
+    if prompt_source == "選好モデル":
+        top_features = pref_model.top_features()
+else:
+    prompt_source = "連関分析"
+
+# ---------------------------------------------------
+# おすすめキャラ（カタログ全体を好みの得点で順位付け）
+# ---------------------------------------------------
+# 得点ベクトルはプロンプトと同じ元データ（ルール／選好モデル）から作る。
+# この回で既に候補として表示した画像は除く。ページ送りはフラグメントだけ再実行
+RECOMMEND_PAGE_SIZE = 12
+RECOMMEND_COLUMNS = 6
+
+index = get_index()
+if prompt_source == "選好モデル":
+    recommend_vector = index.vector_from_preference(pref_model)
+else:
+    recommend_vector = index.vector_from_rules(rules, analysis_params["metric"])
+seen = {img for e in run["events"] for img in e["shown"]}
+
+
+@st.fragment
+def recommendations(vector, seen):
+    st.subheader("おすすめキャラ")
+    if not vector.any():
+        st.write("得点に使える特徴がありません")
+        return
+
+    page = st.number_input("おすすめのページ", min_value=1, value=1, step=1)
+    results = index.recommend(vector, RECOMMEND_PAGE_SIZE, page - 1, exclude=seen)
+    if not results:
+        st.write("これ以上の候補はありません")
+        return
+
+    items = [(img, os.path.join(IMAGE_DIR, img), f"{score:.2f}") for img, score in results]
+    st.markdown(contact_sheet_html(items, columns=RECOMMEND_COLUMNS), unsafe_allow_html=True)
+
+
+recommendations(recommend_vector, seen)
+
 # ---------------------------------------------------
 # プロンプト生成
 # ---------------------------------------------------
-BASE_PROMPT = "masterpiece, best quality, amazing quality, 4k, very aesthetic, high resolution, ultra-detailed, absurdres, newest, anime, anime coloring, 1girl, solo, wearing clothes,eyes that feel natural, pupil, cute eyes"
-NEGATIVE_PROMPT = "photorealistic, realistic, 3d, Two-toned hair, multiple views, multiple angle, split view, grid view, two shot, outside border, picture frame, framed, border, letterboxed, pillarboxed, 2koma, old, oldest, cartoon, graphic, text, painting, crayon, graphite, abstract, glitch, deformed, mutated, ugly, disfigured, long body, lowres, bad anatomy, bad hands, missing fingers, extra fingers, extra digits, fewer digits, cropped, very displeasing, (worst quality, bad quality:1.2), sketch, jpeg artifacts, signature, watermark, username, (censored, bar_censor, mosaic_censor:1.2), conjoined, bad ai-generated, Steps: 20, Sampler: Euler a, CFG scale: 4.5, Global Seed: 428649103, Seed: 3282307999, Size: 768x1344,Clip skip: 2, Model hash: 6a2e0c8dd7, Model: NovaAnimeILV15, Hires steps: 40, Hires upscale: 1.5, DPM++ 2M, Schedule type: Karras, CFG scale: 7, Seed: 2147104563, Size: 512x640, Model hash: 6a2e0c8dd7, Model: novaAnimeXL_ilV150, Denoising strength: 0.7, Hires Module 1: Use same choices, Hires CFG Scale: 7, Hires upscale: 2, Hires upscaler: Latent, Version: f2.0.1v1.10.1-1.10.1, nsfw, sheer clothing"
-prompt = BASE_PROMPT + ", " + ", ".join(top_features)
+prompt = build_prompt(top_features)
 
-payload = {
-    "prompt": prompt,
-    "negative_prompt": NEGATIVE_PROMPT,
-    "steps": 20,
-    "sampler_name": "DPM++ 2M Karras",
-    "override_settings": {"sd_model_checkpoint": "AnythingXL_inkBase.safetensors"},
-    "width": 832,
-    "height": 1216
-}
+payload = build_payload(prompt)
 
 st.subheader("生成プロンプト")
 st.code(prompt)
@@ -146,38 +208,47 @@ st.session_state["prompt"] = prompt
 # 画像生成
 # ---------------------------------------------------
 
-API_URL = "http://127.0.0.1:7860/sdapi/v1/txt2img"
-
 st.subheader("画像生成")
 
-if st.button("このプロンプトで画像生成する"):
-    with st.spinner("生成中..."):
+col_generate, col_interrupt = st.columns([3, 1])
+
+with col_interrupt:
+    interrupt_button()
 
-        response = requests.post(API_URL, json=payload)
+with col_generate:
+    generate_clicked = st.button("このプロンプトで画像生成する")
 
-        if response.status_code != 200:
-            st.error(f"エラー: {response.text}")
-            st.stop()
+if generate_clicked:
+    # 生成中はステップ数・残り時間・途中経過の画像を表示する
+    try:
+        images, info = generate_with_progress(payload)
+    except GenerationError as e:
+        st.error(f"エラー: {e}")
+        st.stop()
 
-        r = response.json()
-        image_base64 = r["images"][0]
-        image_bytes = base64.b64decode(image_base64)
+    image_bytes = images[0]
 
-        st.image(image_bytes, caption="生成画像", use_column_width=True)
-        st.session_state["generated_image"] = image_bytes
+    st.image(image_bytes, caption="生成画像", use_column_width=True)
+    st.session_state["generated_image"] = image_bytes
 
-# 保存ボタン
-import time
+    # 保存時に PNG とインデックスへ書き込む生成条件
+    st.session_state["generated_meta"] = {
+        "prompt": prompt,
+        "negative_prompt": NEGATIVE_PROMPT,
+        "seed": info.get("seed"),
+        "sampler": payload["sampler_name"],
+        "steps": payload["steps"],
+        "model": payload["override_settings"]["sd_model_checkpoint"],
+        "selection": selected,
+        "features": top_features,
+    }
 
+# 保存ボタン（outputs/ に生成条件つきで保存し、ギャラリーに載せる）
 if "generated_image" in st.session_state:
     if st.button("画像を保存する"):
-        save_path = r"C:\AI\stable-diffusion-webui-forge-main\outputs\AI-images"
-        os.makedirs(save_path, exist_ok=True)
-
-        filename = f"generated_{int(time.time())}.png"
-        file_path = os.path.join(save_path, filename)
-
-        with open(file_path, "wb") as f:
-            f.write(st.session_state["generated_image"])
+        file_path = save_generated(
+            st.session_state["generated_image"],
+            st.session_state.get("generated_meta", {"prompt": prompt})
+        )
 
         st.success(f"保存しました: {file_path}")
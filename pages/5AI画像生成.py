@@ -1,6 +1,6 @@
 import streamlit as st
-import requests
-import base64
+
+from sd_client import GenerationError, generate_with_progress, interrupt_button
 
 st.title("AI画像生成（Stable Diffusion Forge ローカルAPI）")
 
@@ -13,28 +13,29 @@ if not prompt:
 st.subheader("生成プロンプト")
 st.code(prompt)
 
-API_URL = "http://127.0.0.1:7860/sdapi/v1/txt2img"
+col_generate, col_interrupt = st.columns([3, 1])
 
-if st.button("画像生成する"):
-    with st.spinner("生成中..."):
-        payload = {
-            "prompt": prompt,
-            "steps": 20,
-            "width": 512,
-            "height": 512
-        }
+with col_interrupt:
+    interrupt_button()
 
-        response = requests.post(API_URL, json=payload)
+with col_generate:
+    generate_clicked = st.button("画像生成する")
 
-        if response.status_code != 200:
-            st.error(f"エラー: {response.text}")
-            st.stop()
+if generate_clicked:
+    payload = {
+        "prompt": prompt,
+        "steps": 20,
+        "width": 512,
+        "height": 512
+    }
 
-        # Base64 画像を取得
-        r = response.json()
-        image_base64 = r["images"][0]
+    # 生成中はステップ数・残り時間・途中経過の画像を表示する
+    try:
+        images, _ = generate_with_progress(payload)
+    except GenerationError as e:
+        st.error(f"エラー: {e}")
+        st.stop()
 
-        # Base64 → バイナリ変換
-        image_bytes = base64.b64decode(image_base64)
+    image_bytes = images[0]
 
-        st.image(image_bytes, caption="生成画像", use_column_width=True)
\ No newline at end of file
+    st.image(image_bytes, caption="生成画像", use_column_width=True)
\ No newline at end of file
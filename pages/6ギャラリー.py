@@ -0,0 +1,91 @@
+import streamlit as st
+
+from contact_sheet import contact_sheet_html
+from gallery import (
+    load_index, index_version, all_features, filter_entries,
+    image_path, thumbnail_path
+)
+
+st.set_page_config(layout="wide")
+
+st.title("ギャラリー（生成画像の一覧）")
+
+# ---------------------------------------------------
+# インデックス読み込み（PNG は開かない）
+# ---------------------------------------------------
+
+@st.cache_data
+def cached_index(version):
+    return load_index()
+
+entries = cached_index(index_version())
+
+if not entries:
+    st.write("まだ保存された画像がありません")
+    st.stop()
+
+# ---------------------------------------------------
+# 詳細表示（一覧のタイルをクリックすると ?img=xxx で開く）
+# ---------------------------------------------------
+
+selected_id = st.query_params.get("img")
+entry_by_id = {e["id"]: e for e in entries}
+
+if selected_id in entry_by_id:
+    entry = entry_by_id[selected_id]
+
+    if st.button("◀ 一覧に戻る"):
+        del st.query_params["img"]
+        st.rerun()
+
+    col_img, col_meta = st.columns([1, 1])
+    with col_img:
+        st.image(image_path(entry), caption=entry["file"])
+    with col_meta:
+        st.subheader("生成条件")
+        st.code(entry.get("prompt") or "")
+        if entry.get("negative_prompt"):
+            st.caption("ネガティブプロンプト")
+            st.code(entry["negative_prompt"])
+        st.write({
+            "seed": entry.get("seed"),
+            "sampler": entry.get("sampler"),
+            "steps": entry.get("steps"),
+            "model": entry.get("model"),
+            "size": f"{entry.get('width')}x{entry.get('height')}",
+        })
+        st.caption("特徴")
+        st.write(entry.get("features") or [])
+        st.caption("元にした選択")
+        st.write(entry.get("selection") or [])
+    st.stop()
+
+# ---------------------------------------------------
+# 絞り込み
+# ---------------------------------------------------
+
+st.sidebar.header("絞り込み")
+sel_features = st.sidebar.multiselect("特徴（すべて含む）", all_features(entries))
+term = st.sidebar.text_input("プロンプトに含む語")
+
+results = filter_entries(entries, sel_features, term)
+
+st.write(f"{len(results)} / {len(entries)} 件")
+
+# ---------------------------------------------------
+# 一覧（表示するページの分だけサムネイルを作る）
+# ---------------------------------------------------
+PAGE_SIZE = 60
+SHEET_COLUMNS = 6
+
+n_pages = max(1, (len(results) + PAGE_SIZE - 1) // PAGE_SIZE)
+page = st.number_input("ページ", min_value=1, max_value=n_pages, value=1, step=1) if n_pages > 1 else 1
+
+page_results = results[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+
+if page_results:
+    items = [(e["id"], thumbnail_path(e), e["id"]) for e in page_results]
+    st.markdown(
+        contact_sheet_html(items, columns=SHEET_COLUMNS, link=lambda key: f"?img={key}"),
+        unsafe_allow_html=True
+    )
@@ -0,0 +1,67 @@
+import streamlit as st
+
+from lazy_imports import lazy_import
+from catalog import load_features
+from rating import get_store
+
+pd = lazy_import("pandas")
+alt = lazy_import("altair")
+
+st.title("キャラランキング（全セッションの比較から）")
+
+store = get_store()
+
+if len(store) == 0:
+    st.write("まだ比較データがありません")
+    st.stop()
+
+features = load_features()
+
+st.write(f"累計比較数：{store.n_comparisons}　評価済みキャラ：{len(store)}")
+
+# ---------------------------------------------------
+# リーダーボード
+# ---------------------------------------------------
+st.subheader("リーダーボード")
+
+top_n = st.slider("表示件数", 5, 100, 20)
+board = pd.DataFrame(store.leaderboard(top_n))
+board.insert(2, "name", [features.get(img, {}).get("name", "") for img in board["image"]])
+board["rating"] = board["rating"].round(1)
+st.dataframe(board, hide_index=True)
+
+# ---------------------------------------------------
+# キャラごとの順位
+# ---------------------------------------------------
+rated_images = sorted(store.ratings)
+target = st.selectbox(
+    "順位を調べる",
+    rated_images,
+    format_func=lambda img: f"{features.get(img, {}).get('name', '')}_{img}"
+)
+if target:
+    st.write(f"{store.rank(target)} 位（レーティング {store.rating(target):.1f}、{store.games[target]} 試合）")
+
+# ---------------------------------------------------
+# 特徴ごとの平均レーティング
+# ---------------------------------------------------
+st.subheader("特徴ごとの平均レーティング")
+
+attr_df = pd.DataFrame(store.attribute_ratings(features))
+if attr_df.empty:
+    # 評価済みのキャラにまだ特徴が入力されていない
+    st.info("特徴が入力された評価済みキャラがまだありません")
+    st.stop()
+
+attributes = sorted(attr_df["attribute"].unique())
+attribute = st.selectbox("特徴", attributes)
+
+chart_df = attr_df[attr_df["attribute"] == attribute].copy()
+chart_df["mean_rating"] = chart_df["mean_rating"].round(1)
+
+chart = alt.Chart(chart_df).mark_bar().encode(
+    x=alt.X("value:N", sort="-y", title=attribute),
+    y=alt.Y("mean_rating:Q", title="平均レーティング", scale=alt.Scale(zero=False)),
+    tooltip=["value", "mean_rating", "characters"]
+)
+st.altair_chart(chart, use_container_width=True)
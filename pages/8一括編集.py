@@ -0,0 +1,205 @@
+import streamlit as st
+
+from lazy_imports import lazy_import
+from catalog import FEATURE_FILE, FEATURE_COLUMNS, catalog_version, load_features, apply_feature_edits
+from taxonomy import PARENT_COLUMNS, children, options, validate
+
+pd = lazy_import("pandas")
+
+st.set_page_config(layout="wide")
+
+st.title("一括編集（表で複数キャラをまとめて編集）")
+
+# ============================
+# 表で編集して、保存は最後に1回だけ
+# ============================
+# ・髪色・髪型などは選択肢から選ぶ（子の列は全ての値が出るので、親と合わない値は下で指摘）
+# ・編集中の差分は session_state に貯め、保存ボタンで全キャラ分を1回の書き込みで反映する
+# ・絞り込み・ページを変えても保存前の差分は残る
+PAGE_SIZE = 200
+TEXT_COLUMNS = ["name", "work", "other"]
+
+COLUMN_LABELS = {
+    "name": "名前", "work": "作品名",
+    "hair_color_main": "髪色（大）", "hair_color_sub": "髪色（中）", "hair_length": "髪の長さ",
+    "hairstyle_main": "髪型（大）", "hairstyle_type": "髪型（中）", "hairstyle_detail": "髪型（細）",
+    "eye_color": "目の色", "eye_shape": "目の形", "expression": "表情", "vibe": "雰囲気", "other": "その他",
+}
+
+
+@st.cache_data(show_spinner=False)
+def load_saved(version):
+    # JSON が書き換わった時だけ読み直す
+    return load_features(FEATURE_FILE)
+
+
+features = load_saved(catalog_version(FEATURE_FILE))
+
+if "bulk_pending" not in st.session_state:
+    st.session_state["bulk_pending"] = {}   # 画像 → {列: 新しい値}（保存済みの値と違うものだけ）
+    st.session_state["bulk_version"] = 0
+
+pending = st.session_state["bulk_pending"]
+
+
+def current_record(img):
+    return {**features.get(img, {}), **pending.get(img, {})}
+
+
+def set_pending(img, changes):
+    # 保存済みと同じ値に戻したものは差分から外す
+    saved = features.get(img, {})
+    diff = {col: value for col, value in changes.items() if value != saved.get(col, "")}
+    rest = {col: value for col, value in pending.get(img, {}).items() if col not in changes}
+    diff = {**rest, **diff}
+    if diff:
+        pending[img] = diff
+    else:
+        pending.pop(img, None)
+
+
+def reset_editor():
+    # 表の元データが変わった（差分を外から書き換えた・保存した）ので作り直す
+    st.session_state["bulk_version"] += 1
+
+
+# ============================
+# 絞り込み
+# ============================
+col_query, col_missing, col_page = st.columns([2, 1, 1])
+
+query = col_query.text_input("名前・作品名・画像名で絞り込み")
+only_missing = col_missing.checkbox("未入力の項目があるキャラだけ")
+
+images = sorted(features)
+if query:
+    q = query.lower()
+    images = [
+        img for img in images
+        if q in img.lower() or q in features[img].get("name", "").lower() or q in features[img].get("work", "").lower()
+    ]
+if only_missing:
+    # 保存済みの値で判定する（入力した行が編集中に表から消えないように）
+    images = [
+        img for img in images
+        if any(not features[img].get(col) for col in FEATURE_COLUMNS if col != "other")
+    ]
+
+n_pages = max(1, (len(images) + PAGE_SIZE - 1) // PAGE_SIZE)
+page = col_page.number_input("ページ", min_value=1, max_value=n_pages, value=1, step=1)
+view = images[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+
+# 表示するキャラが変わったら表を作り直す（差分は pending に残っている）
+if st.session_state.get("bulk_view") != view:
+    st.session_state["bulk_view"] = view
+    reset_editor()
+
+st.caption(f"{len(images)} 件中 {len(view)} 件を表示")
+
+# ============================
+# 表（data_editor）
+# ============================
+column_config = {
+    col: st.column_config.TextColumn(COLUMN_LABELS[col]) if col in TEXT_COLUMNS
+    else st.column_config.SelectboxColumn(COLUMN_LABELS[col], options=options(col))
+    for col in FEATURE_COLUMNS
+}
+
+base = pd.DataFrame(
+    [[current_record(img).get(col, "") for col in FEATURE_COLUMNS] for img in view],
+    index=pd.Index(view, name="image"), columns=FEATURE_COLUMNS,
+)
+
+edited = st.data_editor(
+    base,
+    column_config=column_config,
+    num_rows="fixed",
+    use_container_width=True,
+    height=min(38 + 35 * max(len(view), 1), 700),
+    key=f"bulk_editor_{st.session_state['bulk_version']}",
+)
+
+# 表の中身を差分に反映（選択を外したセルは None になるので "" に戻す）
+for img, row in zip(view, edited.fillna("").to_dict(orient="records")):
+    set_pending(img, {col: str(row[col]) for col in FEATURE_COLUMNS})
+
+# ============================
+# 複数行にまとめて入力（フィルダウン）
+# ============================
+with st.expander("複数行にまとめて入力（上の行の値を下へコピー）"):
+    if view:
+        c1, c2, c3 = st.columns(3)
+        fill_column = c1.selectbox("列", FEATURE_COLUMNS, format_func=COLUMN_LABELS.get)
+        start = c2.number_input("開始行", min_value=1, max_value=len(view), value=1, step=1)
+        end = c3.number_input("終了行", min_value=1, max_value=len(view), value=len(view), step=1)
+        targets = view[start - 1:max(start, end)]
+
+        default = current_record(view[start - 1]).get(fill_column, "")
+        if fill_column in TEXT_COLUMNS:
+            value = st.text_input("値", default, key=f"fill_value_{fill_column}_{start}")
+        else:
+            # 子の列は、対象の行の親がそろっていればその下の値だけを出す
+            choices = options(fill_column)
+            parent_column = PARENT_COLUMNS.get(fill_column)
+            if parent_column:
+                parents_ = {current_record(img).get(parent_column, "") for img in targets}
+                if len(parents_) == 1 and "" not in parents_:
+                    choices = [""] + children(fill_column, parents_.pop())
+            value = st.selectbox(
+                "値", choices, index=choices.index(default) if default in choices else 0,
+                key=f"fill_value_{fill_column}_{start}",
+            )
+
+        if st.button(f"{len(targets)} 行の「{COLUMN_LABELS[fill_column]}」を {value!r} にする"):
+            for img in targets:
+                changes = {fill_column: value}
+                # 親を変えたら、その下にない子の値は空に戻す
+                record = {**current_record(img), fill_column: value}
+                for child, parent in PARENT_COLUMNS.items():
+                    if parent == fill_column and record.get(child) and record[child] not in options(child, record):
+                        changes[child] = ""
+                set_pending(img, changes)
+            reset_editor()
+            st.rerun()
+
+# ============================
+# 検証と保存（1回の書き込み）
+# ============================
+problems = [
+    {"image": img, "列": COLUMN_LABELS[col], "内容": message}
+    for img in sorted(pending)
+    for col, message in validate(current_record(img))
+]
+
+n_cells = sum(len(changes) for changes in pending.values())
+st.subheader(f"未保存の変更：{len(pending)} キャラ・{n_cells} 項目")
+
+if problems:
+    st.error(f"分類体系に合わない値が {len(problems)} 件あります（直すまで保存できません）")
+    st.dataframe(pd.DataFrame(problems), hide_index=True)
+
+if pending:
+    with st.expander("変更の一覧"):
+        st.dataframe(pd.DataFrame([
+            {"image": img, "列": COLUMN_LABELS[col], "前": features.get(img, {}).get(col, ""), "後": value}
+            for img, changes in sorted(pending.items()) for col, value in changes.items()
+        ]), hide_index=True)
+
+col_save, col_discard = st.columns(2)
+
+if col_save.button("まとめて保存する", type="primary", disabled=not pending or bool(problems)):
+    n_records = len(pending)
+    apply_feature_edits(pending, FEATURE_FILE)
+    pending.clear()
+    reset_editor()
+    st.session_state["bulk_saved"] = (n_records, n_cells)
+    st.rerun()
+
+if col_discard.button("変更を破棄する", disabled=not pending):
+    pending.clear()
+    reset_editor()
+    st.rerun()
+
+if "bulk_saved" in st.session_state:
+    n_records, n_saved = st.session_state.pop("bulk_saved")
+    st.success(f"{n_records} キャラ・{n_saved} 項目を1回の書き込みで保存しました")
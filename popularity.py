@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import atexit
+import threading
+
+import numpy as np
+
+from catalog import BASE_DIR, ATTRIBUTE_COLUMNS
+
+# ============================
+# 特徴ごとの人気カウンタ（選択イベントから逐次集計）
+# ============================
+# (属性, 値) ごとに「表示された回数」と「選ばれた回数」を数える。
+# 直近1時間・直近1日はリングバッファ（古いバケツは上書き）、全期間は累計。
+# 割合ページはこのカウンタだけを読み、セッションのファイルは読み直さない。
+
+POPULARITY_FILE = os.path.join(BASE_DIR, "popularity.npz")
+
+# 窓の名前 → (バケツ数, 1バケツの秒数)
+WINDOWS = {
+    "hour": (60, 60),
+    "day": (24, 3600),
+}
+WINDOW_LABELS = {"hour": "直近1時間", "day": "直近1日", "all": "全期間"}
+
+FLUSH_EVERY = 20
+
+
+class RingCounter:
+
+    def __init__(self, n_buckets, bucket_seconds, n_items):
+        self.n_buckets = n_buckets
+        self.bucket_seconds = bucket_seconds
+        self.counts = np.zeros((n_buckets, n_items), dtype=np.int64)
+        self.epochs = np.full(n_buckets, -1, dtype=np.int64)
+
+    def grow(self, n_items):
+        extra = n_items - self.counts.shape[1]
+        if extra > 0:
+            self.counts = np.pad(self.counts, ((0, 0), (0, extra)))
+
+    def add(self, ts, idx):
+        epoch = int(ts // self.bucket_seconds)
+        b = epoch % self.n_buckets
+        if self.epochs[b] > epoch:
+            return  # 窓より古いイベント（新しいバケツを消さない）
+        if self.epochs[b] != epoch:
+            # 一周して戻ってきたバケツは空にしてから使う
+            self.counts[b] = 0
+            self.epochs[b] = epoch
+        np.add.at(self.counts[b], idx, 1)
+
+    def total(self, now):
+        epoch = int(now // self.bucket_seconds)
+        valid = (self.epochs > epoch - self.n_buckets) & (self.epochs <= epoch)
+        return self.counts[valid].sum(axis=0)
+
+
+class PopularityCounters:
+
+    def __init__(self, path=POPULARITY_FILE, columns=ATTRIBUTE_COLUMNS, flush_every=FLUSH_EVERY):
+        self.path = path
+        self.columns = columns
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._dirty = 0
+        self._snapshot_seq = 0    # 取ったスナップショットの通し番号
+        self._written_seq = 0     # ファイルに書いた最新の番号
+
+        self.items = []
+        self.item_index = {}
+        self.shown = {name: RingCounter(n, sec, 0) for name, (n, sec) in WINDOWS.items()}
+        self.picked = {name: RingCounter(n, sec, 0) for name, (n, sec) in WINDOWS.items()}
+        self.shown_all = np.zeros(0, dtype=np.int64)
+        self.picked_all = np.zeros(0, dtype=np.int64)
+        self.n_events = 0
+
+        self._load()
+
+    # ----------------------------
+    # 項目（属性, 値）の番号
+    # ----------------------------
+    def _grow(self):
+        n = len(self.items)
+        for counter in list(self.shown.values()) + list(self.picked.values()):
+            counter.grow(n)
+        self.shown_all = np.pad(self.shown_all, (0, n - len(self.shown_all)))
+        self.picked_all = np.pad(self.picked_all, (0, n - len(self.picked_all)))
+
+    def _indices(self, data):
+        idx = []
+        for col in self.columns:
+            value = data.get(col, "")
+            if not value:
+                continue
+            key = (col, value)
+            if key not in self.item_index:
+                self.item_index[key] = len(self.items)
+                self.items.append(key)
+            idx.append(self.item_index[key])
+        return idx
+
+    # ----------------------------
+    # イベントの取り込み
+    # ----------------------------
+    def record(self, shown_images, picked_image, features, ts=None):
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            shown_idx = np.array(
+                [j for img in shown_images for j in self._indices(features.get(img, {}))],
+                dtype=np.int64
+            )
+            picked_idx = np.array(self._indices(features.get(picked_image, {})), dtype=np.int64)
+            if len(self.items) > len(self.shown_all):
+                self._grow()
+
+            for name in WINDOWS:
+                self.shown[name].add(ts, shown_idx)
+                self.picked[name].add(ts, picked_idx)
+            np.add.at(self.shown_all, shown_idx, 1)
+            np.add.at(self.picked_all, picked_idx, 1)
+
+            self.n_events += 1
+            self._dirty += 1
+            flush_due = self._dirty >= self.flush_every
+
+        # 保存は _lock を放してから（書き込み中も他のセッションの記録を止めない）
+        if flush_due:
+            self.flush()
+
+    # ----------------------------
+    # 集計結果
+    # ----------------------------
+    def stats(self, window="all", attribute=None, now=None):
+        # 戻り値: [{attribute, value, shown, picked, pick_rate}, ...]
+        now = time.time() if now is None else now
+        with self._lock:
+            if window == "all":
+                shown, picked = self.shown_all.copy(), self.picked_all.copy()
+            else:
+                shown, picked = self.shown[window].total(now), self.picked[window].total(now)
+            items = list(self.items)
+
+        rows = []
+        for j, (col, value) in enumerate(items):
+            if attribute is not None and col != attribute:
+                continue
+            if shown[j] == 0 and picked[j] == 0:
+                continue
+            rows.append({
+                "attribute": col,
+                "value": value,
+                "shown": int(shown[j]),
+                "picked": int(picked[j]),
+                "pick_rate": float(picked[j] / shown[j]) if shown[j] else 0.0,
+            })
+        return rows
+
+    # ----------------------------
+    # 保存・読み込み
+    # ----------------------------
+    def _snapshot_locked(self):
+        # カウンタは record がその場で足していくので、書き出す分はコピーしておく
+        arrays = {
+            "items": np.array(json.dumps(self.items, ensure_ascii=False)),
+            "n_events": np.array(self.n_events),
+            "shown_all": self.shown_all.copy(),
+            "picked_all": self.picked_all.copy(),
+        }
+        for name in WINDOWS:
+            for kind, counters in (("shown", self.shown), ("picked", self.picked)):
+                arrays[f"{kind}_{name}_counts"] = counters[name].counts.copy()
+                arrays[f"{kind}_{name}_epochs"] = counters[name].epochs.copy()
+        return arrays
+
+    def flush(self):
+        with self._lock:
+            if self.path is None or self._dirty == 0:
+                return
+            arrays = self._snapshot_locked()
+            self._dirty = 0
+            self._snapshot_seq += 1
+            seq = self._snapshot_seq
+
+        # ファイル書き込み中も記録は止めない
+        with self._flush_lock:
+            # 後から取ったスナップショットが先に書かれていたら、古いもので上書きしない
+            if seq <= self._written_seq:
+                return
+            tmp_path = f"{self.path}.{os.getpid()}.tmp.npz"
+            np.savez(tmp_path, **arrays)
+            os.replace(tmp_path, self.path)
+            self._written_seq = seq
+
+    def _load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return
+        with np.load(self.path) as data:
+            self.items = [tuple(item) for item in json.loads(str(data["items"]))]
+            self.item_index = {item: j for j, item in enumerate(self.items)}
+            self.n_events = int(data["n_events"])
+            self.shown_all = data["shown_all"].copy()
+            self.picked_all = data["picked_all"].copy()
+            for name in WINDOWS:
+                for kind, counters in (("shown", self.shown), ("picked", self.picked)):
+                    counters[name].counts = data[f"{kind}_{name}_counts"].copy()
+                    counters[name].epochs = data[f"{kind}_{name}_epochs"].copy()
+
+
+# ============================
+# プロセス内で1つだけ（全セッションで共有）
+# ============================
+_counters = None
+_counters_lock = threading.Lock()
+
+
+def get_counters():
+    global _counters
+    with _counters_lock:
+        if _counters is None:
+            _counters = PopularityCounters()
+            atexit.register(_counters.flush)
+        return _counters
@@ -0,0 +1,75 @@
+import numpy as np
+
+from catalog import encode_features
+
+# ============================
+# 一対比較の選好モデル（Bradley–Terry / ロジスティック）
+# ============================
+# P(勝ち画像 > 負け画像) = sigmoid(w・(x_win - x_lose))
+# w が (属性, 値) ごとの効用。勝ち画像だけでなく負け画像も学習に使う。
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+class PreferenceModel:
+
+    def __init__(self, features, lr=0.3, l2=0.01):
+        self.images, self.items, self.X = encode_features(features)
+        self.index = {img: i for i, img in enumerate(self.images)}
+        self.lr = lr
+        self.l2 = l2
+        self.w = np.zeros(len(self.items), dtype=np.float64)
+        self.n_updates = 0
+
+    # ----------------------------
+    # 1クリックごとのオンライン更新（SGD）
+    # ----------------------------
+    def update(self, winner, loser):
+        d = self.X[self.index[winner]] - self.X[self.index[loser]]
+        p = _sigmoid(self.w @ d)
+        self.w += self.lr * ((1.0 - p) * d - self.l2 * self.w)
+        self.n_updates += 1
+
+    # ----------------------------
+    # 全ペアでまとめて再学習（バッチ勾配法）
+    # ----------------------------
+    def fit(self, pairs, n_iter=300, lr=1.0):
+        pairs = [(w, l) for w, l in pairs if w in self.index and l in self.index]
+        self.w = np.zeros(len(self.items), dtype=np.float64)
+        self.n_updates = len(pairs)
+        if not pairs:
+            return self
+
+        win_idx = np.array([self.index[w] for w, _ in pairs])
+        lose_idx = np.array([self.index[l] for _, l in pairs])
+        D = (self.X[win_idx] - self.X[lose_idx]).astype(np.float64)
+
+        for _ in range(n_iter):
+            p = _sigmoid(D @ self.w)
+            grad = D.T @ (1.0 - p) / len(pairs) - self.l2 * self.w
+            self.w += lr * grad
+
+        return self
+
+    # ----------------------------
+    # 重みの大きい順に (属性, 値, 重み)
+    # ----------------------------
+    def ranked_features(self, top_k=None, min_weight=0.0):
+        order = np.argsort(-self.w)
+        ranked = [
+            (self.items[j][0], self.items[j][1], float(self.w[j]))
+            for j in order if self.w[j] > min_weight
+        ]
+        return ranked[:top_k] if top_k else ranked
+
+    # ----------------------------
+    # プロンプト用：属性ごとに最も好まれた値を1つ
+    # ----------------------------
+    def top_features(self, min_weight=0.0):
+        best = {}
+        for col, value, weight in self.ranked_features(min_weight=min_weight):
+            if col not in best:
+                best[col] = value
+        return list(best.values())
@@ -0,0 +1,27 @@
+# ============================
+# AI画像生成用プロンプト
+# ============================
+BASE_PROMPT = "masterpiece, best quality, amazing quality, 4k, very aesthetic, high resolution, ultra-detailed, absurdres, newest, anime, anime coloring, 1girl, solo, wearing clothes,eyes that feel natural, pupil, cute eyes"
+NEGATIVE_PROMPT = "photorealistic, realistic, 3d, Two-toned hair, multiple views, multiple angle, split view, grid view, two shot, outside border, picture frame, framed, border, letterboxed, pillarboxed, 2koma, old, oldest, cartoon, graphic, text, painting, crayon, graphite, abstract, glitch, deformed, mutated, ugly, disfigured, long body, lowres, bad anatomy, bad hands, missing fingers, extra fingers, extra digits, fewer digits, cropped, very displeasing, (worst quality, bad quality:1.2), sketch, jpeg artifacts, signature, watermark, username, (censored, bar_censor, mosaic_censor:1.2), conjoined, bad ai-generated, Steps: 20, Sampler: Euler a, CFG scale: 4.5, Global Seed: 428649103, Seed: 3282307999, Size: 768x1344,Clip skip: 2, Model hash: 6a2e0c8dd7, Model: NovaAnimeILV15, Hires steps: 40, Hires upscale: 1.5, DPM++ 2M, Schedule type: Karras, CFG scale: 7, Seed: 2147104563, Size: 512x640, Model hash: 6a2e0c8dd7, Model: novaAnimeXL_ilV150, Denoising strength: 0.7, Hires Module 1: Use same choices, Hires CFG Scale: 7, Hires upscale: 2, Hires upscaler: Latent, Version: f2.0.1v1.10.1-1.10.1, nsfw, sheer clothing"
+
+# txt2img に渡す既定の設定
+GENERATION_SETTINGS = {
+    "steps": 20,
+    "sampler_name": "DPM++ 2M Karras",
+    "override_settings": {"sd_model_checkpoint": "AnythingXL_inkBase.safetensors"},
+    "width": 832,
+    "height": 1216
+}
+
+
+def build_prompt(top_features):
+    return BASE_PROMPT + ", " + ", ".join(top_features)
+
+
+def build_payload(prompt, negative_prompt=NEGATIVE_PROMPT, **overrides):
+    return {
+        "prompt": prompt,
+        "negative_prompt": negative_prompt,
+        **GENERATION_SETTINGS,
+        **overrides,
+    }
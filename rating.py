@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import atexit
+import bisect
+import threading
+from collections import defaultdict
+
+from catalog import BASE_DIR, ATTRIBUTE_COLUMNS
+
+# ============================
+# 全セッション共通の Elo レーティング
+# ============================
+# ・1回の比較でレーティングの計算は O(1)。ただし順位用のソート済みリストの
+#   入れ替え（bisect.insort と del）は要素をずらすので O(n)
+# ・(−レーティング, 画像) のソート済みリストを持ち、順位は二分探索で O(log n)
+# ・ロックで複数セッションからの同時更新を直列化し、保存はまとめて行う
+#   （JSON の書き込みはロックの外。スナップショットに通し番号を付け、古いものでは上書きしない）
+# ・N 枚から1枚選ぶモードでは、勝者が残り全員に勝ったものとして更新する
+
+RATING_FILE = os.path.join(BASE_DIR, "ratings.json")
+
+INITIAL_RATING = 1500.0
+K_FACTOR = 32.0
+FLUSH_EVERY = 20          # この回数更新したら保存
+FLUSH_INTERVAL = 10.0     # または前回保存からこの秒数が経ったら保存
+
+
+def expected_score(rating_a, rating_b):
+    return 1.0 / (1.0 + 10.0 ** ((rating_b - rating_a) / 400.0))
+
+
+class RatingStore:
+
+    def __init__(self, path=RATING_FILE, k_factor=K_FACTOR,
+                 flush_every=FLUSH_EVERY, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.k_factor = k_factor
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self.ratings = {}
+        self.games = defaultdict(int)
+        self.n_comparisons = 0
+        self._order = []
+        self._dirty = 0
+        self._last_flush = time.time()
+        self._snapshot_seq = 0    # 取ったスナップショットの通し番号
+        self._written_seq = 0     # ファイルに書いた最新の番号
+
+        self._load()
+
+    # ----------------------------
+    # 読み込み・保存
+    # ----------------------------
+    def _load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for img, r in data.get("ratings", {}).items():
+            self.ratings[img] = float(r["rating"])
+            self.games[img] = int(r["games"])
+        self.n_comparisons = int(data.get("n_comparisons", 0))
+        self._order = sorted((-r, img) for img, r in self.ratings.items())
+
+    def flush(self):
+        with self._lock:
+            if self.path is None or self._dirty == 0:
+                return
+            data = {
+                "n_comparisons": self.n_comparisons,
+                "ratings": {
+                    img: {"rating": round(r, 3), "games": self.games[img]}
+                    for img, r in self.ratings.items()
+                },
+            }
+            self._dirty = 0
+            self._last_flush = time.time()
+            self._snapshot_seq += 1
+            seq = self._snapshot_seq
+
+        # ファイル書き込み中も更新は止めない
+        with self._flush_lock:
+            # 後から取ったスナップショットが先に書かれていたら、古いもので上書きしない
+            if seq <= self._written_seq:
+                return
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+            self._written_seq = seq
+
+    def _flush_due(self):
+        return self._dirty >= self.flush_every or time.time() - self._last_flush >= self.flush_interval
+
+    # ----------------------------
+    # 更新
+    # ----------------------------
+    def _set_rating(self, img, new_rating):
+        old = self.ratings.get(img)
+        if old is not None:
+            i = bisect.bisect_left(self._order, (-old, img))
+            del self._order[i]
+        self.ratings[img] = new_rating
+        bisect.insort(self._order, (-new_rating, img))
+
+    def rating(self, img):
+        return self.ratings.get(img, INITIAL_RATING)
+
+    def record(self, winner, losers):
+        # losers は1枚（2択）でも複数（N択）でもよい
+        if isinstance(losers, str):
+            losers = [losers]
+
+        with self._lock:
+            r_win = self.rating(winner)
+            r_losers = [self.rating(l) for l in losers]
+
+            # 更新前のレーティングで一斉に計算する
+            delta_win = 0.0
+            for loser, r_lose in zip(losers, r_losers):
+                e = expected_score(r_win, r_lose)
+                delta = self.k_factor * (1.0 - e)
+                delta_win += delta
+                self._set_rating(loser, r_lose - delta)
+                self.games[loser] += 1
+
+            self._set_rating(winner, r_win + delta_win)
+            self.games[winner] += len(losers)
+
+            self.n_comparisons += len(losers)
+            self._dirty += 1
+            flush_due = self._flush_due()
+
+        # 保存は _lock を放してから（書き込み中も他のセッションの更新を止めない）
+        if flush_due:
+            self.flush()
+
+    # ----------------------------
+    # 参照
+    # ----------------------------
+    def rank(self, img):
+        # 1 始まりの順位（未評価なら None）
+        with self._lock:
+            r = self.ratings.get(img)
+            if r is None:
+                return None
+            return bisect.bisect_left(self._order, (-r, img)) + 1
+
+    def leaderboard(self, n=20, offset=0):
+        with self._lock:
+            return [
+                {"rank": offset + i + 1, "image": img, "rating": -neg, "games": self.games[img]}
+                for i, (neg, img) in enumerate(self._order[offset:offset + n])
+            ]
+
+    def attribute_ratings(self, features, columns=ATTRIBUTE_COLUMNS, min_games=1):
+        # (属性, 値) ごとの平均レーティング
+        with self._lock:
+            rated = [(img, r) for img, r in self.ratings.items() if self.games[img] >= min_games]
+
+        total = defaultdict(float)
+        count = defaultdict(int)
+        for img, r in rated:
+            data = features.get(img, {})
+            for col in columns:
+                value = data.get(col, "")
+                if value:
+                    total[(col, value)] += r
+                    count[(col, value)] += 1
+
+        rows = [
+            {"attribute": col, "value": value, "mean_rating": total[(col, value)] / count[(col, value)],
+             "characters": count[(col, value)]}
+            for (col, value) in total
+        ]
+        rows.sort(key=lambda row: -row["mean_rating"])
+        return rows
+
+    def __len__(self):
+        return len(self.ratings)
+
+
+# ============================
+# プロセス内で1つだけ（全セッションで共有）
+# ============================
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RatingStore()
+            atexit.register(_store.flush)
+        return _store
@@ -0,0 +1,211 @@
+import sys
+import time
+import argparse
+import threading
+
+import numpy as np
+
+from catalog import ATTRIBUTE_COLUMNS, load_catalog_frame, catalog_version, encode_codes
+from taxonomy import split_feature
+
+MAX_TABLE = 65536   # 1グループの組み合わせ数の上限（得点表がキャッシュに収まる大きさ）
+
+# ============================
+# 好みのスコアでカタログ全体を順位付け（おすすめ）
+# ============================
+# 連関分析のルール・選好モデルの重みを (属性, 値) ごとの得点ベクトルにまとめ、
+# 全キャラの得点 = X @ w を1回の疎行列×ベクトルで出す。
+# X は One-hot（1行に属性の数だけ 1 が立つ）なので、行列そのものは持たず、
+# 隣り合う属性を数個ずつまとめた「組み合わせ番号」を行ごとに持つ。
+#   得点 = Σ_グループ 得点表[組み合わせ番号]
+# 得点表（グループ内の全組み合わせの重みの和、数万要素）は問い合わせごとに作り直す。
+# 属性ごとに引くより配列を読む回数が数分の1で済む。
+# 上位 k 件は argpartition で候補を絞ってから並べる（全件はソートしない）。
+#
+#   python recommend.py --source rules --k 20
+#   python recommend.py --source preference --session <id> --page 1
+
+
+class ScoringIndex:
+
+    def __init__(self, df, columns=ATTRIBUTE_COLUMNS, max_table=MAX_TABLE):
+        codes, values, lookup = encode_codes(df, columns)
+        sizes = [len(v) for v in values]
+
+        self.columns = list(columns)
+        self.items = [(col, v) for col, vals in zip(columns, values) for v in vals]
+        self.item_index = {item: j for j, item in enumerate(self.items)}
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        self.sizes = sizes
+
+        # 隣り合う属性を組み合わせの数が max_table 以下になるようにまとめ、
+        # グループごとに「組み合わせ番号」（混合基数）を1本の配列で持つ
+        self.groups = []
+        for j, size in enumerate(sizes):
+            if self.groups and np.prod([sizes[g] for g in self.groups[-1]]) * size <= max_table:
+                self.groups[-1].append(j)
+            else:
+                self.groups.append([j])
+
+        self.joint = []
+        for group in self.groups:
+            joint = np.zeros(len(df), dtype=np.int64)
+            for j in group:
+                joint = joint * sizes[j] + codes[:, j]
+            total = int(np.prod([sizes[j] for j in group]))
+            self.joint.append(joint.astype(np.uint16 if total <= 65536 else np.int32))
+
+        self.names = df.index
+        self.n_rows = len(df)
+
+    def __len__(self):
+        return self.n_rows
+
+    # ----------------------------
+    # 得点
+    # ----------------------------
+    def score(self, vector):
+        w = np.asarray(vector, dtype=np.float32)
+        scores = None
+        for group, joint in zip(self.groups, self.joint):
+            # グループ内の全組み合わせの得点表（小さい）を作ってから1回で引く
+            table = np.zeros(1, dtype=np.float32)
+            for j in group:
+                w_col = w[self.offsets[j]:self.offsets[j + 1]]
+                table = (table[:, None] + w_col[None, :]).ravel()
+            if scores is None:
+                scores = table[joint]
+            else:
+                scores += table[joint]
+        return scores
+
+    def rows_of(self, names):
+        rows = self.names.get_indexer(list(names))
+        return rows[rows >= 0]
+
+    # ----------------------------
+    # 上位 k 件（ページ送り・既に見た画像の除外つき）
+    # ----------------------------
+    def top_k(self, scores, k, page=0, exclude_rows=None):
+        # 戻り値: そのページの行番号（得点の高い順、同点は行番号順）
+        if exclude_rows is not None and len(exclude_rows):
+            scores = scores.copy()
+            scores[exclude_rows] = -np.inf
+
+        n_valid = self.n_rows - (len(np.unique(exclude_rows)) if exclude_rows is not None else 0)
+        m = min((page + 1) * k, n_valid)
+        if m <= page * k:
+            return np.zeros(0, dtype=np.int64)
+
+        # m 番目に大きい得点より上は全部、同点は行番号の小さい順に足りない分だけ
+        kth = np.partition(scores, self.n_rows - m)[self.n_rows - m]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[:m - len(above)]
+        candidates = np.concatenate([above, ties])
+
+        order = np.lexsort((candidates, -scores[candidates]))
+        return candidates[order][page * k:m]
+
+    def recommend(self, vector, k=20, page=0, exclude=()):
+        # 戻り値: [(画像, 得点), ...]
+        scores = self.score(vector)
+        rows = self.top_k(scores, k, page, self.rows_of(exclude))
+        return [(self.names[i], float(scores[i])) for i in rows]
+
+    # ----------------------------
+    # 得点ベクトルを作る
+    # ----------------------------
+    def vector_from_items(self, weighted_items):
+        # weighted_items: [(属性, 値, 重み), ...]
+        w = np.zeros(len(self.items), dtype=np.float32)
+        for col, value, weight in weighted_items:
+            j = self.item_index.get((col, value))
+            if j is not None:
+                w[j] += weight
+        return w
+
+    def vector_from_preference(self, model):
+        # 選好モデル（Bradley–Terry）の効用をそのまま使う（負の重みも反映）
+        return self.vector_from_items(
+            (col, value, weight) for (col, value), weight in zip(model.items, model.w)
+        )
+
+    def vector_from_rules(self, rules, metric="lift"):
+        # ルールに出てきた特徴に、そのルールの指標値を足し込む（最大 1 に正規化）
+        # conviction の ∞（確信度 1 のルール）は有限の最大値に揃える
+        values = rules[metric].to_numpy(dtype=np.float64) if len(rules) else np.zeros(0)
+        finite = values[np.isfinite(values)]
+        values = np.nan_to_num(values, nan=0.0, posinf=finite.max() if len(finite) else 1.0)
+
+        weighted = []
+        for (_, row), value in zip(rules.iterrows(), values):
+            for feature in row["antecedents"] | row["consequents"]:
+                item = self.parse_feature(feature)
+                if item is not None:
+                    weighted.append((*item, float(value)))
+        w = self.vector_from_items(weighted)
+        return w / w.max() if w.max() > 0 else w
+
+    def vector_from_features(self, features):
+        # 連関分析の上位特徴（"hair_length_long hair" の形）を 1 点ずつ
+        return self.vector_from_items(
+            (*item, 1.0) for item in map(self.parse_feature, features) if item is not None
+        )
+
+    def parse_feature(self, feature):
+        # One-hot の列名 "属性_値" → (属性, 値)
+        return split_feature(feature, self.columns)
+
+
+# ============================
+# プロセス内で1つだけ（カタログが変わったら作り直す）
+# ============================
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index, _index_version
+    with _index_lock:
+        version = catalog_version()
+        if _index is None or _index_version != version:
+            _index = ScoringIndex(load_catalog_frame(columns=ATTRIBUTE_COLUMNS, categorical=True))
+            _index_version = version
+        return _index
+
+
+if __name__ == "__main__":
+    from selection_log import SelectionLog, LOG_FILE
+    from preference import PreferenceModel
+    from association import cached_association
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", choices=["rules", "preference"], default="rules")
+    parser.add_argument("--log", default=LOG_FILE)
+    parser.add_argument("--session", default=None, help="省略時は最後に選択があったセッション")
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--page", type=int, default=0)
+    args = parser.parse_args()
+
+    run = SelectionLog(args.log).session_run(args.session)
+    if not run["selected"]:
+        sys.exit("選択データがありません")
+
+    catalog_df = load_catalog_frame(columns=ATTRIBUTE_COLUMNS)
+    index = get_index()
+    if args.source == "rules":
+        rules, _ = cached_association(run["selected"], catalog_df, catalog_version())
+        vector = index.vector_from_rules(rules)
+    else:
+        model = PreferenceModel(catalog_df.to_dict(orient="index")).fit(run["comparisons"])
+        vector = index.vector_from_preference(model)
+
+    seen = {img for e in run["events"] for img in e["shown"]}
+    t = time.perf_counter()
+    results = index.recommend(vector, args.k, args.page, exclude=seen)
+    elapsed = (time.perf_counter() - t) * 1000
+
+    for rank, (img, score) in enumerate(results, args.page * args.k + 1):
+        print(f"{rank:4d}  {img}  {score:.3f}")
+    print(f"\n{len(index)} characters scored in {elapsed:.1f} ms (session {run['session']}, {len(seen)} seen)")
@@ -0,0 +1,137 @@
+import os
+import json
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+
+# ============================
+# 計算結果のキャッシュ（メモリ LRU ＋ 任意でディスク）
+# ============================
+# モジュール変数として持てば Streamlit サーバー内の全セッションで共有される。
+# 同じキーを同時に計算しようとした場合は、最初の1回だけ計算して他は待つ。
+
+
+def canonical_key(*parts):
+    # JSON（キー順固定）にしてから SHA-256 を取る
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+
+    def __init__(self, maxsize=128, disk_dir=None):
+        self.maxsize = maxsize
+        self.disk_dir = disk_dir
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    # ----------------------------
+    # メモリ
+    # ----------------------------
+    def _memory_get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return True, self._memory[key]
+        return False, None
+
+    def _memory_put(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
+
+    # ----------------------------
+    # ディスク
+    # ----------------------------
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + ".pkl")
+
+    def _disk_get(self, key):
+        if self.disk_dir is None:
+            return False, None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return False, None
+        try:
+            with open(path, "rb") as f:
+                return True, pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return False, None
+
+    def _disk_put(self, key, value):
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    # ----------------------------
+    # 公開 API
+    # ----------------------------
+    def get(self, key):
+        found, value = self._memory_get(key)
+        if found:
+            self.hits += 1
+            return True, value
+        found, value = self._disk_get(key)
+        if found:
+            self.disk_hits += 1
+            self._memory_put(key, value)
+            return True, value
+        return False, None
+
+    def put(self, key, value):
+        self._memory_put(key, value)
+        self._disk_put(key, value)
+
+    def get_or_compute(self, key, compute):
+        found, value = self.get(key)
+        if found:
+            return value
+
+        # 同じキーの計算中なら終わるのを待つ
+        with self._lock:
+            event = self._inflight.get(key)
+            owner = event is None
+            if owner:
+                event = threading.Event()
+                self._inflight[key] = event
+
+        if not owner:
+            event.wait()
+            found, value = self.get(key)
+            if found:
+                return value
+            return self.get_or_compute(key, compute)
+
+        try:
+            self.misses += 1
+            value = compute()
+            self.put(key, value)
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            event.set()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self):
+        return {
+            "entries": len(self._memory),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import uuid
+import base64
+from concurrent.futures import ThreadPoolExecutor
+
+from lazy_imports import lazy_import
+
+requests = lazy_import("requests")
+
+# ============================
+# Stable Diffusion WebUI (Forge) ローカル API
+# ============================
+# 環境変数 SD_API_URL で接続先を変えられる（sd_stub.py で動作確認できる）
+API_BASE = os.environ.get("SD_API_URL", "http://127.0.0.1:7860")
+
+TXT2IMG_PATH = "/sdapi/v1/txt2img"
+PROGRESS_PATH = "/sdapi/v1/progress"
+INTERRUPT_PATH = "/sdapi/v1/interrupt"
+TASK_PROGRESS_PATH = "/internal/progress"
+
+POLL_INTERVAL = 0.5
+
+# txt2img の POST はこのスレッドで待ち、スクリプト側は進捗を取りに行く
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="sd-txt2img")
+
+
+class GenerationError(Exception):
+    pass
+
+
+def get_progress(api_base=API_BASE, with_image=True):
+    response = requests.get(
+        api_base + PROGRESS_PATH,
+        params={"skip_current_image": "false" if with_image else "true"},
+        timeout=5,
+    )
+    response.raise_for_status()
+    r = response.json()
+
+    state = r.get("state") or {}
+    preview = r.get("current_image")
+    return {
+        "progress": float(r.get("progress") or 0.0),
+        "eta": float(r.get("eta_relative") or 0.0),
+        "step": int(state.get("sampling_step") or 0),
+        "steps": int(state.get("sampling_steps") or 0),
+        "interrupted": bool(state.get("interrupted")),
+        "preview": base64.b64decode(preview) if preview else None,
+    }
+
+
+def new_task_id():
+    return f"task(sentei-{uuid.uuid4().hex})"
+
+
+def task_active(task_id, api_base=API_BASE):
+    # WebUI が今まさにこのタスクを実行しているか（確かめられなければ False）
+    try:
+        response = requests.post(
+            api_base + TASK_PROGRESS_PATH,
+            json={"id_task": task_id, "id_live_preview": -1, "live_preview": False},
+            timeout=5,
+        )
+        response.raise_for_status()
+        return bool(response.json().get("active"))
+    except (requests.RequestException, ValueError):
+        return False
+
+
+def interrupt(task_id, api_base=API_BASE):
+    # /sdapi/v1/interrupt は実行中のジョブを誰のものでも止めるので、
+    # 実行中なのが自分のタスクの時だけ送る（他のセッションの生成は止めない）
+    if not task_active(task_id, api_base):
+        return False
+    requests.post(api_base + INTERRUPT_PATH, timeout=5)
+    return True
+
+
+def txt2img(payload, on_progress=None, should_interrupt=None,
+            api_base=API_BASE, poll_interval=POLL_INTERVAL, task_id=None):
+    # 生成が終わるまで poll_interval ごとに進捗を取得して on_progress に渡す。
+    # should_interrupt() が True を返したら中断を送る（このタスクが実行中の時だけ）。
+    # 戻り値: (生成画像（PNG バイト列）のリスト, 生成情報 info の dict)
+    task_id = task_id or new_task_id()
+    payload = {**payload, "force_task_id": task_id}
+    future = _executor.submit(requests.post, api_base + TXT2IMG_PATH, json=payload)
+
+    interrupted = False
+    try:
+        while not future.done():
+            if should_interrupt is not None and not interrupted and should_interrupt():
+                interrupted = interrupt(task_id, api_base)
+
+            if on_progress is not None:
+                try:
+                    on_progress(get_progress(api_base))
+                except requests.RequestException:
+                    pass  # 進捗が取れなくても生成は続ける
+
+            time.sleep(poll_interval)
+    finally:
+        # 画面の再実行などで待つ側がいなくなったら、自分の生成だけ止めておく
+        if not future.done() and not interrupted:
+            try:
+                interrupt(task_id, api_base)
+            except requests.RequestException:
+                pass
+
+    try:
+        response = future.result()
+    except requests.RequestException as e:
+        raise GenerationError(str(e)) from e
+
+    if response.status_code != 200:
+        raise GenerationError(response.text)
+
+    r = response.json()
+    images = [base64.b64decode(image) for image in r.get("images", [])]
+    try:
+        info = json.loads(r.get("info") or "{}")
+    except ValueError:
+        info = {}
+    return images, info
+
+
+# ============================
+# ページ用：進捗バーと途中経過プレビューを出しながら生成
+# ============================
+def generate_with_progress(payload, api_base=API_BASE):
+    import streamlit as st
+
+    progress_bar = st.progress(0.0, text="生成待ち...")
+    preview = st.empty()
+
+    def on_progress(p):
+        if p["steps"]:
+            text = f"ステップ {p['step']} / {p['steps']}（残り約 {p['eta']:.1f} 秒）"
+        else:
+            text = "生成待ち..."
+        progress_bar.progress(min(max(p["progress"], 0.0), 1.0), text=text)
+        if p["preview"]:
+            preview.image(p["preview"], caption="途中経過", width=256)
+
+    # このセッションが送ったタスクを覚えておく（中断ボタンはこのタスクだけを止める）
+    task_id = new_task_id()
+    st.session_state["sd_task_id"] = task_id
+    try:
+        return txt2img(payload, on_progress=on_progress, api_base=api_base, task_id=task_id)
+    finally:
+        progress_bar.empty()
+        preview.empty()
+
+
+def interrupt_button(label="生成を中断", api_base=API_BASE):
+    import streamlit as st
+
+    # 生成中に押すと再実行で待ちループが止まり、txt2img 側でも中断が送られる
+    if st.button(label):
+        task_id = st.session_state.get("sd_task_id")
+        try:
+            if task_id and interrupt(task_id, api_base):
+                st.info("中断を送信しました")
+            else:
+                st.info("このセッションで実行中の生成はありません")
+        except requests.RequestException as e:
+            st.error(f"中断できませんでした: {e}")
@@ -0,0 +1,148 @@
+import io
+import json
+import time
+import base64
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from PIL import Image
+
+# ============================
+# Stable Diffusion WebUI API のスタブ（動作確認・負荷試験用）
+# ============================
+# txt2img / progress / interrupt と、タスクごとの状態（/internal/progress）だけを実装し、
+# 合成した進捗と画像を返す。実際の WebUI と同じく txt2img は1件ずつ順に処理する。
+#
+#   python sd_stub.py --port 7860 --step-time 0.1
+#   SD_API_URL=http://127.0.0.1:7860 streamlit run app.py
+
+
+def _png_base64(width, height, shade):
+    img = Image.new("RGB", (width, height), (shade, 128, 255 - shade))
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+class StubState:
+
+    def __init__(self, step_time):
+        self.step_time = step_time
+        self.lock = threading.Lock()
+        self.queue_lock = threading.Lock()
+        self.task_id = None
+        self.finished = set()
+        self.step = 0
+        self.steps = 0
+        self.running = False
+        self.interrupted = False
+        self.started_at = 0.0
+
+    def progress(self):
+        with self.lock:
+            if not self.running or self.steps == 0:
+                return {"progress": 0.0, "eta_relative": 0.0,
+                        "state": {"sampling_step": 0, "sampling_steps": 0, "interrupted": self.interrupted},
+                        "current_image": None}
+            done = self.step / self.steps
+            eta = (self.steps - self.step) * self.step_time
+            preview = _png_base64(64, 64, int(255 * done))
+            return {"progress": done, "eta_relative": eta,
+                    "state": {"sampling_step": self.step, "sampling_steps": self.steps,
+                              "interrupted": self.interrupted},
+                    "current_image": preview}
+
+    def task_progress(self, task_id):
+        with self.lock:
+            active = self.running and task_id == self.task_id
+            return {"active": active, "queued": False, "completed": task_id in self.finished,
+                    "progress": self.step / self.steps if active and self.steps else None}
+
+
+def make_handler(state):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, data, status=200):
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.startswith("/sdapi/v1/progress"):
+                self._send_json(state.progress())
+            else:
+                self._send_json({"detail": "Not Found"}, 404)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"{}")
+
+            if self.path == "/internal/progress":
+                self._send_json(state.task_progress(payload.get("id_task")))
+                return
+
+            if self.path == "/sdapi/v1/interrupt":
+                with state.lock:
+                    state.interrupted = True
+                self._send_json({})
+                return
+
+            if self.path != "/sdapi/v1/txt2img":
+                self._send_json({"detail": "Not Found"}, 404)
+                return
+
+            steps = int(payload.get("steps", 20))
+            with state.queue_lock:
+                with state.lock:
+                    state.task_id = payload.get("force_task_id")
+                    state.step, state.steps = 0, steps
+                    state.running, state.interrupted = True, False
+
+                for i in range(steps):
+                    time.sleep(state.step_time)
+                    with state.lock:
+                        state.step = i + 1
+                        if state.interrupted:
+                            break
+
+                with state.lock:
+                    state.running = False
+                    state.finished.add(state.task_id)
+                    steps_done = state.step
+                    shade = int(255 * steps_done / max(1, steps))
+
+            width = min(int(payload.get("width", 512)), 256)
+            height = min(int(payload.get("height", 512)), 256)
+            self._send_json({
+                "images": [_png_base64(width, height, shade)],
+                "parameters": payload,
+                "info": json.dumps({"seed": payload.get("seed", -1), "steps_done": steps_done}),
+            })
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=7860, step_time=0.1):
+    server = ThreadingHTTPServer((host, port), make_handler(StubState(step_time)))
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7860)
+    parser.add_argument("--step-time", type=float, default=0.1)
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.step_time)
+    print(f"SD stub listening on http://{args.host}:{args.port}")
+    server.serve_forever()
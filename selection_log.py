@@ -0,0 +1,259 @@
+import os
+import sys
+import json
+import time
+import atexit
+import argparse
+import threading
+
+import numpy as np
+
+from catalog import BASE_DIR
+from file_lock import file_lock
+
+# ============================
+# 選択イベントのログ（追記のみ・セッションごと）
+# ============================
+# キャラ選択ページの1クリックを1行の JSON として追記する。
+#   {"type": "pick", "session": ..., "round": 3, "shown": [...], "pick": "012.png",
+#    "t": 時刻, "dt": 候補を表示してから選ぶまでの秒数}
+# スタート（type=start）で新しい回が始まり、リセット（type=reset）でその回を破棄する。
+# ・書き込みは O_APPEND の1回の write なので、複数セッション・複数プロセスでも行が混ざらない
+# ・fsync は FSYNC_EVERY 件ごと／FSYNC_INTERVAL 秒ごと（と終了時）にまとめて行う
+# ・読み込みは前回の続きから追記分だけを解析し、セッションごとの状態を組み立て直す
+#
+#   python selection_log.py info
+#   python selection_log.py compact [--keep-days 30]   … 破棄された回・古いセッションを削除
+#   python selection_log.py export --session <id> --out selected.json
+
+LOG_FILE = os.environ.get("SENTEI_SELECTION_LOG", os.path.join(BASE_DIR, "selections.jsonl"))
+
+FSYNC_EVERY = 20
+FSYNC_INTERVAL = 5.0
+
+
+class SelectionLog:
+
+    def __init__(self, path=LOG_FILE, fsync_every=FSYNC_EVERY, fsync_interval=FSYNC_INTERVAL):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+
+        self._lock = threading.Lock()
+        self._fd = None
+        self._unsynced = 0
+        self._last_sync = time.time()
+
+        # 読み込み側（追記分だけを読むための位置と、セッションごとの回）
+        self._read_lock = threading.Lock()
+        self._read_ino = None
+        self._offset = 0
+        self._runs = {}          # session → 現在の回のイベント
+        self._last_seen = {}     # session → 最後のイベントの時刻
+        self._last_pick = None   # 最後に pick があったセッション
+        self.n_events = 0
+
+    # ----------------------------
+    # 書き込み
+    # ----------------------------
+    def _open(self):
+        # 圧縮でファイルが置き換わっていたら開き直す
+        if self._fd is not None:
+            try:
+                same = os.stat(self.path).st_ino == os.fstat(self._fd).st_ino
+            except FileNotFoundError:
+                same = False
+            if same:
+                return self._fd
+            os.close(self._fd)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def append(self, event):
+        line = json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n"
+        # 圧縮中（排他ロック）は待つ
+        with self._lock, file_lock(self.path, shared=True):
+            os.write(self._open(), line.encode("utf-8"))
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.time() - self._last_sync >= self.fsync_interval:
+                self._sync_locked()
+
+    def _sync_locked(self):
+        if self._fd is not None and self._unsynced:
+            os.fsync(self._fd)
+        self._unsynced = 0
+        self._last_sync = time.time()
+
+    def sync(self):
+        with self._lock:
+            self._sync_locked()
+
+    def start(self, session):
+        self.append({"type": "start", "session": session, "t": time.time()})
+
+    def reset(self, session):
+        self.append({"type": "reset", "session": session, "t": time.time()})
+
+    def record(self, session, round_no, shown, pick, decision_time):
+        self.append({
+            "type": "pick", "session": session, "round": round_no,
+            "shown": list(shown), "pick": pick,
+            "t": time.time(), "dt": round(decision_time, 3),
+        })
+
+    # ----------------------------
+    # 読み込み（追記分だけ）
+    # ----------------------------
+    def _apply(self, event):
+        session = event["session"]
+        kind = event["type"]
+        if kind == "start":
+            self._runs[session] = []
+        elif kind == "reset":
+            self._runs.pop(session, None)
+            if self._last_pick == session:
+                self._last_pick = None
+        else:
+            self._runs.setdefault(session, []).append(event)
+            self._last_pick = session
+        self._last_seen[session] = event["t"]
+        self.n_events += 1
+
+    def refresh(self):
+        with self._read_lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                return
+            if st.st_ino != self._read_ino or st.st_size < self._offset:
+                # 圧縮で置き換わった：最初から読み直す
+                self._read_ino = st.st_ino
+                self._offset = 0
+                self._runs, self._last_seen, self._last_pick = {}, {}, None
+                self.n_events = 0
+            if st.st_size == self._offset:
+                return
+
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read(st.st_size - self._offset)
+            # 書きかけの最後の行は次回に回す
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].splitlines():
+                if line:
+                    self._apply(json.loads(line))
+            self._offset += end
+
+    def session_run(self, session=None):
+        # セッションの現在の回（session が None なら最後に選択があったセッション）
+        self.refresh()
+        with self._read_lock:
+            if session is None:
+                session = self._last_pick
+            events = list(self._runs.get(session, []))
+        return run_summary(session, events)
+
+    def sessions(self):
+        self.refresh()
+        with self._read_lock:
+            return [
+                {"session": s, "picks": len(self._runs.get(s, [])), "last_seen": t}
+                for s, t in sorted(self._last_seen.items(), key=lambda kv: -kv[1])
+            ]
+
+
+def run_summary(session, events):
+    # イベント列 → 選ばれた画像の列・(勝ち, 負け) の比較・判断時間
+    selected = [e["pick"] for e in events]
+    comparisons = [[e["pick"], loser] for e in events for loser in e["shown"] if loser != e["pick"]]
+    return {
+        "session": session,
+        "events": events,
+        "selected": selected,
+        "comparisons": comparisons,
+        "decision_times": np.array([e["dt"] for e in events], dtype=np.float64),
+    }
+
+
+# ============================
+# 圧縮
+# ============================
+def compact(path=LOG_FILE, keep_days=None, now=None):
+    # リセット・やり直しで捨てられた回と、keep_days より古いセッションを落として書き直す。
+    # 残った回は start＋pick の形でセッションごとにまとめる。戻り値: (前の行数, 後の行数)
+    now = now or time.time()
+    with file_lock(path):
+        if not os.path.exists(path):
+            return 0, 0
+
+        reader = SelectionLog(path)
+        reader.refresh()
+        n_before = reader.n_events
+
+        # 最後のイベントの時刻順（「最後に選択があったセッション」が変わらないように）
+        lines = []
+        for session, events in sorted(reader._runs.items(), key=lambda kv: reader._last_seen[kv[0]]):
+            if keep_days is not None and now - reader._last_seen[session] > keep_days * 86400:
+                continue
+            if not events:
+                continue
+            lines.append({"type": "start", "session": session, "t": events[0]["t"]})
+            lines.extend(events)
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for event in lines:
+                f.write(json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return n_before, len(lines)
+
+
+# ============================
+# プロセス内で1つだけ（全セッションで共有）
+# ============================
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_log():
+    global _log
+    with _log_lock:
+        if _log is None:
+            _log = SelectionLog()
+            atexit.register(_log.sync)
+        return _log
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["info", "compact", "export"])
+    parser.add_argument("--log", default=LOG_FILE)
+    parser.add_argument("--keep-days", type=float, default=None)
+    parser.add_argument("--session", default=None, help="省略時は最後に選択があったセッション")
+    parser.add_argument("--out", default="selected.json")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.log):
+        sys.exit(f"{args.log} がありません")
+
+    if args.command == "compact":
+        size = os.path.getsize(args.log)
+        before, after = compact(args.log, args.keep_days)
+        print(f"{before} -> {after} events ({size / 1e6:.2f} -> {os.path.getsize(args.log) / 1e6:.2f} MB)")
+
+    elif args.command == "export":
+        run = SelectionLog(args.log).session_run(args.session)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(run["selected"], f, ensure_ascii=False, indent=4)
+        print(f"session {run['session']}: {len(run['selected'])} picks -> {args.out}")
+
+    else:
+        log = SelectionLog(args.log)
+        sessions = log.sessions()
+        times = np.concatenate([log.session_run(s["session"])["decision_times"] for s in sessions] or [[]])
+        print(f"{args.log}: {log.n_events} events, {len(sessions)} sessions, "
+              f"{os.path.getsize(args.log) / 1e6:.2f} MB")
+        if len(times):
+            print(f"decision time: median {np.median(times):.2f} s, p95 {np.percentile(times, 95):.2f} s")
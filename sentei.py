@@ -1,103 +1,151 @@
 import os
 import random
-import json
+import argparse
 import pandas as pd
 from mlxtend.frequent_patterns import apriori, association_rules
-from PIL import Image
+
+from catalog import FEATURE_FILE, IMAGE_DIR, load_catalog_frame
+from image_store import open_image
 
 # ============================
-# 1. 画像フォルダと特徴データ
+# キャラ選定（コマンドライン版）
 # ============================
-IMAGE_DIR = "sentei/characters/"
-FEATURE_FILE = "sentei/character_features.json"
-
-with open(FEATURE_FILE, "r", encoding="utf-8") as f:
-    features = json.load(f)
-
-images = list(features.keys())  # 特徴がある画像のみ対象
+#   python sentei.py                       … 2枚ずつ表示して10回選ぶ
+#   python sentei.py simulate --users 2000  … 模擬ユーザーで収束を測る（simulation.py）
 
 
 # ============================
-# 2. ランダムに2枚提示して選択
+# 1. ランダムに2枚提示して選択
 # ============================
 def show_image(path):
-    img = Image.open(path)
+    img = open_image(path)
     img.show()  # OS標準ビューアで開く
 
 
-def pick_two_images():
-    return random.sample(images, 2)
+def select_interactively(feature_file=FEATURE_FILE, image_dir=IMAGE_DIR, rounds=10):
+    # 列指向スナップショット（無ければ JSON から作成）を mmap で読む
+    features = load_catalog_frame(feature_file=feature_file)
 
+    images = list(features.index)  # 特徴がある画像のみ対象
 
-selected = []
+    selected = []
 
-print("=== キャラ選択を10回行います ===")
+    print(f"=== キャラ選択を{rounds}回行います ===")
 
-for i in range(10):
-    img1, img2 = pick_two_images()
+    for i in range(rounds):
+        img1, img2 = random.sample(images, 2)
 
-    print(f"\n【第 {i+1} 回】")
-    print(f"1: {img1}")
-    print(f"2: {img2}")
+        print(f"\n【第 {i+1} 回】")
+        print(f"1: {img1}")
+        print(f"2: {img2}")
 
-    # 画像表示
-    show_image(os.path.join(IMAGE_DIR, img1))
-    show_image(os.path.join(IMAGE_DIR, img2))
+        # 画像表示
+        show_image(os.path.join(image_dir, img1))
+        show_image(os.path.join(image_dir, img2))
 
-    choice = input("どちらを選ぶ？ (1/2): ")
+        choice = input("どちらを選ぶ？ (1/2): ")
 
-    if choice == "1":
-        selected.append(img1)
-    else:
-        selected.append(img2)
+        if choice == "1":
+            selected.append(img1)
+        else:
+            selected.append(img2)
 
+    # ============================
+    # 2. 選ばれた特徴を集計
+    # ============================
+    df = features.loc[selected].reset_index(drop=True)
 
-# ============================
-# 3. 選ばれた特徴を集計
-# ============================
-selected_features = [features[img] for img in selected]
-df = pd.DataFrame(selected_features)
+    print("\n=== 選ばれた特徴一覧 ===")
+    print(df)
 
-print("\n=== 選ばれた特徴一覧 ===")
-print(df)
+    # ============================
+    # 3. 連関分析（アソシエーション分析）
+    # ============================
+    df_hot = pd.get_dummies(df)
 
+    frequent = apriori(df_hot, min_support=0.2, use_colnames=True)
+    rules = association_rules(frequent, metric="confidence", min_threshold=0.5)
 
-# ============================
-# 4. 連関分析（アソシエーション分析）
-# ============================
-df_hot = pd.get_dummies(df)
-
-frequent = apriori(df_hot, min_support=0.2, use_colnames=True)
-rules = association_rules(frequent, metric="confidence", min_threshold=0.5)
+    rules = rules.sort_values("confidence", ascending=False)
 
-rules = rules.sort_values("confidence", ascending=False)
+    print("\n=== 連関分析の結果（confidence順） ===")
+    print(rules)
 
-print("\n=== 連関分析の結果（confidence順） ===")
-print(rules)
+    # ============================
+    # 4. 好みの特徴を抽出
+    # ============================
+    # confidence が高い特徴を抽出
+    top_features = []
 
+    for _, row in rules.iterrows():
+        for item in row["antecedents"]:
+            top_features.append(item)
+        for item in row["consequents"]:
+            top_features.append(item)
 
-# ============================
-# 5. 好みの特徴を抽出
-# ============================
-# confidence が高い特徴を抽出
-top_features = []
+    top_features = list(set(top_features))  # 重複削除
 
-for _, row in rules.iterrows():
-    for item in row["antecedents"]:
-        top_features.append(item)
-    for item in row["consequents"]:
-        top_features.append(item)
+    print("\n=== 好みの特徴（抽出） ===")
+    print(top_features)
 
-top_features = list(set(top_features))  # 重複削除
+    # ============================
+    # 5. AI画像生成用プロンプトを作成
+    # ============================
+    prompt = ", ".join(top_features) + ", anime style, high quality"
 
-print("\n=== 好みの特徴（抽出） ===")
-print(top_features)
+    print("\n=== AI画像生成プロンプト ===")
+    print(prompt)
 
 
 # ============================
-# 6. AI画像生成用プロンプトを作成
+# 模擬ユーザーで回数ごとの収束を測る
 # ============================
-prompt = ", ".join(top_features) + ", anime style, high quality"
-
-print("\n=== AI画像生成プロンプト ===")
-print(prompt)
\ No newline at end of file
+def run_simulation(args):
+    from simulation import simulate, summarize
+
+    def on_progress(done, total):
+        print(f"\r{done} / {total} tasks", end="", flush=True)
+
+    results, elapsed = simulate(
+        args.users, args.rounds, args.strategies, args.miners,
+        n_way=args.n_way, truth_size=args.truth_size, beta=args.beta,
+        feature_file=args.features, max_workers=args.workers, seed=args.seed, on_progress=on_progress,
+    )
+    print()
+
+    summary = summarize(results)
+    print(summary.to_string(index=False))
+
+    n_sessions = args.users * len(args.strategies)
+    n_picks = n_sessions * max(args.rounds)
+    print(f"\n{n_sessions} sessions ({n_picks} picks) in {elapsed:.1f} s: "
+          f"{n_sessions / elapsed:.1f} sessions/s, {n_picks / elapsed:.0f} picks/s")
+
+    if args.out:
+        results.to_csv(args.out, index=False)
+        print(f"per-user results -> {args.out}")
+
+
+if __name__ == "__main__":
+    from simulation import STRATEGIES, MINERS, DEFAULT_MINERS, DEFAULT_ROUNDS, TRUTH_SIZE, BETA, N_WAY
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", nargs="?", choices=["select", "simulate"], default="select")
+    parser.add_argument("--features", default=FEATURE_FILE)
+    parser.add_argument("--images", default=IMAGE_DIR)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, nargs="+", default=DEFAULT_ROUNDS, help="正解率を測る回数")
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=STRATEGIES)
+    parser.add_argument("--miners", nargs="+", choices=MINERS, default=DEFAULT_MINERS)
+    parser.add_argument("--n-way", type=int, default=N_WAY)
+    parser.add_argument("--truth-size", type=int, default=TRUTH_SIZE)
+    parser.add_argument("--beta", type=float, default=BETA, help="選択の確かさ（小さいほど気まぐれ）")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="ユーザーごとの結果を CSV に保存")
+    args = parser.parse_args()
+
+    if args.command == "simulate":
+        run_simulation(args)
+    else:
+        select_interactively(args.features, args.images)
@@ -0,0 +1,220 @@
+import time
+import random
+import itertools
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from lazy_imports import lazy_import
+from catalog import ATTRIBUTE_COLUMNS, FEATURE_FILE, load_catalog_frame
+from preference import PreferenceModel
+from association import MIN_COUNT, mine_rules
+from clustering import CatalogClusters, sample_across_clusters
+from sweep import TOP_K, ranked_features
+
+pd = lazy_import("pandas")
+frequent_patterns = lazy_import("mlxtend.frequent_patterns")
+
+# ============================
+# 模擬ユーザーによる選定のシミュレーション
+# ============================
+# 隠れた好み（正解の (属性, 値) を TRUTH_SIZE 個）を持つ模擬ユーザーを作り、
+# キャラ選択の回をプロセスプールで何千回も流す。回数ごとに抽出した特徴が
+# 正解をどれだけ当てたか（再現率）と、1秒あたりに流せた回数を出す。
+#   効用 u(キャラ) = 正解の特徴に一致した数
+#   n_way 枚の候補から選ぶ確率 ∝ exp(β u)（β が小さいほど気まぐれ）
+# 同じ乱数の種のユーザーを全ての組み合わせで使うので、候補の選び方・抽出方法を並べて比べられる。
+#
+#   候補の選び方（STRATEGIES）
+#     random  … 毎回ランダム（sentei.py と同じ）
+#     cluster … 別々のクラスタから1枚ずつ（キャラ選択ページの既定）
+#     active  … 選好モデルで結果が最も読めない組（効用の差が最小）を候補から選ぶ
+#   抽出の方法（MINERS）
+#     apriori    … mlxtend の apriori（support 0.2 / confidence 0.5、sentei.py と同じ。2行以上）
+#     taxonomy   … 連関分析ページの分類体系つきマイニング（association.mine_rules）
+#     preference … 勝ち／負けペアから学習した選好モデルの重み
+#
+#   python sentei.py simulate --users 2000 --rounds 5 10 20 40
+#   python sentei.py simulate --users 200 --strategies random active --miners apriori taxonomy preference
+
+STRATEGIES = ["random", "cluster", "active"]
+MINERS = ["apriori", "taxonomy", "preference"]
+DEFAULT_MINERS = ["taxonomy", "preference"]   # apriori は少ない回数でルールが爆発して遅いので指定した時だけ
+
+DEFAULT_ROUNDS = [5, 10, 20, 40]
+TRUTH_SIZE = 3
+BETA = 2.0
+N_WAY = 2
+ACTIVE_CANDIDATES = 16   # active で比べる候補の組の数
+USERS_PER_TASK = 25
+
+
+# ============================
+# ワーカー側
+# ============================
+_shared = {}
+
+
+def _init_worker(catalog_df, clusters):
+    # プロセスごとに1回：One-hot と選好モデル（重みは回ごとに初期化）を用意
+    _shared["frame"] = catalog_df
+    _shared["model"] = PreferenceModel(catalog_df.to_dict(orient="index"))
+    _shared["clusters"] = clusters
+
+
+def make_user(seed, truth_size=TRUTH_SIZE):
+    # 属性の違う truth_size 個の (属性, 値) を正解にする（値はカタログに実際にあるもの）
+    model = _shared["model"]
+    rng = random.Random(seed)
+    by_column = defaultdict(list)
+    for j, (col, _) in enumerate(model.items):
+        by_column[col].append(j)
+    columns = rng.sample(sorted(by_column), min(truth_size, len(by_column)))
+    return [rng.choice(by_column[col]) for col in columns]
+
+
+def _pick_candidates(strategy, rng, n_way):
+    model = _shared["model"]
+    images = model.images
+    if strategy == "cluster":
+        return sample_across_clusters(images, n_way, _shared["clusters"], rng)
+    if strategy == "active":
+        groups = [rng.sample(range(len(images)), n_way) for _ in range(ACTIVE_CANDIDATES)]
+        scores = model.X @ model.w
+        spread = [np.ptp(scores[g]) for g in groups]
+        return [images[i] for i in groups[int(np.argmin(spread))]]
+    return rng.sample(images, n_way)
+
+
+def _choose(candidates, utility, rng, beta):
+    model = _shared["model"]
+    u = np.array([utility[model.index[img]] for img in candidates])
+    p = np.exp(beta * (u - u.max()))
+    return candidates[rng.choices(range(len(candidates)), weights=p)[0]]
+
+
+def extract(miner, selected, comparisons, top_k=TOP_K):
+    # 戻り値: 好みの特徴（"属性_値"）を強い順に最大 top_k 個（どの方法も同じ数で比べる）
+    model = _shared["model"]
+    if miner == "preference":
+        # 連関分析ページの top_features() と同じく属性ごとに最も好まれた値を1つ
+        model.fit(comparisons)
+        best = {}
+        for col, value, _ in model.ranked_features():
+            best.setdefault(col, f"{col}_{value}")
+        return list(best.values())[:top_k]
+
+    df = _shared["frame"].loc[selected].reset_index(drop=True)
+    if miner == "taxonomy":
+        rules = mine_rules(df)
+        return ranked_features(rules, "lift", top_k) if len(rules) else []
+
+    # 回数が少ない時は 1 行だけの組み合わせまで頻出になるので、少なくとも MIN_COUNT 行
+    min_support = max(0.2, MIN_COUNT / len(df))
+    frequent = frequent_patterns.apriori(pd.get_dummies(df), min_support=min_support, use_colnames=True)
+    if len(frequent) == 0:
+        return []
+    rules = frequent_patterns.association_rules(frequent, metric="confidence", min_threshold=0.5)
+    return ranked_features(rules, "confidence", top_k) if len(rules) else []
+
+
+def score(extracted, truth):
+    # hit@k … 上位 |正解| 個に入った正解の割合、recall … 抽出した特徴（最大 TOP_K 個）に入った正解の割合
+    k = len(truth)
+    return {
+        "hit@k": len(truth & set(extracted[:k])) / k,
+        "recall": len(truth & set(extracted)) / k,
+        "n_features": len(extracted),
+    }
+
+
+def simulate_user(seed, strategy, miners, checkpoints, n_way=N_WAY, truth_size=TRUTH_SIZE, beta=BETA):
+    model = _shared["model"]
+    truth_items = make_user(seed, truth_size)
+    truth = {f"{model.items[j][0]}_{model.items[j][1]}" for j in truth_items}
+    utility = model.X[:, truth_items].sum(axis=1)
+
+    rng = random.Random(seed * 7919 + STRATEGIES.index(strategy))
+    model.w[:] = 0.0
+    selected, comparisons = [], []
+    results = []
+    for round_no in range(1, max(checkpoints) + 1):
+        candidates = _pick_candidates(strategy, rng, n_way)
+        winner = _choose(candidates, utility, rng, beta)
+        selected.append(winner)
+        for loser in candidates:
+            if loser != winner:
+                comparisons.append([winner, loser])
+                model.update(winner, loser)
+
+        if round_no in checkpoints:
+            # active は途中の重みで候補を選ぶので、バッチ学習の前に退避して戻す
+            w = model.w.copy()
+            for miner in miners:
+                t = time.perf_counter()
+                extracted = extract(miner, selected, comparisons)
+                results.append({
+                    "strategy": strategy, "miner": miner, "rounds": round_no,
+                    **score(extracted, truth), "mine_ms": (time.perf_counter() - t) * 1000,
+                })
+            model.w = w
+    return results
+
+
+def _run_task(seeds, strategy, miners, checkpoints, n_way, truth_size, beta):
+    return [
+        row for seed in seeds
+        for row in simulate_user(seed, strategy, miners, checkpoints, n_way, truth_size, beta)
+    ]
+
+
+# ============================
+# 親プロセス側
+# ============================
+def simulate(n_users, rounds=None, strategies=None, miners=None, n_way=N_WAY, truth_size=TRUTH_SIZE,
+             beta=BETA, feature_file=FEATURE_FILE, max_workers=None, seed=0, on_progress=None):
+    # 戻り値: (結果の DataFrame（ユーザー×戦略×抽出方法×回数ごと）, 所要秒数)
+    rounds = sorted(rounds or DEFAULT_ROUNDS)
+    strategies = strategies or STRATEGIES
+    miners = miners or DEFAULT_MINERS
+
+    catalog_df = load_catalog_frame(columns=ATTRIBUTE_COLUMNS, feature_file=feature_file)
+
+    clusters = None
+    if "cluster" in strategies:
+        clusters = CatalogClusters(path=None)
+        clusters.rebuild(catalog_df)
+
+    seeds = list(range(seed, seed + n_users))
+    tasks = [
+        (seeds[start:start + USERS_PER_TASK], strategy)
+        for strategy, start in itertools.product(strategies, range(0, n_users, USERS_PER_TASK))
+    ]
+
+    t = time.perf_counter()
+    rows = []
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(catalog_df, clusters)) as pool:
+        futures = [
+            pool.submit(_run_task, chunk, strategy, miners, rounds, n_way, truth_size, beta)
+            for chunk, strategy in tasks
+        ]
+        for done, future in enumerate(as_completed(futures), 1):
+            rows.extend(future.result())
+            if on_progress is not None:
+                on_progress(done, len(futures))
+    elapsed = time.perf_counter() - t
+
+    return pd.DataFrame(rows), elapsed
+
+
+def summarize(results):
+    # 戦略×抽出方法×回数ごとの平均
+    return (
+        results.groupby(["strategy", "miner", "rounds"])
+        [["hit@k", "recall", "n_features", "mine_ms"]]
+        .mean()
+        .round(3)
+        .reset_index()
+    )
@@ -0,0 +1,158 @@
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from lazy_imports import lazy_import
+from catalog import ATTRIBUTE_COLUMNS, load_catalog_frame, catalog_version
+from selection_log import SelectionLog, LOG_FILE
+from association import analysis_cache, analysis_key, one_hot, mine_rules_from_hot, extract_top_features
+
+pd = lazy_import("pandas")
+
+# ============================
+# 連関分析のパラメータ探索（並列）
+# ============================
+# min_support × min_threshold × metric の全組み合わせを
+# プロセスプールで一度に評価し、ルール数・上位の特徴・所要時間を並べる。
+# ・One-hot 行列は共有メモリに1回だけ置き、各ワーカーはそれを参照する
+# ・結果は連関分析ページと同じキャッシュに入るので、採用した設定はすぐ表示できる
+#
+#   python sweep.py --session <id> --supports 0.15 0.2 0.25 --thresholds 1.0 1.1 1.2 --metrics lift confidence
+
+DEFAULT_GRID = {
+    "supports": [0.15, 0.2, 0.25, 0.3],
+    "thresholds": [1.0, 1.1, 1.2],
+    "metrics": ["lift"],
+}
+
+TOP_K = 10
+
+
+# ============================
+# ワーカー側
+# ============================
+_shared = {}
+
+
+def _attach(shm_name, shape, columns):
+    # プロセスごとに1回：共有メモリ上の行列をそのまま DataFrame として使う
+    shm = shared_memory.SharedMemory(name=shm_name)
+    matrix = np.ndarray(shape, dtype=np.bool_, buffer=shm.buf)
+    _shared["shm"] = shm
+    _shared["df_hot"] = pd.DataFrame(matrix, columns=columns, copy=False)
+
+
+def ranked_features(rules, metric, top_k=TOP_K):
+    # 指標の高いルールから順に、初めて出てきた特徴を並べる（top_k=None なら全部）
+    features = []
+    for _, row in rules.sort_values(metric, ascending=False).iterrows():
+        for feature in sorted(row["antecedents"]) + sorted(row["consequents"]):
+            if feature not in features:
+                features.append(feature)
+        if top_k is not None and len(features) >= top_k:
+            break
+    return features[:top_k]
+
+
+def _evaluate(selected, version, params):
+    key = analysis_key(selected, version, **params)
+
+    t = time.perf_counter()
+    found, cached = analysis_cache.get(key)
+    if found:
+        rules, top_features = cached
+    else:
+        rules = mine_rules_from_hot(_shared["df_hot"], **params)
+        top_features = extract_top_features(rules)
+        analysis_cache.put(key, (rules, top_features))
+    runtime = time.perf_counter() - t
+
+    return {
+        **params,
+        "n_rules": len(rules),
+        "n_features": len(top_features),
+        "top_features": ranked_features(rules, params["metric"]) if len(rules) else [],
+        "runtime": runtime,
+        "cached": found,
+    }
+
+
+# ============================
+# 親プロセス側
+# ============================
+def sweep(selected, catalog_df, version, supports=None, thresholds=None, metrics=None,
+          max_workers=None, on_result=None):
+    # 戻り値: 組み合わせごとの結果 dict のリスト（グリッド順）
+    # on_result(結果, 完了数, 総数) を終わった順に呼ぶ
+    supports = supports or DEFAULT_GRID["supports"]
+    thresholds = thresholds or DEFAULT_GRID["thresholds"]
+    metrics = metrics or DEFAULT_GRID["metrics"]
+
+    grid = [
+        {"min_support": float(s), "metric": m, "min_threshold": float(th)}
+        for m, s, th in itertools.product(metrics, supports, thresholds)
+    ]
+
+    df_hot = one_hot(catalog_df.loc[selected].reset_index(drop=True))
+    matrix = df_hot.to_numpy(dtype=np.bool_)
+    columns = list(df_hot.columns)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+    try:
+        np.ndarray(matrix.shape, dtype=np.bool_, buffer=shm.buf)[:] = matrix
+
+        results = [None] * len(grid)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_attach,
+                                 initargs=(shm.name, matrix.shape, columns)) as pool:
+            futures = {
+                pool.submit(_evaluate, selected, version, params): i
+                for i, params in enumerate(grid)
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                results[i] = future.result()
+                if on_result is not None:
+                    on_result(results[i], done, len(grid))
+        return results
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def results_frame(results):
+    df = pd.DataFrame(results)
+    if len(df):
+        df["top_features"] = df["top_features"].apply(", ".join)
+        df["runtime"] = df["runtime"].round(3)
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log", default=LOG_FILE)
+    parser.add_argument("--session", default=None, help="省略時は最後に選択があったセッション")
+    parser.add_argument("--supports", type=float, nargs="+", default=DEFAULT_GRID["supports"])
+    parser.add_argument("--thresholds", type=float, nargs="+", default=DEFAULT_GRID["thresholds"])
+    parser.add_argument("--metrics", nargs="+", default=DEFAULT_GRID["metrics"])
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    selected = SelectionLog(args.log).session_run(args.session)["selected"]
+    if not selected:
+        raise SystemExit("選択データがありません")
+
+    t = time.perf_counter()
+    results = sweep(
+        selected, load_catalog_frame(columns=ATTRIBUTE_COLUMNS), catalog_version(),
+        args.supports, args.thresholds, args.metrics, args.workers,
+    )
+    elapsed = time.perf_counter() - t
+
+    with pd.option_context("display.width", 200, "display.max_colwidth", 80):
+        print(results_frame(results).to_string(index=False))
+    print(f"\n{len(results)} settings in {elapsed:.2f} s "
+          f"(sum of per-setting runtimes {sum(r['runtime'] for r in results):.2f} s)")
@@ -0,0 +1,149 @@
+# ============================
+# 髪型分類体系（大分類→中分類→細分類）
+# ============================
+HAIRSTYLE_MAP = {
+    "straight": {
+        "type": ["long straight", "medium straight", "short straight", "pigtails", "one-length"],
+        "detail": ["center parted", "side parted", "see-through bangs", "straight bangs", "himecut"]
+    },
+    "wavy": {
+        "type": ["loose wave", "medium wave", "strong wave"],
+        "detail": ["fluffy wave", "beach wave"]
+    },
+    "curly": {
+        "type": ["loose curls", "tight curls", "perm curls"],
+        "detail": ["ringlet curls", "afro curls"]
+    },
+    "ponytail": {
+        "type": ["high ponytail", "low ponytail", "side ponytail"],
+        "detail": ["straight ponytail","messy ponytail", "ribbon ponytail"]
+    },
+    "twintail": {
+        "type": ["high twintails", "low twintails", "side twintails", "half-up twintails"],
+        "detail": ["straight twintail","drill twintails", "curly twintails"]
+    },
+    "bob": {
+        "type": ["short bob", "medium bob", "layered bob", "inner curl bob"],
+        "detail": ["straight bob", "wavy bob"]
+    },
+    "braid": {
+        "type": ["single braid", "double braids", "side braid", "half braid", "french braid"],
+        "detail": ["braided ponytail", "braided bun"]
+    },
+    "bun": {
+        "type": ["single bun", "twin buns"],
+        "detail": ["messy bun", "braided bun"]
+    }
+}
+
+# ============================
+# 髪色分類体系（大分類→中分類）
+# ============================
+HAIR_COLOR_MAP = {
+    "black": ["jet black", "soft black"],
+    "brown": ["dark brown", "light brown", "chestnut"],
+    "blonde": ["golden blonde", "ash blonde", "platinum blonde"],
+    "blue": ["dark blue", "light blue", "sky blue"],
+    "red": ["dark red", "light red"],
+    "pink": ["vivid pink", "pastel pink"],
+    "green": ["dark green", "mint green"],
+    "purple": ["dark purple", "lavender"],
+    "white": ["pure white", "off white"],
+    "silver": ["silver", "metallic silver"]
+}
+
+# ============================
+# 分類体系のない属性の選択肢
+# ============================
+ATTRIBUTE_OPTIONS = {
+    "hair_length": ["short hair", "medium hair", "long hair"],
+    "eye_color": [
+        "black eyes", "brown eyes", "blue eyes", "green eyes",
+        "red eyes", "yellow eyes", "purple eyes", "pink eyes", "grey eyes"
+    ],
+    "eye_shape": ["big eyes", "sharp eyes", "round eyes", "narrow eyes", "droopy eyes"],
+    "expression": ["smiling", "serious expression", "angry", "shy", "sad", "surprised"],
+    "vibe": ["cute girl", "cool girl", "elegant girl", "energetic girl", "mysterious girl"],
+}
+
+# ============================
+# 列どうしの親子関係
+# ============================
+# 子の列 → 親の列（細分類も大分類の下にぶら下がる）
+PARENT_COLUMNS = {
+    "hair_color_sub": "hair_color_main",
+    "hairstyle_type": "hairstyle_main",
+    "hairstyle_detail": "hairstyle_main",
+}
+
+# 列の階層の深さ（分類体系に無い列は 0）
+COLUMN_LEVELS = {
+    "hair_color_main": 0,
+    "hair_color_sub": 1,
+    "hairstyle_main": 0,
+    "hairstyle_type": 1,
+    "hairstyle_detail": 2,
+}
+
+
+def children(column, parent=""):
+    # 親の値の下にある子の値（親が空なら全ての値を重複なしで並べる）
+    if column == "hair_color_sub":
+        groups = {main: subs for main, subs in HAIR_COLOR_MAP.items()}
+    else:
+        key = column.rsplit("_", 1)[1]
+        groups = {main: v[key] for main, v in HAIRSTYLE_MAP.items()}
+
+    if parent:
+        return list(groups.get(parent, []))
+    return sorted({value for values in groups.values() for value in values})
+
+
+def parents(column, value):
+    # 子の値 → 親の値のリスト（"braided bun" のように親が複数ある値もある）
+    if column not in PARENT_COLUMNS or not value:
+        return []
+    return [main for main in (HAIR_COLOR_MAP if column == "hair_color_sub" else HAIRSTYLE_MAP)
+            if value in children(column, main)]
+
+
+def options(column, record=None):
+    # 編集用の選択肢（先頭は ""）。子の列は record の親の値の下にあるものだけ
+    # （親が空なら子は選べない。record を渡さなければ全ての値）
+    if column in ATTRIBUTE_OPTIONS:
+        return [""] + ATTRIBUTE_OPTIONS[column]
+    if column == "hair_color_main":
+        return [""] + list(HAIR_COLOR_MAP)
+    if column == "hairstyle_main":
+        return [""] + list(HAIRSTYLE_MAP)
+    if column in PARENT_COLUMNS:
+        if record is None:
+            return [""] + children(column)
+        parent = record.get(PARENT_COLUMNS[column], "")
+        return [""] + children(column, parent) if parent else [""]
+    return None
+
+
+def validate(record):
+    # 戻り値: [(列, 理由), ...]（選択肢の決まっていない name / work / other は見ない）
+    problems = []
+    for column in list(ATTRIBUTE_OPTIONS) + ["hair_color_main", "hairstyle_main"] + list(PARENT_COLUMNS):
+        value = record.get(column, "") or ""
+        if not value or value in options(column, record):
+            continue
+        parent_column = PARENT_COLUMNS.get(column)
+        if parent_column and not record.get(parent_column):
+            problems.append((column, f"{parent_column} が空なのに {value!r} が入っている"))
+        elif parent_column and value in children(column):
+            problems.append((column, f"{value!r} は {record[parent_column]!r} の下にない"))
+        else:
+            problems.append((column, f"{value!r} は選択肢にない"))
+    return problems
+
+
+def split_feature(feature, columns):
+    # One-hot の列名 "属性_値" → (属性, 値)（長い属性名から順に照合）
+    for col in sorted(columns, key=len, reverse=True):
+        if feature.startswith(col + "_"):
+            return col, feature[len(col) + 1:]
+    return None